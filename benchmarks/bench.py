@@ -0,0 +1,364 @@
+"""Benchmarks the storage backends and the main app operations on synthetic catalogs.
+
+For every catalog size the storages are timed on list_movies(), add_movie(), delete_movie()
+and update_movie(), followed by the statistics, the fuzzy search, website generation and
+adding movies through OMDb, which is answered by a local fake server. Each benchmark reports
+the best of --repeat runs, the throughput and the peak memory traced in one extra run.
+
+The results are printed as JSON, or written to --output, so runs can be compared. With
+--compare the results are checked against an earlier run and the script exits non-zero
+when a benchmark got slower than --threshold allows.
+
+    python benchmarks/bench.py --sizes 1000,100000 --output results.json
+    python benchmarks/bench.py --sizes 1000000 --only storage,statistics
+    python benchmarks/bench.py --compare results.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from fake_omdb import FakeOMDbServer, COUNTRIES  # noqa: E402
+from movie_api import MovieAPI  # noqa: E402
+from movie_app import MovieApp  # noqa: E402
+from movie_importer import MovieImporter  # noqa: E402
+from statistics import Statistics, IncrementalStatistics, _numpy  # noqa: E402
+from storage_cache import CachedStorage  # noqa: E402
+from storage_csv import StorageCsv  # noqa: E402
+from storage_json import StorageJson  # noqa: E402
+from storage_sqlite import StorageSqlite  # noqa: E402
+from website_generator import WebsiteGenerator  # noqa: E402
+
+GROUPS = ('storage', 'statistics', 'search', 'website', 'omdb')
+STORAGES = {
+    'json': ('movies.json', StorageJson),
+    'json-journal': ('movies.json', lambda file_path: StorageJson(file_path, journaled=True)),
+    'csv': ('movies.csv', StorageCsv),
+    'sqlite': ('movies.db', StorageSqlite),
+}
+WORDS = ('the', 'last', 'night', 'star', 'dark', 'city', 'love', 'war', 'king', 'river', 'ghost', 'summer',
+         'secret', 'road', 'blood', 'dream', 'island', 'shadow', 'winter', 'return', 'lost', 'golden', 'red',
+         'silent', 'empire', 'garden', 'storm', 'heart', 'fire', 'moon', 'journey', 'house')
+TEMPLATE_PATH = os.path.join(REPO_DIR, '_static', 'index_template.html')
+
+
+def make_catalog(size, seed=0):
+    """
+        Generates a synthetic catalog.
+
+        Args:
+            size (int): Number of movies.
+            seed (int): Random seed, the same seed gives the same catalog.
+
+        Returns:
+            dict: The catalog in the shape returned by IStorage.list_movies().
+    """
+    rng = random.Random(seed)
+    movies = {}
+    for index in range(size):
+        title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title() + f' {index}'
+        movies[title] = {'rating': round(rng.uniform(1, 10), 1), 'year': str(rng.randint(1920, 2024)),
+                         'poster_url': f'https://img.example.com/{index}.jpg', 'country': rng.choice(COUNTRIES),
+                         'imdb_id': f'tt{index:07d}', 'notes': ''}
+    return movies
+
+
+def mutation_count(size):
+    """Number of single movie changes timed per run; fewer on big catalogs where each one rewrites the file."""
+    return max(1, min(100, 100000 // size))
+
+
+def run_benchmark(name, size, function, operations=1, setup=None, repeat=3, memory=True):
+    """
+        Times a function and measures its peak memory.
+
+        Args:
+            name (str): The benchmark name.
+            size (int): The catalog size.
+            function (callable): Called with the value returned by setup, or without arguments.
+            operations (int): Number of operations done by one call, used for the throughput.
+            setup (callable): Prepares a fresh state before every call. Not timed.
+            repeat (int): Number of timed calls; the fastest one is reported.
+            memory (bool): Make one more call under tracemalloc to record the peak memory.
+
+        Returns:
+            dict: The benchmark result.
+    """
+    timings = []
+    for _ in range(repeat):
+        arguments = (setup(),) if setup else ()
+        start = time.perf_counter()
+        function(*arguments)
+        timings.append(time.perf_counter() - start)
+
+    peak_memory = None
+    if memory:
+        arguments = (setup(),) if setup else ()
+        tracemalloc.start()
+        try:
+            function(*arguments)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    seconds = min(timings)
+    result = {'benchmark': name, 'size': size, 'operations': operations, 'seconds': round(seconds, 6),
+              'ops_per_second': round(operations / seconds, 1) if seconds else None,
+              'peak_memory_bytes': peak_memory}
+    print(f"{name:<44} {size:>9} movies {seconds * 1000:12.2f} ms"
+          f"{'' if peak_memory is None else f' {peak_memory / 2 ** 20:10.1f} MiB'}", file=sys.stderr)
+    return result
+
+
+def benchmark_storages(catalog, work_dir, options):
+    """Times the single movie operations of every storage backend."""
+    size = len(catalog)
+    count = mutation_count(size)
+    titles = list(catalog)[:count]
+    new_movies = make_catalog(count, seed=size + 1)
+    new_movies = {f'New {title}': info for title, info in new_movies.items()}
+    results = []
+
+    for storage_name, (file_name, storage_class) in STORAGES.items():
+        pristine_path = os.path.join(work_dir, f'pristine-{storage_name}-{file_name}')
+        with contextlib.redirect_stdout(None):
+            storage_class(pristine_path).add_movies(catalog)
+        if storage_name == 'json-journal':
+            # Start from a compacted file, like a journaled storage right after compaction
+            StorageJson(pristine_path).compact()
+
+        def fresh_storage():
+            working_path = os.path.join(work_dir, f'{storage_name}-{file_name}')
+            for suffix in ('', StorageJson.JOURNAL_SUFFIX):
+                if os.path.exists(working_path + suffix):
+                    os.remove(working_path + suffix)
+            shutil.copy(pristine_path, working_path)
+            return storage_class(working_path)
+
+        def add(storage):
+            for title, info in new_movies.items():
+                storage.add_movie(title, info['year'], info['rating'], info['poster_url'], info['country'],
+                                  info['imdb_id'], info['notes'])
+
+        def delete(storage):
+            for title in titles:
+                storage.delete_movie(title)
+
+        def update(storage):
+            for title in titles:
+                storage.update_movie(title, 'Benchmark notes')
+
+        prefix = f'storage.{storage_name}'
+        results.append(run_benchmark(f'{prefix}.list_movies', size, lambda storage: storage.list_movies(),
+                                     setup=fresh_storage, repeat=options.repeat, memory=options.memory))
+        results.append(run_benchmark(f'{prefix}.load_catalog', size, lambda storage: storage.load_catalog(),
+                                     setup=fresh_storage, repeat=options.repeat, memory=options.memory))
+        for operation, function in (('add_movie', add), ('delete_movie', delete), ('update_movie', update)):
+            results.append(run_benchmark(f'{prefix}.{operation}', size, function, operations=count,
+                                         setup=fresh_storage, repeat=options.repeat, memory=options.memory))
+    return results
+
+
+def benchmark_statistics(catalog, options):
+    """Times the statistics functions on the catalog."""
+    size = len(catalog)
+    benchmarks = [
+        ('statistics.calculate_average_rating', lambda: Statistics.calculate_average_rating(catalog)),
+        ('statistics.calculate_median_rating', lambda: Statistics.calculate_median_rating(catalog)),
+        ('statistics.find_best_movies', lambda: Statistics.find_best_movies(catalog)),
+        ('statistics.find_worst_movies', lambda: Statistics.find_worst_movies(catalog)),
+        ('statistics.summarize', lambda: Statistics.summarize(catalog, use_numpy=False)),
+        ('statistics.incremental_build', lambda: IncrementalStatistics(catalog).summary()),
+    ]
+    if _numpy() is not None:
+        benchmarks.append(('statistics.summarize_numpy', lambda: Statistics.summarize(catalog, use_numpy=True)))
+    return [run_benchmark(name, size, function, repeat=options.repeat, memory=options.memory)
+            for name, function in benchmarks]
+
+
+def cached_app(catalog, work_dir, movie_api=None):
+    """Creates a MovieApp over a JSON file holding the catalog."""
+    file_path = os.path.join(work_dir, 'app.json')
+    if os.path.exists(file_path):
+        os.remove(file_path)
+    with contextlib.redirect_stdout(None):
+        storage = CachedStorage(StorageJson(file_path))
+    storage.add_movies(catalog)
+    return MovieApp(storage, movie_api)
+
+
+def benchmark_search(catalog, work_dir, options):
+    """Times movies_search() with misspelled titles, first with building the search index and then without."""
+    size = len(catalog)
+    rng = random.Random(size)
+    terms = []
+    for title in rng.sample(list(catalog), min(20, size)):
+        position = rng.randrange(len(title))
+        terms.append(title[:position] + title[position + 1:])
+
+    def search(app):
+        with contextlib.redirect_stdout(None):
+            for term in terms:
+                app.movies_search(term)
+
+    def fresh_app():
+        app = cached_app(catalog, work_dir)
+        app.storage.list_movies()
+        return app
+
+    warm_app = fresh_app()
+    search(warm_app)
+    return [
+        run_benchmark('search.movies_search_cold', size, search, operations=len(terms), setup=fresh_app,
+                      repeat=options.repeat, memory=options.memory),
+        run_benchmark('search.movies_search', size, lambda: search(warm_app), operations=len(terms),
+                      repeat=options.repeat, memory=options.memory),
+    ]
+
+
+def benchmark_website(catalog, work_dir, options):
+    """Times generating the website from scratch and regenerating it unchanged."""
+    size = len(catalog)
+    output_path = os.path.join(work_dir, 'index.html')
+
+    def generate():
+        with contextlib.redirect_stdout(None):
+            WebsiteGenerator.generate_website_content(catalog, TEMPLATE_PATH, output_path, 'Benchmark', jobs=options.jobs)
+
+    def cold():
+        # Forget the rendered fragments and written pages of the previous run
+        WebsiteGenerator._fragment_cache = {}
+        WebsiteGenerator._written_pages.clear()
+        generate()
+
+    results = [run_benchmark('website.generate_website_content', size, cold, repeat=options.repeat,
+                             memory=options.memory)]
+    generate()
+    results.append(run_benchmark('website.generate_website_content_unchanged', size, generate,
+                                 repeat=options.repeat, memory=options.memory))
+    return results
+
+
+def benchmark_omdb(catalog, work_dir, options):
+    """Times adding movies through a local fake OMDb, one by one and as a concurrent import."""
+    size = len(catalog)
+    count = mutation_count(size)
+    with FakeOMDbServer() as server:
+        def fresh_app():
+            movie_api = MovieAPI(base_url=server.url, cache_path=None, requests_per_second=None)
+            return cached_app(catalog, work_dir, movie_api)
+
+        def add(app):
+            with contextlib.redirect_stdout(None):
+                for index in range(count):
+                    app.movies_add(f'Benchmark Movie {index}')
+
+        def import_movies(app):
+            importer = MovieImporter(app.storage, app.movie_api)
+            importer.import_movies([f'Imported Movie {index}' for index in range(count)], progress=None)
+
+        return [
+            run_benchmark('omdb.movies_add', size, add, operations=count, setup=fresh_app,
+                          repeat=options.repeat, memory=options.memory),
+            run_benchmark('omdb.import_movies', size, import_movies, operations=count, setup=fresh_app,
+                          repeat=options.repeat, memory=options.memory),
+        ]
+
+
+def compare(results, baseline_path, threshold):
+    """
+        Compares the results with an earlier run.
+
+        Args:
+            results (list): The results of this run.
+            baseline_path (str): Path of the JSON output of the earlier run.
+            threshold (float): Allowed slowdown, e.g. 0.2 for 20%.
+
+        Returns:
+            list: Descriptions of the benchmarks that got slower than allowed.
+    """
+    with open(baseline_path, 'r') as baseline_file:
+        baseline = {(result['benchmark'], result['size']): result for result in json.load(baseline_file)['results']}
+    regressions = []
+    for result in results:
+        previous = baseline.get((result['benchmark'], result['size']))
+        if previous and previous['seconds'] and result['seconds'] > previous['seconds'] * (1 + threshold):
+            regressions.append(f"{result['benchmark']} ({result['size']} movies): "
+                               f"{previous['seconds'] * 1000:.2f} ms -> {result['seconds'] * 1000:.2f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Movie App benchmarks")
+    parser.add_argument("--sizes", default="1000,100000",
+                        help="Comma separated catalog sizes, e.g. 1000,100000,1000000")
+    parser.add_argument("--only", help=f"Comma separated benchmark groups to run: {', '.join(GROUPS)}")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per benchmark")
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="Skip the extra run measuring peak memory")
+    parser.add_argument("--jobs", type=int, default=1, help="Worker processes used for website generation")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    parser.add_argument("--compare", metavar="FILE", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown against --compare before failing, 0.2 means 20%%")
+    options = parser.parse_args()
+
+    sizes = [int(size) for size in options.sizes.split(',')]
+    groups = options.only.split(',') if options.only else GROUPS
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown benchmark groups: {', '.join(sorted(unknown))}")
+
+    if options.output:
+        # Relative to where the script was started, not to the working directory of the run
+        options.output = os.path.abspath(options.output)
+
+    results = []
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        # The app writes its OMDb cache and other files to the working directory
+        os.chdir(work_dir)
+        try:
+            for size in sizes:
+                catalog = make_catalog(size)
+                if 'storage' in groups:
+                    results += benchmark_storages(catalog, work_dir, options)
+                if 'statistics' in groups:
+                    results += benchmark_statistics(catalog, options)
+                if 'search' in groups:
+                    results += benchmark_search(catalog, work_dir, options)
+                if 'website' in groups:
+                    results += benchmark_website(catalog, work_dir, options)
+                if 'omdb' in groups:
+                    results += benchmark_omdb(catalog, work_dir, options)
+        finally:
+            os.chdir(original_dir)
+
+    report = {'python': platform.python_version(), 'implementation': platform.python_implementation(),
+              'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+              'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}
+    if options.output:
+        with open(options.output, 'w') as output_file:
+            json.dump(report, output_file, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+
+    if options.compare:
+        regressions = compare(results, options.compare, options.threshold)
+        for regression in regressions:
+            print(f"Slower: {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Checks that several processes can write one JSON catalog at the same time without losing changes.
+
+Writer processes each add their own movies to a shared StorageJson, update the notes of every
+third one and delete every fifth one, while reader processes keep listing the catalog. The
+run passes when no reader ever failed to parse the file and the final catalog holds exactly
+the changes all writers made. Both the plain and the journaled mode are checked, with a low
+compaction threshold so journal compaction races with the appends of the other writers.
+
+    python benchmarks/concurrency.py
+    python benchmarks/concurrency.py --writers 8 --readers 4 --movies 500
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from storage_json import StorageJson  # noqa: E402
+
+COMPACT_RECORDS = 50
+
+
+def movie_title(writer, index):
+    """Returns the title of a movie added by a writer."""
+    return f"Writer {writer} movie {index}"
+
+
+def expected_catalog(writers, movies):
+    """
+        Returns what the catalog must hold once every writer finished.
+
+        Args:
+            writers (int): The number of writer processes.
+            movies (int): The number of movies each writer adds.
+
+        Returns:
+            dict: Movie titles as keys and their expected notes as values.
+    """
+    catalog = {}
+    for writer in range(writers):
+        for index in range(movies):
+            if index % 5 == 4:
+                continue
+            catalog[movie_title(writer, index)] = 'updated' if index % 3 == 2 else ''
+    return catalog
+
+
+def write(file_path, journaled, writer, movies):
+    """Adds, updates and deletes the movies of one writer, one change at a time."""
+    storage = StorageJson(file_path, journaled=journaled, compact_records=COMPACT_RECORDS)
+    for index in range(movies):
+        title = movie_title(writer, index)
+        storage.add_movie(title, 2000 + index % 20, 5.0 + index % 5, '', 'US', f'tt{writer:02d}{index:05d}', '')
+        if index % 3 == 2:
+            storage.update_movie(title, 'updated')
+        if index % 5 == 4:
+            storage.delete_movie(title)
+
+
+def read(file_path, journaled, stop, reads):
+    """Lists the catalog until stopped and reports how many reads it made."""
+    storage = StorageJson(file_path, journaled=journaled, compact_records=COMPACT_RECORDS)
+    count = 0
+    while not stop.is_set():
+        movies = storage.list_movies()
+        if not isinstance(movies, dict):
+            raise TypeError(f"list_movies() returned {type(movies).__name__}")
+        count += 1
+    reads.put(count)
+
+
+def run(directory, journaled, writers, readers, movies):
+    """
+        Runs the writers and readers against a new catalog and compares the result.
+
+        Args:
+            directory (str): The directory to create the catalog in.
+            journaled (bool): Use the journaled mode of StorageJson.
+            writers (int): The number of writer processes.
+            readers (int): The number of reader processes.
+            movies (int): The number of movies each writer adds.
+
+        Returns:
+            list: The problems found, empty when the run passed.
+    """
+    mode = 'journaled' if journaled else 'plain'
+    file_path = os.path.join(directory, f'{mode}.json')
+    StorageJson(file_path)
+    stop = multiprocessing.Event()
+    reads = multiprocessing.Queue()
+
+    start = time.perf_counter()
+    reader_processes = [multiprocessing.Process(target=read, args=(file_path, journaled, stop, reads))
+                        for _ in range(readers)]
+    writer_processes = [multiprocessing.Process(target=write, args=(file_path, journaled, writer, movies))
+                        for writer in range(writers)]
+    for process in reader_processes + writer_processes:
+        process.start()
+    for process in writer_processes:
+        process.join()
+    stop.set()
+    for process in reader_processes:
+        process.join()
+    read_counts = [reads.get() for process in reader_processes if process.exitcode == 0]
+    elapsed = time.perf_counter() - start
+
+    problems = [f"{mode}: a writer exited with {process.exitcode}" for process in writer_processes
+                if process.exitcode != 0]
+    problems += [f"{mode}: a reader exited with {process.exitcode}" for process in reader_processes
+                 if process.exitcode != 0]
+
+    expected = expected_catalog(writers, movies)
+    movies_kept = StorageJson(file_path, journaled=journaled).list_movies()
+    catalog = {title: movie['notes'] for title, movie in movies_kept.items()}
+    missing = expected.keys() - catalog.keys()
+    unexpected = catalog.keys() - expected.keys()
+    wrong_notes = [title for title in expected.keys() & catalog.keys() if expected[title] != catalog[title]]
+    if missing:
+        problems.append(f"{mode}: {len(missing)} movies lost, e.g. '{min(missing)}'")
+    if unexpected:
+        problems.append(f"{mode}: {len(unexpected)} deleted movies came back, e.g. '{min(unexpected)}'")
+    if wrong_notes:
+        problems.append(f"{mode}: {len(wrong_notes)} note updates lost, e.g. '{min(wrong_notes)}'")
+
+    changes = writers * sum(1 + (index % 3 == 2) + (index % 5 == 4) for index in range(movies))
+    print(f"{mode}: {writers} writers made {changes} changes in {elapsed:.2f} s, "
+          f"{readers} readers listed the catalog {sum(read_counts)} times, {len(catalog)} movies kept")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent writers and readers of a JSON catalog")
+    parser.add_argument("--writers", type=int, default=4, help="Number of writer processes")
+    parser.add_argument("--readers", type=int, default=2, help="Number of reader processes")
+    parser.add_argument("--movies", type=int, default=100, help="Number of movies each writer adds")
+    args = parser.parse_args()
+
+    problems = []
+    with tempfile.TemporaryDirectory(prefix='movie-concurrency-') as directory:
+        for journaled in (False, True):
+            problems += run(directory, journaled, args.writers, args.readers, args.movies)
+
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
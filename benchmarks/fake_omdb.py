@@ -0,0 +1,78 @@
+"""Local stand-in for the OMDb API, so benchmarks never call the real service.
+
+Answers title (t=) and IMDb ID (i=) lookups with a made-up but deterministic movie.
+Titles starting with 'missing' get OMDb's "Movie not found!" answer.
+
+    with FakeOMDbServer() as server:
+        movie_api = MovieAPI(base_url=server.url, cache_path=None)
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import json
+import threading
+import zlib
+
+COUNTRIES = ('USA', 'UK', 'France', 'Germany', 'Japan', 'India', 'Italy', 'Spain', 'Canada', 'South Korea')
+
+
+def fake_movie(lookup):
+    """
+        Builds the OMDb answer for a lookup.
+
+        Args:
+            lookup (str): The title or IMDb ID looked up.
+
+        Returns:
+            dict: The decoded OMDb response.
+    """
+    if lookup.lower().startswith('missing'):
+        return {'Response': 'False', 'Error': 'Movie not found!'}
+    seed = zlib.crc32(lookup.encode())
+    return {'Response': 'True', 'Title': lookup, 'Year': str(1950 + seed % 75),
+            'imdbRating': f"{1 + seed % 90 / 10:.1f}", 'Poster': f"https://img.example.com/{seed}.jpg",
+            'Country': f"{COUNTRIES[seed % len(COUNTRIES)]}, {COUNTRIES[seed // 7 % len(COUNTRIES)]}",
+            'imdbID': lookup if lookup.startswith('tt') else f"tt{seed % 10 ** 7:07d}"}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        lookup = (query.get('t') or query.get('i') or [''])[0]
+        body = json.dumps(fake_movie(lookup)).encode()
+        self.server.requests += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeOMDbServer:
+    """Serves fake OMDb answers from a background thread on a free local port."""
+
+    def __init__(self):
+        self.__server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.__server.daemon_threads = True
+        self.__server.requests = 0
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        """str: The base URL to pass to MovieAPI."""
+        return f"http://127.0.0.1:{self.__server.server_port}/"
+
+    @property
+    def requests(self):
+        """int: Number of requests answered so far."""
+        return self.__server.requests
+
+    def __enter__(self):
+        self.__thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.__server.shutdown()
+        self.__server.server_close()
@@ -0,0 +1,85 @@
+"""Measures how long importing the app takes and guards against heavy imports at startup.
+
+Every run starts a fresh interpreter with ``-X importtime``, imports the given module and
+records the wall time and the cumulative import time of each module. The script fails when
+one of HEAVY_MODULES was loaded at startup, or when the best run is slower than --max-ms.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --module main --repeat 10 --max-ms 150
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Dependencies that must only be imported by the feature that needs them
+HEAVY_MODULES = ('matplotlib', 'fuzzywuzzy', 'requests', 'pycountry', 'numpy', 'concurrent.futures')
+
+
+def measure(module):
+    """
+        Imports a module in a fresh interpreter.
+
+        Args:
+            module (str): The module to import.
+
+        Returns:
+            tuple: The wall time in milliseconds, a dictionary of module names and their cumulative
+            import time in milliseconds, and the list of heavy modules that were loaded.
+    """
+    code = (f"import sys, json; import {module}; "
+            f"print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))")
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=REPO_DIR,
+                            capture_output=True, text=True, check=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        cumulative[name.strip()] = int(cumulative_us) / 1000
+    return wall_ms, cumulative, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup import time benchmark")
+    parser.add_argument("--module", default="movie_app", help="Module to import")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of fresh interpreters to start")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to print")
+    parser.add_argument("--max-ms", type=float, help="Fail if the fastest run takes longer than this")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.repeat)]
+    best_ms, cumulative, heavy = min(runs, key=lambda run: run[0])
+    slowest = sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[:args.top]
+
+    if args.json:
+        print(json.dumps({'module': args.module, 'best_ms': round(best_ms, 1),
+                          'median_ms': round(sorted(run[0] for run in runs)[len(runs) // 2], 1),
+                          'import_ms': cumulative.get(args.module), 'heavy_modules': heavy,
+                          'slowest_imports': dict(slowest)}, indent=4))
+    else:
+        print(f"import {args.module}: best {best_ms:.1f} ms of {args.repeat} runs, "
+              f"{cumulative.get(args.module, 0):.1f} ms spent importing")
+        for name, milliseconds in slowest:
+            print(f"{milliseconds:10.1f} ms  {name}")
+
+    failed = False
+    if heavy:
+        print(f"Heavy modules loaded at startup: {', '.join(heavy)}", file=sys.stderr)
+        failed = True
+    if args.max_ms is not None and best_ms > args.max_ms:
+        print(f"Startup took {best_ms:.1f} ms, more than the allowed {args.max_ms:.1f} ms", file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,489 @@
+from file_lock import AtomicFile, FileLock
+from movie import Movie
+from storage_csv import StorageCsv
+from storage_json import StorageJson
+from storage_sqlite import StorageSqlite
+from storage_sharded import ShardedStorage
+from storage_binary import StorageBinary
+from itertools import islice
+from json.encoder import encode_basestring_ascii
+from pathlib import Path
+import csv
+import json
+import os
+import re
+import shutil
+import sqlite3
+import uuid
+
+
+class JsonObjectReader:
+    """Incremental reader of the members of a large top-level JSON object.
+
+        The file is read in chunks and each member is matched with a regular expression for
+        its key and decoded with JSONDecoder.raw_decode() for its value, so only the current
+        chunk and one value are in memory at a time instead of the whole document as with
+        json.load(). A member cut off at the end of the chunk is parsed again once the next
+        chunk is read.
+        """
+    OPENING = re.compile(r'[ \t\n\r]*\{[ \t\n\r]*(\}?)')
+    KEY = re.compile(r'"((?:[^"\\]|\\.)*)"[ \t\n\r]*:[ \t\n\r]*')
+    SEPARATOR = re.compile(r'[ \t\n\r]*([,}])[ \t\n\r]*')
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, json_file, chunk_size=CHUNK_SIZE):
+        """
+            Initializes the JsonObjectReader instance.
+
+            Args:
+                json_file (file): The JSON file opened in text mode.
+                chunk_size (int): Number of characters read at a time.
+            """
+        self.__file = json_file
+        self.__chunk_size = chunk_size
+
+    def items(self):
+        """
+            Reads the members of the top-level object one at a time.
+
+            Yields:
+                tuple: A (key, value) pair for each member, in file order.
+            """
+        read = self.__file.read
+        chunk_size = self.__chunk_size
+        raw_decode = json.JSONDecoder().raw_decode
+        match_key = self.KEY.match
+        match_separator = self.SEPARATOR.match
+        buffer = read(chunk_size)
+        eof = not buffer
+
+        # Read until the opening brace and what follows it can be told apart from a cut-off chunk
+        while True:
+            opening = self.OPENING.match(buffer)
+            if opening and (opening.end() < len(buffer) or eof):
+                break
+            chunk = '' if eof else read(chunk_size)
+            if not chunk:
+                if opening:
+                    break
+                raise ValueError("Invalid JSON: the document is not an object")
+            buffer += chunk
+        if opening.group(1):
+            self.__check_end(buffer, opening.end())
+            return
+        position = opening.end()
+
+        while True:
+            separator = end = None
+            member = match_key(buffer, position)
+            if member:
+                try:
+                    value, end = raw_decode(buffer, member.end())
+                except json.JSONDecodeError:
+                    pass
+                # A number or whitespace at the very end of the buffer may continue in the next chunk
+                if end is not None and (end < len(buffer) or eof):
+                    separator = match_separator(buffer, end)
+                    if separator and separator.end() == len(buffer) and not eof:
+                        separator = None
+            if separator is None:
+                # The member is cut off by the end of the chunk, or invalid
+                if eof:
+                    if member and end == len(buffer):
+                        raise ValueError("Invalid JSON: the document ends before the object is closed")
+                    raise ValueError(f"Invalid JSON: cannot parse the member starting with "
+                                     f"{buffer[position:position + 40]!r}")
+                chunk = read(chunk_size)
+                if chunk:
+                    buffer = buffer[position:] + chunk
+                    position = 0
+                else:
+                    eof = True
+                continue
+
+            raw_key = member.group(1)
+            key = raw_key if '\\' not in raw_key else json.loads(f'"{raw_key}"')
+            yield key, value
+            if separator.group(1) == '}':
+                self.__check_end(buffer, separator.end())
+                return
+            position = separator.end()
+
+    def __check_end(self, buffer, position):
+        """Raises ValueError if anything but whitespace follows the closing brace."""
+        rest = buffer[position:]
+        while True:
+            if rest.strip(' \t\n\r'):
+                raise ValueError(f"Invalid JSON: extra data after the object: {rest.strip()[:40]!r}")
+            rest = self.__file.read(self.__chunk_size)
+            if not rest:
+                return
+
+
+class CatalogConverter:
+    """Streams movies from one storage file format into another in constant memory.
+
+        Movies are read one at a time by a generator for the source format and written in
+        chunks of CHUNK_ROWS by the writer for the destination format, so catalogs far
+        bigger than the memory can be converted. JSON is read with JsonObjectReader rather
+        than json.load(), and a StorageJson journal is applied while streaming. Besides the
+        storage formats, JSON lines (.jsonl) with one movie object per line is supported, and
+        a ShardedStorage directory (.shards) is read and written shard file by shard file.
+        The read-only StorageBinary catalog (.mcat) can be built from any of them.
+
+        The destination is written to a temporary file that replaces it when complete.
+        Titles are not deduplicated across the stream; a title repeated in the source is
+        stored as the storages would load it, the last one winning.
+        """
+    FORMATS = {'.json': 'json', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.csv': 'csv', '.db': 'sqlite',
+               '.sqlite': 'sqlite', '.shards': 'shards', '.mcat': 'binary'}
+    CHUNK_ROWS = 5000
+
+    @classmethod
+    def detect_format(cls, file_path):
+        """
+            Derives the format of a file from its extension.
+
+            Args:
+                file_path (str): The file path.
+
+            Returns:
+                str: 'json', 'jsonl', 'csv', 'sqlite', 'shards' or 'binary'.
+            """
+        file_format = cls.FORMATS.get(os.path.splitext(file_path)[1].lower())
+        if file_format is None:
+            raise ValueError(f"Unsupported file type '{file_path}', use one of {', '.join(cls.FORMATS)}.")
+        return file_format
+
+    @staticmethod
+    def _movie_info(info):
+        """Returns the movie information with exactly the stored fields, in the order the storages use."""
+        return {field: info.get(field, '') for field in Movie.FIELDS}
+
+    @classmethod
+    def convert(cls, source_path, destination_path, overwrite=False):
+        """
+            Converts a storage file into another format.
+
+            Args:
+                source_path (str): The file to read.
+                destination_path (str): The file to write. Its extension selects the format.
+                overwrite (bool): Replace the destination if it exists.
+
+            Returns:
+                int: The number of movies written.
+            """
+        source_format = cls.detect_format(source_path)
+        destination_format = cls.detect_format(destination_path)
+        if not os.path.exists(source_path):
+            raise FileNotFoundError(f"Storage file '{source_path}' does not exist.")
+        if os.path.exists(destination_path):
+            if not overwrite:
+                raise FileExistsError(f"'{destination_path}' already exists.")
+            if os.path.samefile(source_path, destination_path):
+                raise ValueError("The source and the destination are the same file.")
+        movies = getattr(cls, f'read_{source_format}')(source_path)
+        return getattr(cls, f'write_{destination_format}')(movies, destination_path)
+
+    @staticmethod
+    def _journal_changes(journal_path):
+        """
+            Folds a StorageJson journal into its net effect, so it can be applied while streaming the snapshot.
+
+            Returns:
+                tuple: Titles mapped to their movie information or None if deleted, and the notes
+                    updated on movies that only exist in the snapshot.
+            """
+        changes = {}
+        notes = {}
+        if not os.path.exists(journal_path):
+            return changes, notes
+        with open(journal_path, 'r') as journal_file:
+            for line in journal_file:
+                try:
+                    record = json.loads(line) if line.strip() else None
+                except json.JSONDecodeError:
+                    # A torn last line, the same as StorageJson skips
+                    continue
+                if record is None:
+                    continue
+                title = record['title']
+                if record['op'] == 'add':
+                    changes[title] = record['movie']
+                    notes.pop(title, None)
+                elif record['op'] == 'delete':
+                    changes[title] = None
+                    notes.pop(title, None)
+                elif record['op'] == 'update':
+                    if title not in changes:
+                        notes[title] = record['notes']
+                    elif changes[title] is not None:
+                        changes[title]['notes'] = record['notes']
+        return changes, notes
+
+    @classmethod
+    def read_json(cls, file_path):
+        """
+            Streams the movies of a StorageJson file, applying its journal.
+
+            Yields:
+                tuple: A (title, movie information) pair per movie.
+            """
+        # The shared lock keeps writers from changing the snapshot and the journal during the read
+        with FileLock(file_path).shared():
+            changes, notes = cls._journal_changes(file_path + StorageJson.JOURNAL_SUFFIX)
+            with open(file_path, 'r') as json_file:
+                for title, info in JsonObjectReader(json_file).items():
+                    if title in changes:
+                        info = changes.pop(title)
+                        if info is None:
+                            continue
+                    elif title in notes:
+                        info['notes'] = notes[title]
+                    yield title, info
+            # Movies the journal added to the end of the catalog
+            for title, info in changes.items():
+                if info is not None:
+                    yield title, info
+
+    @staticmethod
+    def read_jsonl(file_path):
+        """
+            Streams the movies of a JSON lines file, one {"title": ..., ...} object per line.
+
+            Yields:
+                tuple: A (title, movie information) pair per movie.
+            """
+        with open(file_path, 'r') as jsonl_file:
+            for line_number, line in enumerate(jsonl_file, start=1):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if not isinstance(record, dict) or 'title' not in record:
+                    raise ValueError(f"Line {line_number} of '{file_path}' is not a movie object with a title.")
+                yield record.pop('title'), record
+
+    @staticmethod
+    def read_csv(file_path):
+        """
+            Streams the movies of a StorageCsv file.
+
+            Yields:
+                tuple: A (title, movie information) pair per movie.
+            """
+        storage = StorageCsv(file_path)
+        # Appends write to the file in place, the shared lock keeps them out until the read is done
+        with storage.lock.shared():
+            yield from storage.iter_movies()
+
+    @staticmethod
+    def read_sqlite(file_path):
+        """
+            Streams the movies of a StorageSqlite database, in insertion order.
+
+            Yields:
+                tuple: A (title, movie information) pair per movie.
+            """
+        # Read-only, so a mistyped path is reported instead of creating an empty database
+        connection = sqlite3.connect(Path(file_path).resolve().as_uri() + '?mode=ro', uri=True)
+        try:
+            cursor = connection.execute(
+                'SELECT title, rating, year, poster_url, country, imdb_id, notes FROM movies ORDER BY id'
+            )
+            for row in cursor:
+                yield row[0], StorageSqlite._row_to_movie(row)
+        finally:
+            connection.close()
+
+    @classmethod
+    def read_shards(cls, directory):
+        """
+            Streams the movies of a ShardedStorage directory, one shard file after the other.
+
+            Yields:
+                tuple: A (title, movie information) pair per movie.
+            """
+        manifest = ShardedStorage.read_manifest(directory)
+        for file_name in manifest['files']:
+            yield from getattr(cls, f'read_{manifest["backend"]}')(os.path.join(directory, file_name))
+
+    @staticmethod
+    def read_binary(file_path):
+        """
+            Streams the movies of a StorageBinary catalog, in the order they were written.
+
+            Yields:
+                tuple: A (title, movie information) pair per movie.
+            """
+        storage = StorageBinary(file_path)
+        try:
+            for title, movie in storage.list_movies().items():
+                yield title, movie.to_dict()
+        finally:
+            storage.close()
+
+    @classmethod
+    def _write_lines(cls, lines, destination_path, newline=None):
+        """Writes an iterable of text lines in chunks through an atomic replace."""
+        with AtomicFile(destination_path, newline=newline) as atomic:
+            while True:
+                chunk = list(islice(lines, cls.CHUNK_ROWS))
+                if not chunk:
+                    break
+                atomic.file.write(''.join(chunk))
+
+    @classmethod
+    def _json_member(cls, title, info):
+        """Formats one movie the way json.dump(movies, indent=4) does, without its slow indenting encoder."""
+        info = cls._movie_info(info)
+        if any(isinstance(value, (dict, list)) for value in info.values()):
+            return json.dumps({title: info}, indent=4)[2:-2]
+        # Strings are most of the values; encoding them directly skips json.dumps() call overhead
+        fields = ',\n'.join([f'        "{field}": '
+                              f'{encode_basestring_ascii(value) if type(value) is str else json.dumps(value)}'
+                              for field, value in info.items()])
+        return f'    {encode_basestring_ascii(title)}: {{\n{fields}\n    }}'
+
+    @classmethod
+    def write_json(cls, movies, destination_path):
+        """
+            Writes the movies as a StorageJson file, formatted as StorageJson writes it.
+
+            Returns:
+                int: The number of movies written.
+            """
+        count = 0
+
+        def lines():
+            nonlocal count
+            yield '{'
+            for title, info in movies:
+                yield ('\n' if count == 0 else ',\n') + cls._json_member(title, info)
+                count += 1
+            yield '\n}' if count else '}'
+
+        cls._write_lines(lines(), destination_path)
+        return count
+
+    @classmethod
+    def write_jsonl(cls, movies, destination_path):
+        """
+            Writes the movies as JSON lines, one {"title": ..., ...} object per line.
+
+            Returns:
+                int: The number of movies written.
+            """
+        count = 0
+
+        def lines():
+            nonlocal count
+            for title, info in movies:
+                yield json.dumps({'title': title, **cls._movie_info(info)}) + '\n'
+                count += 1
+
+        cls._write_lines(lines(), destination_path)
+        return count
+
+    @classmethod
+    def write_csv(cls, movies, destination_path):
+        """
+            Writes the movies as a StorageCsv file.
+
+            Returns:
+                int: The number of movies written.
+            """
+        count = 0
+        movies = iter(movies)
+        with AtomicFile(destination_path, newline='') as atomic:
+            writer = csv.writer(atomic.file)
+            writer.writerow(StorageCsv.FIELDNAMES)
+            while True:
+                chunk = list(islice(movies, cls.CHUNK_ROWS))
+                if not chunk:
+                    break
+                writer.writerows([title] + [info.get(field, '') for field in StorageCsv.FIELDNAMES[1:]]
+                                 for title, info in chunk)
+                count += len(chunk)
+        return count
+
+    @classmethod
+    def write_sqlite(cls, movies, destination_path):
+        """
+            Writes the movies into a new StorageSqlite database, one transaction per chunk.
+
+            Returns:
+                int: The number of movies written.
+            """
+        count = 0
+        movies = iter(movies)
+        temp_path = f'{destination_path}.{uuid.uuid4().hex}.tmp'
+        # An existing empty file keeps StorageSqlite from announcing a new storage file
+        open(temp_path, 'x').close()
+        storage = None
+        try:
+            storage = StorageSqlite(temp_path)
+            while True:
+                chunk = list(islice(movies, cls.CHUNK_ROWS))
+                if not chunk:
+                    break
+                storage.add_movies({title: cls._movie_info(info) for title, info in chunk})
+                count += len(chunk)
+            storage.close()
+            storage = None
+            os.replace(temp_path, destination_path)
+        finally:
+            if storage is not None:
+                storage.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return count
+
+    @staticmethod
+    def write_binary(movies, destination_path):
+        """
+            Builds a StorageBinary catalog.
+
+            Returns:
+                int: The number of movies written.
+            """
+        return StorageBinary.build(movies, destination_path)
+
+    @classmethod
+    def write_shards(cls, movies, destination_path, shards=ShardedStorage.DEFAULT_SHARDS,
+                     backend=ShardedStorage.DEFAULT_BACKEND):
+        """
+            Writes the movies into a new ShardedStorage directory.
+
+            The movies are first spilled into one JSON lines file per shard, which are then
+            converted into the shard files, so memory stays bounded by the chunk size. The
+            directory is built under a temporary name and renamed when complete.
+
+            Returns:
+                int: The number of movies written.
+            """
+        if os.path.exists(destination_path):
+            raise ValueError(f"'{destination_path}' already exists, re-shard it instead of replacing it.")
+        file_names = ShardedStorage.shard_file_names(backend, 1, shards)
+        temp_path = f'{destination_path}.{uuid.uuid4().hex}.tmp'
+        os.makedirs(temp_path)
+        try:
+            spill_paths = [os.path.join(temp_path, f'{file_name}.jsonl') for file_name in file_names]
+            spill_files = [open(spill_path, 'w') for spill_path in spill_paths]
+            count = 0
+            try:
+                for title, info in movies:
+                    spill_files[ShardedStorage.shard_of(title, shards)].write(
+                        json.dumps({'title': title, **cls._movie_info(info)}) + '\n')
+                    count += 1
+            finally:
+                for spill_file in spill_files:
+                    spill_file.close()
+            for file_name, spill_path in zip(file_names, spill_paths):
+                getattr(cls, f'write_{backend}')(cls.read_jsonl(spill_path), os.path.join(temp_path, file_name))
+                os.remove(spill_path)
+            ShardedStorage.write_manifest(temp_path, backend, file_names)
+            os.rename(temp_path, destination_path)
+        finally:
+            if os.path.exists(temp_path):
+                shutil.rmtree(temp_path)
+        return count
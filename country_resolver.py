@@ -0,0 +1,120 @@
+from collections import Counter
+
+
+class CountryResolver:
+    """Resolves country names, as OMDb spells them, to ISO 3166 alpha-2 codes.
+
+        All names, official names, common names and codes known to pycountry are put in
+        one lookup table when the resolver is created, together with ALIASES for the
+        OMDb spellings pycountry does not know. Lookups are dictionary hits; names missing
+        from the table go through pycountry's fuzzy search once and the result is remembered.
+        Names that cannot be resolved are counted so they can be reported together.
+        """
+    ALIASES = {
+        'usa': 'US',
+        'uk': 'GB',
+        'korea': 'KR',
+        'south korea': 'KR',
+        'north korea': 'KP',
+        'russia': 'RU',
+        'soviet union': 'RU',
+        'west germany': 'DE',
+        'east germany': 'DE',
+        'czechoslovakia': 'CZ',
+        'czech republic': 'CZ',
+        'yugoslavia': 'RS',
+        'federal republic of yugoslavia': 'RS',
+        'serbia and montenegro': 'RS',
+        'kosovo': 'XK',
+        'turkey': 'TR',
+        'iran': 'IR',
+        'syria': 'SY',
+        'vietnam': 'VN',
+        'laos': 'LA',
+        'taiwan': 'TW',
+        'burma': 'MM',
+        'ivory coast': 'CI',
+        'cape verde': 'CV',
+        'swaziland': 'SZ',
+        'republic of macedonia': 'MK',
+        'republic of north macedonia': 'MK',
+        'democratic republic of the congo': 'CD',
+        'occupied palestinian territory': 'PS',
+        'palestine': 'PS',
+        'bolivia': 'BO',
+        'venezuela': 'VE',
+        'tanzania': 'TZ',
+        'moldova': 'MD',
+        'brunei': 'BN',
+    }
+    _default = None
+
+    def __init__(self):
+        """Initializes the CountryResolver instance and builds the lookup table."""
+        # pycountry loads its whole database on import, so it is only imported once a resolver is needed
+        import pycountry
+        self.__codes = {}
+        for country in pycountry.countries:
+            for attribute in ('alpha_2', 'alpha_3', 'name', 'official_name', 'common_name'):
+                value = getattr(country, attribute, None)
+                if value:
+                    self.__codes.setdefault(value.lower(), country.alpha_2)
+        self.__codes.update(self.ALIASES)
+        self.unresolved = Counter()
+
+    @classmethod
+    def default(cls):
+        """
+            Returns the resolver shared by the whole process, building it on first use.
+
+            Returns:
+                CountryResolver: The shared resolver.
+            """
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def resolve(self, country_name):
+        """
+            Get two-letter code for a given country.
+
+            Args:
+                country_name (str): The country name.
+
+            Returns:
+                str: The alpha-2 code, or None if the country is unknown.
+            """
+        if not country_name:
+            return None
+        key = country_name.strip().lower()
+        try:
+            code = self.__codes[key]
+        except KeyError:
+            code = self.__codes[key] = self._search_fuzzy(country_name)
+        if code is None:
+            self.unresolved[country_name] += 1
+        return code
+
+    @staticmethod
+    def _search_fuzzy(country_name):
+        """
+            Looks up a country name that is not in the lookup table.
+
+            Args:
+                country_name (str): The country name.
+
+            Returns:
+                str: The alpha-2 code of the best match, or None if there is none.
+            """
+        import pycountry
+        try:
+            return pycountry.countries.search_fuzzy(country_name)[0].alpha_2
+        except LookupError:
+            return None
+
+    def report(self):
+        """Prints one summary line of the country names that could not be resolved and resets the count."""
+        if self.unresolved:
+            names = ', '.join(f"{name} ({count})" for name, count in self.unresolved.most_common())
+            print(f"Countries not found in the pycountry database: {names}")
+        self.unresolved.clear()
@@ -0,0 +1,205 @@
+from contextlib import contextmanager
+from functools import wraps
+import os
+import shutil
+import threading
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl; locks then only coordinate the threads of one process
+    fcntl = None
+
+
+def file_version(*file_paths):
+    """
+        Returns a value that changes whenever one of the files is written, replaced or removed.
+
+        Args:
+            *file_paths (str): The files to look at.
+
+        Returns:
+            tuple: The (mtime, size, inode) of every file, None for files that do not exist.
+    """
+    version = ()
+    for file_path in file_paths:
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            version += (None,)
+        else:
+            version += ((stat.st_mtime_ns, stat.st_size, stat.st_ino),)
+    return version
+
+
+def locked(method):
+    """Decorator running a storage method under the storage's exclusive lock, for methods that write."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock.exclusive():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class FileLock:
+    """Advisory lock shared by all processes working on the same storage file.
+
+        The lock is taken on a sidecar '<file>.lock' file rather than on the storage file
+        itself, because writers replace the storage file with a new one and a lock on the
+        old file would not be seen by anyone opening the new one. Writers hold the lock
+        exclusively for their whole read-modify-write. Readers do not wait for it: they
+        read optimistically and only fall back to a shared lock when a writer kept
+        changing the file under them.
+
+        The lock is re-entrant within a process, so a method holding it can call others
+        that take it again. A shared lock cannot be upgraded to an exclusive one.
+        """
+    SUFFIX = '.lock'
+    OPTIMISTIC_READS = 3
+
+    def __init__(self, file_path):
+        """
+            Initializes the FileLock instance.
+
+            Args:
+                file_path (str): The path of the storage file to protect.
+            """
+        self.path = file_path + self.SUFFIX
+        self.__thread_lock = threading.RLock()
+        self.__lock_file = None
+        self.__exclusive = False
+        self.__depth = 0
+
+    @contextmanager
+    def __hold(self, exclusive):
+        """Takes the lock, or only counts the nesting level when this process already holds it."""
+        with self.__thread_lock:
+            if self.__depth == 0:
+                self.__lock_file = open(self.path, 'a')
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(self.__lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                    except BaseException:
+                        self.__lock_file.close()
+                        raise
+                self.__exclusive = exclusive
+            elif exclusive and not self.__exclusive:
+                raise RuntimeError(f"Cannot upgrade the shared lock on '{self.path}' to an exclusive lock")
+            self.__depth += 1
+            try:
+                yield
+            finally:
+                self.__depth -= 1
+                if self.__depth == 0:
+                    # Closing the file releases the flock
+                    self.__lock_file.close()
+                    self.__lock_file = None
+
+    def shared(self):
+        """Context manager holding the lock shared with other readers."""
+        return self.__hold(exclusive=False)
+
+    def exclusive(self):
+        """Context manager holding the lock exclusively, for a read-modify-write."""
+        return self.__hold(exclusive=True)
+
+    def read(self, read_function, version_function):
+        """
+            Reads without taking the lock and checks that no writer changed the file meanwhile.
+
+            The read is retried when the version changed during it, and done under a shared
+            lock after OPTIMISTIC_READS attempts.
+
+            Args:
+                read_function (callable): Reads and returns the data.
+                version_function (callable): Returns a value that changes on every write.
+
+            Returns:
+                The value returned by read_function.
+            """
+        for _ in range(self.OPTIMISTIC_READS):
+            version = version_function()
+            try:
+                data = read_function()
+            except (OSError, ValueError):
+                # A writer replaced or appended to the file in the middle of the read
+                data = None
+                if version_function() == version:
+                    raise
+            if data is not None and version_function() == version:
+                return data
+        with self.shared():
+            return read_function()
+
+
+class AtomicFile:
+    """Writes a file through a temporary file that replaces it in one step.
+
+        The new content is written next to the target, flushed and fsynced, and then
+        renamed over the target, so readers see either the old or the new file and a
+        crash never leaves a half-written one behind.
+
+            with AtomicFile(file_path) as atomic:
+                atomic.file.write(content)
+        """
+
+    def __init__(self, file_path, newline=None, binary=False):
+        """
+            Initializes the AtomicFile instance.
+
+            Args:
+                file_path (str): The path of the file to replace.
+                newline (str): Passed on to open(), e.g. '' for the csv module.
+                binary (bool): Open the temporary file in binary mode.
+            """
+        self.file_path = file_path
+        self.newline = newline
+        self.binary = binary
+        self.file = None
+        self.__discarded = False
+
+    def discard(self):
+        """Keeps the original file; the temporary file is removed when the block ends."""
+        self.__discarded = True
+
+    def __enter__(self):
+        # Same directory, so the rename stays on one file system; 'x' applies the umask like a plain open()
+        self.file = open(f"{self.file_path}.{uuid.uuid4().hex}.tmp", 'xb' if self.binary else 'x',
+                         newline=None if self.binary else self.newline)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        temp_path = self.file.name
+        try:
+            if exc_type is None and not self.__discarded:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+            self.file.close()
+            if exc_type is not None or self.__discarded:
+                os.remove(temp_path)
+                return False
+            if os.path.exists(self.file_path):
+                # Keep the permissions of the original file
+                shutil.copymode(self.file_path, temp_path)
+            os.replace(temp_path, self.file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._fsync_directory(os.path.dirname(os.path.abspath(self.file_path)))
+        return False
+
+    @staticmethod
+    def _fsync_directory(directory):
+        """Makes the rename durable. Not every platform can open a directory, which is fine to skip."""
+        try:
+            directory_fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(directory_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(directory_fd)
@@ -0,0 +1,169 @@
+from html import escape
+from statistics import Statistics, MAX_RATING, HISTOGRAM_BINS
+import os
+
+
+class RatingHistogram:
+    """Histogram of movie ratings with text, SVG and matplotlib output.
+
+        The ratings are binned by Statistics into equal width bins between 0 and
+        MAX_RATING, the same bins IncrementalStatistics keeps up to date. The text and
+        SVG renderers are written by hand so that drawing a chart does not need a
+        plotting library; matplotlib is only imported for the image formats it alone
+        can write, and the figure is released as soon as it is saved.
+
+        Attributes:
+            TEXT_WIDTH (int): Number of characters of the longest bar in the text chart.
+            SVG_WIDTH (int): Width of the SVG chart in pixels.
+            SVG_HEIGHT (int): Height of the SVG chart in pixels.
+        """
+    TEXT_WIDTH = 50
+    SVG_WIDTH = 640
+    SVG_HEIGHT = 400
+    SVG_MARGIN = 48
+    BAR_COLOR = '#4c72b0'
+
+    def __init__(self, counts, max_value=MAX_RATING, title='Rating Histogram'):
+        """
+            Initializes the RatingHistogram instance.
+
+            Args:
+                counts (list): Number of ratings in each bin, lowest bin first.
+                max_value (float): Upper edge of the last bin.
+                title (str): The chart title.
+            """
+        self.counts = list(counts)
+        self.max_value = max_value
+        self.title = title
+
+    @classmethod
+    def from_movies(cls, movies, bins=HISTOGRAM_BINS, title='Rating Histogram'):
+        """
+            Bins the ratings of a catalog.
+
+            Args:
+                movies (dict): The catalog in the shape returned by IStorage.list_movies().
+                bins (int): Number of bins.
+                title (str): The chart title.
+
+            Returns:
+                RatingHistogram: The histogram of the movie ratings.
+            """
+        return cls(Statistics.summarize(movies, bins)['histogram'], title=title)
+
+    def bin_edges(self):
+        """
+            Returns the lower and upper edge of every bin.
+
+            Returns:
+                list: (low, high) pairs, lowest bin first.
+            """
+        width = self.max_value / len(self.counts)
+        return [(index * width, (index + 1) * width) for index in range(len(self.counts))]
+
+    def to_text(self, width=TEXT_WIDTH):
+        """
+            Renders the histogram as a horizontal bar chart for the terminal.
+
+            Args:
+                width (int): Number of characters of the longest bar.
+
+            Returns:
+                str: One line per bin.
+            """
+        highest = max(self.counts, default=0) or 1
+        count_width = len(str(max(self.counts, default=0)))
+        lines = [self.title]
+        for (low, high), count in zip(self.bin_edges(), self.counts):
+            bar = '#' * round(count * width / highest)
+            lines.append(f"{low:4.1f}-{high:4.1f} | {count:>{count_width}} {bar}".rstrip())
+        return '\n'.join(lines)
+
+    def to_svg(self, width=SVG_WIDTH, height=SVG_HEIGHT):
+        """
+            Renders the histogram as a standalone SVG document.
+
+            Args:
+                width (int): Width of the chart in pixels.
+                height (int): Height of the chart in pixels.
+
+            Returns:
+                str: The SVG document.
+            """
+        margin = self.SVG_MARGIN
+        plot_width = width - 2 * margin
+        plot_height = height - 2 * margin
+        bar_width = plot_width / len(self.counts)
+        highest = max(self.counts, default=0) or 1
+        bottom = margin + plot_height
+
+        parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+                 f'viewBox="0 0 {width} {height}" font-family="sans-serif" font-size="12">',
+                 f'<rect width="{width}" height="{height}" fill="white"/>',
+                 f'<text x="{width / 2:g}" y="{margin / 2:g}" text-anchor="middle" font-size="16">'
+                 f'{escape(self.title)}</text>']
+        for index, ((low, high), count) in enumerate(zip(self.bin_edges(), self.counts)):
+            bar_height = count * plot_height / highest
+            x = margin + index * bar_width
+            parts.append(f'<rect x="{x:.1f}" y="{bottom - bar_height:.1f}" width="{bar_width:.1f}" '
+                         f'height="{bar_height:.1f}" fill="{self.BAR_COLOR}" stroke="black">'
+                         f'<title>{low:g}-{high:g}: {count}</title></rect>')
+            if count:
+                parts.append(f'<text x="{x + bar_width / 2:.1f}" y="{bottom - bar_height - 4:.1f}" '
+                             f'text-anchor="middle">{count}</text>')
+        for low, high in self.bin_edges() + [(self.max_value, None)]:
+            x = margin + low * plot_width / self.max_value
+            parts.append(f'<text x="{x:.1f}" y="{bottom + 16:g}" text-anchor="middle">{low:g}</text>')
+        parts.append(f'<line x1="{margin}" y1="{bottom}" x2="{margin + plot_width}" y2="{bottom}" stroke="black"/>')
+        parts.append(f'<text x="{width / 2:g}" y="{height - margin / 4:g}" text-anchor="middle">Rating</text>')
+        parts.append(f'<text x="{margin / 3:g}" y="{height / 2:g}" text-anchor="middle" '
+                     f'transform="rotate(-90 {margin / 3:g} {height / 2:g})">Frequency</text>')
+        parts.append('</svg>')
+        return '\n'.join(parts) + '\n'
+
+    def _save_matplotlib(self, file_path):
+        """
+            Draws the histogram with matplotlib and saves it in the format given by the file extension.
+
+            A standalone Figure is used instead of pyplot, so nothing is kept in pyplot's global
+            figure registry and repeated calls do not draw on top of each other.
+
+            Args:
+                file_path (str): The path of the image file.
+            """
+        try:
+            from matplotlib.figure import Figure
+        except ImportError:
+            raise RuntimeError(f"matplotlib is needed to save '{file_path}', "
+                               f"install it or save the histogram as .svg or .txt")
+        figure = Figure()
+        try:
+            axes = figure.add_subplot()
+            edges = self.bin_edges()
+            axes.bar([low for low, high in edges], self.counts, width=self.max_value / len(self.counts),
+                     align='edge', alpha=0.5, edgecolor='black')
+            axes.set_xlabel('Rating')
+            axes.set_ylabel('Frequency')
+            axes.set_title(self.title)
+            figure.savefig(file_path)
+        finally:
+            figure.clear()
+
+    def save(self, file_path):
+        """
+            Saves the histogram. '.svg' and '.txt' files are written directly, any other
+            extension, such as '.png' or '.pdf', is rendered with matplotlib.
+
+            Args:
+                file_path (str): The path of the output file.
+            """
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension == '.svg':
+            content = self.to_svg()
+        elif extension == '.txt':
+            content = self.to_text() + '\n'
+        else:
+            self._save_matplotlib(file_path)
+            return
+        with open(file_path, 'w') as histogram_file:
+            histogram_file.write(content)
@@ -0,0 +1,300 @@
+from collections import defaultdict
+from functools import wraps
+import json
+import os
+import sys
+import threading
+import time
+
+
+class OperationStats:
+    """Call count, latency histogram and I/O volume of one instrumented operation.
+
+        Latencies go into power-of-two microsecond buckets, so the histogram stays small
+        however long the app runs; percentiles are read from the buckets and are upper
+        bounds within a factor of two.
+        """
+    __slots__ = ('count', 'errors', 'total', 'max', 'buckets', 'bytes_read', 'bytes_written')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = defaultdict(int)
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def add(self, seconds, bytes_read, bytes_written, failed):
+        """Records one call."""
+        self.count += 1
+        self.errors += failed
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[int(seconds * 1e6).bit_length()] += 1
+        self.bytes_read += bytes_read
+        self.bytes_written += bytes_written
+
+    def percentile(self, share):
+        """
+            Estimates a latency percentile from the histogram.
+
+            Args:
+                share (float): The percentile as a share, e.g. 0.95.
+
+            Returns:
+                float: The upper bound of the bucket holding the percentile, in seconds.
+            """
+        rank = share * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(2 ** bucket / 1e6, self.max)
+        return self.max
+
+    def to_dict(self):
+        """Returns the statistics in the shape used by Instrumentation.summary()."""
+        return {'count': self.count, 'errors': self.errors, 'total': self.total,
+                'mean': self.total / self.count if self.count else 0.0,
+                'p50': self.percentile(0.5), 'p95': self.percentile(0.95), 'max': self.max,
+                'bytes_read': self.bytes_read, 'bytes_written': self.bytes_written,
+                'histogram': {f'<{2 ** bucket}us': self.buckets[bucket] for bucket in sorted(self.buckets)}}
+
+
+class Instrumentation:
+    """Per-operation timing of the app's menu actions, storages, OMDb lookups, search and website generation.
+
+        Nothing is instrumented until enable() is called: it replaces the methods listed in
+        TARGETS, plus every method of the IStorage interface on each loaded storage class,
+        with timing wrappers, and disable() puts the originals back. Code paths therefore
+        pay nothing while instrumentation is off.
+
+        Every call records its latency, whether it raised, and the bytes the process read
+        and wrote meanwhile, taken from /proc/self/io where available. Nested calls are
+        recorded separately, e.g. a menu action and the storage calls it makes, and I/O of
+        other threads running at the same time is counted too.
+
+        Setting the TRACE_VARIABLE environment variable to a file path, or '-' for stderr,
+        also writes one JSON line per call.
+
+        Attributes:
+            TARGETS (dict): Module names mapped to (class name, method names) pairs to instrument.
+                The actions of MovieApp.menu_options are instrumented as well.
+            TRACE_VARIABLE (str): Environment variable naming the JSON-lines trace file.
+        """
+    TARGETS = {
+        'movie_app': ('MovieApp', ('movies_query',)),
+        'movie_api': ('MovieAPI', ('fetch_movie_info', 'fetch_movie_info_by_id')),
+        'search_index': ('SearchIndex', ('search',)),
+        'website_generator': ('WebsiteGenerator', ('generate_website_content', 'generate_paginated_website')),
+    }
+    STORAGE_METHODS = ('list_movies', 'load_catalog', 'add_movie', 'add_movies', 'delete_movie', 'delete_movies',
+                       'update_movie', 'update_movies', 'flush', 'compact')
+    TRACE_VARIABLE = 'MOVIE_APP_TRACE'
+    IO_COUNTERS_PATH = '/proc/self/io'
+    _active = None
+
+    def __init__(self, trace_path=None):
+        """
+            Initializes the Instrumentation instance.
+
+            Args:
+                trace_path (str): File to append JSON-lines timing events to, '-' for stderr, or None.
+            """
+        self.trace_path = trace_path
+        self.__operations = defaultdict(OperationStats)
+        self.__lock = threading.Lock()
+        self.__patched = []
+        self.__trace_file = None
+        self.__trace_bytes = 0
+        self.__io_overhead = (0, 0)
+        self.__has_io_counters = os.path.exists(self.IO_COUNTERS_PATH)
+
+    @classmethod
+    def active(cls):
+        """Instrumentation: The enabled instance, or None when instrumentation is off."""
+        return cls._active
+
+    @classmethod
+    def from_environment(cls):
+        """
+            Enables instrumentation when TRACE_VARIABLE is set.
+
+            Returns:
+                Instrumentation: The enabled instance, or None if the variable is not set.
+            """
+        trace_path = os.environ.get(cls.TRACE_VARIABLE)
+        if not trace_path:
+            return None
+        return cls(trace_path).enable()
+
+    def __read_io_counters(self):
+        """Returns the bytes read and written by the process so far."""
+        if not self.__has_io_counters:
+            return 0, 0
+        with open(self.IO_COUNTERS_PATH, 'rb') as io_file:
+            counters = dict(line.split(b': ') for line in io_file.read().splitlines())
+        return int(counters[b'rchar']), int(counters[b'wchar'])
+
+    def enable(self):
+        """
+            Installs the timing wrappers. Only one instance can be enabled at a time.
+
+            Returns:
+                Instrumentation: This instance.
+            """
+        if Instrumentation._active is not None:
+            raise RuntimeError("Instrumentation is already enabled")
+        # Reading the counters reads from the process itself, measure that to leave it out
+        before = self.__read_io_counters()
+        after = self.__read_io_counters()
+        self.__io_overhead = (after[0] - before[0], after[1] - before[1])
+        if self.trace_path == '-':
+            self.__trace_file = sys.stderr
+        elif self.trace_path:
+            self.__trace_file = open(self.trace_path, 'a')
+
+        for module_name, (class_name, method_names) in self.TARGETS.items():
+            module = sys.modules.get(module_name)
+            owner = getattr(module, class_name, None)
+            if owner is None:
+                continue
+            # Every action the menu can run, which is what MovieApp.run() dispatches to
+            menu_actions = [function_name for _, function_name in getattr(owner, 'menu_options', {}).values()]
+            for method_name in dict.fromkeys(menu_actions + list(method_names)):
+                self.__patch(owner, method_name)
+
+        istorage = sys.modules.get('istorage')
+        if istorage is not None:
+            for storage_class in self.__subclasses(istorage.IStorage):
+                self.__patch_storage(storage_class)
+            self.__watch_storages(istorage.IStorage)
+
+        Instrumentation._active = self
+        return self
+
+    def __patch_storage(self, storage_class):
+        """Instruments the IStorage methods a storage class defines."""
+        for method_name in self.STORAGE_METHODS:
+            self.__patch(storage_class, method_name)
+
+    def __watch_storages(self, base):
+        """Also instruments storage classes defined later, e.g. by modules imported on first use."""
+        instrumentation = self
+        original = base.__dict__.get('__init_subclass__')
+
+        def init_subclass(cls, **kwargs):
+            if original is not None:
+                original.__get__(None, cls)(**kwargs)
+            else:
+                super(base, cls).__init_subclass__(**kwargs)
+            instrumentation.__patch_storage(cls)
+
+        # Restored by disable() like the patched methods; None means the class had no own hook
+        self.__patched.append((base, '__init_subclass__', original))
+        base.__init_subclass__ = classmethod(init_subclass)
+
+    def disable(self):
+        """Removes the timing wrappers and closes the trace file."""
+        for owner, method_name, original in reversed(self.__patched):
+            if original is None:
+                delattr(owner, method_name)
+                continue
+            setattr(owner, method_name, original)
+        self.__patched = []
+        if self.__trace_file is not None and self.__trace_file is not sys.stderr:
+            self.__trace_file.close()
+        self.__trace_file = None
+        if Instrumentation._active is self:
+            Instrumentation._active = None
+
+    @staticmethod
+    def __subclasses(base):
+        """Returns a class and all classes derived from it."""
+        classes = [base]
+        for subclass in base.__subclasses__():
+            classes.extend(Instrumentation.__subclasses(subclass))
+        return classes
+
+    def __patch(self, owner, method_name):
+        """Replaces a method defined by the class itself, not an inherited one, with a timing wrapper."""
+        original = owner.__dict__.get(method_name)
+        if original is None or getattr(original, '__isabstractmethod__', False):
+            return
+        operation = f'{owner.__name__}.{method_name}'
+        if isinstance(original, (staticmethod, classmethod)):
+            wrapper = type(original)(self.__wrap(operation, original.__func__))
+        else:
+            wrapper = self.__wrap(operation, original)
+        self.__patched.append((owner, method_name, original))
+        setattr(owner, method_name, wrapper)
+
+    def __wrap(self, operation, function):
+        """Builds the timing wrapper of one function."""
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            io_before = self.__read_io_counters()
+            trace_bytes_before = self.__trace_bytes
+            start = time.perf_counter()
+            failed = True
+            try:
+                result = function(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                seconds = time.perf_counter() - start
+                io_after = self.__read_io_counters()
+                # Leave out the trace lines written by nested calls
+                bytes_written = io_after[1] - io_before[1] - self.__io_overhead[1] - \
+                    (self.__trace_bytes - trace_bytes_before)
+                self.record(operation, seconds, io_after[0] - io_before[0] - self.__io_overhead[0], bytes_written,
+                            failed)
+        return wrapper
+
+    def record(self, operation, seconds, bytes_read=0, bytes_written=0, failed=False):
+        """
+            Records one call of an operation.
+
+            Args:
+                operation (str): The operation name, e.g. 'StorageJson.list_movies'.
+                seconds (float): How long the call took.
+                bytes_read (int): Bytes the process read during the call.
+                bytes_written (int): Bytes the process wrote during the call.
+                failed (bool): Whether the call raised an exception.
+            """
+        bytes_read = max(bytes_read, 0)
+        bytes_written = max(bytes_written, 0)
+        with self.__lock:
+            self.__operations[operation].add(seconds, bytes_read, bytes_written, failed)
+            if self.__trace_file is not None:
+                line = json.dumps({'time': time.time(), 'operation': operation, 'seconds': seconds,
+                                   'bytes_read': bytes_read, 'bytes_written': bytes_written, 'error': failed})
+                self.__trace_file.write(line + '\n')
+                self.__trace_file.flush()
+                self.__trace_bytes += len(line.encode()) + 1
+
+    def summary(self):
+        """
+            Returns the statistics of every operation called so far.
+
+            Returns:
+                dict: Operation names mapped to their count, errors, total, mean, p50, p95 and max
+                    seconds, bytes read and written, and latency histogram.
+            """
+        with self.__lock:
+            return {operation: stats.to_dict() for operation, stats in self.__operations.items()}
+
+    def report(self, file=sys.stderr):
+        """Prints the operations as a table, the most time consuming first."""
+        summary = self.summary()
+        if not summary:
+            print("No instrumented operations were called.", file=file)
+            return
+        width = max(len(operation) for operation in summary)
+        print(f"{'operation':<{width}}  {'calls':>7}  {'total ms':>10}  {'mean ms':>9}  {'p95 ms':>9}  "
+              f"{'max ms':>9}  {'read KiB':>9}  {'written KiB':>11}", file=file)
+        for operation, stats in sorted(summary.items(), key=lambda item: item[1]['total'], reverse=True):
+            print(f"{operation:<{width}}  {stats['count']:>7}  {stats['total'] * 1000:>10.2f}  "
+                  f"{stats['mean'] * 1000:>9.3f}  {stats['p95'] * 1000:>9.3f}  {stats['max'] * 1000:>9.3f}  "
+                  f"{stats['bytes_read'] / 1024:>9.1f}  {stats['bytes_written'] / 1024:>11.1f}", file=file)
@@ -1,14 +1,42 @@
 from abc import ABC, abstractmethod
+from movie import Movie
 
 
 class IStorage(ABC):
     """ Interface for storing movie data. """
+    # Storages that cannot be changed set this, their write methods raise PermissionError
+    READ_ONLY = False
 
     @abstractmethod
     def list_movies(self):
         """ List all movies stored in the storage. """
         pass
 
+    def load_catalog(self):
+        """ Load all movies as compact Movie records instead of dictionaries.
+
+            The records can be used wherever the list_movies() dictionaries are, but take
+            a fraction of the memory. Storages override this to build the records while
+            reading, without creating the dictionaries first.
+
+            Returns:
+                dict: Movie titles as keys and Movie records as values.
+        """
+        return {title: Movie.from_info(info) for title, info in self.list_movies().items()}
+
+    @staticmethod
+    def make_movie_info(year, rating, poster_url, country, imdb_id, notes):
+        """ Build the movie information dictionary in the shape returned by list_movies().
+
+            Storages that convert field types when reading override this so that the
+            returned dictionary matches what a fresh list_movies() call would produce.
+
+            Returns:
+                dict: The movie information without the title.
+        """
+        return {"rating": rating, "year": year, "poster_url": poster_url, "country": country,
+                "imdb_id": imdb_id, "notes": notes}
+
     @abstractmethod
     def add_movie(self, title, year, rating, poster_url, country, imdb_id, notes):
         """ Add a new movie to the storage.
@@ -27,6 +55,23 @@ class IStorage(ABC):
         """
         pass
 
+    def add_movies(self, movies):
+        """ Add many movies to the storage at once.
+
+            Storages override this to write the whole batch in one go; the default
+            falls back to one add_movie() call per movie.
+
+            Args:
+                movies (dict): Movie titles as keys and movie information as values,
+                    in the shape returned by list_movies().
+
+            Returns:
+                None
+        """
+        for title, info in movies.items():
+            self.add_movie(title, info['year'], info['rating'], info['poster_url'], info['country'],
+                           info['imdb_id'], info['notes'])
+
     @abstractmethod
     def delete_movie(self, title):
         """ Delete a movie from the storage.
@@ -39,6 +84,24 @@ class IStorage(ABC):
         """
         pass
 
+    def delete_movies(self, titles):
+        """ Delete many movies from the storage at once.
+
+            Storages override this to write the whole batch in one go; the default
+            falls back to one delete_movie() call per title. Titles that are not in
+            the storage are ignored.
+
+            Args:
+                titles (iterable): The titles of the movies to delete.
+
+            Returns:
+                None
+        """
+        existing = self.list_movies()
+        for title in titles:
+            if title in existing:
+                self.delete_movie(title)
+
     @abstractmethod
     def update_movie(self, title, notes):
         """ Update the rating of a movie in the storage.
@@ -51,3 +114,18 @@ class IStorage(ABC):
                 None
         """
         pass
+
+    def update_movies(self, notes):
+        """ Update the notes of many movies at once.
+
+            Storages override this to write the whole batch in one go; the default
+            falls back to one update_movie() call per movie.
+
+            Args:
+                notes (dict): Movie titles as keys and their new notes as values.
+
+            Returns:
+                None
+        """
+        for title, movie_notes in notes.items():
+            self.update_movie(title, movie_notes)
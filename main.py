@@ -1,25 +1,350 @@
 import argparse
+import os
+import shlex
+import sys
+from colorama import Fore
 from movie_app import MovieApp
 from storage_json import StorageJson
 from storage_csv import StorageCsv
+from storage_sqlite import StorageSqlite
+from storage_cache import CachedStorage
+from storage_batch import BatchStorage
+from storage_sharded import ShardedStorage
+from instrumentation import Instrumentation
+
+# Commands that write to the storage, which the read-only binary catalog cannot run
+READ_ONLY_REFUSED = ("add", "delete", "update", "import", "batch", "reshard")
+
+
+def positive_int(value):
+    """
+        argparse type accepting whole numbers of at least 1.
+
+        Args:
+            value (str): The command line value.
+
+        Returns:
+            int: The number.
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def non_negative_int(value):
+    """
+        argparse type accepting whole numbers of at least 0, for options where 0 picks a default.
+
+        Args:
+            value (str): The command line value.
+
+        Returns:
+            int: The number.
+    """
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or more, got {number}")
+    return number
+
+
+def add_commands(subparsers):
+    """
+        Adds the commands that can be run from the command line or from a batch file.
+
+        Args:
+            subparsers: The object returned by ArgumentParser.add_subparsers().
+    """
+    subparsers.add_parser("list", help="List all movies")
+
+    add_parser = subparsers.add_parser("add", help="Look movies up on OMDb and add them")
+    add_parser.add_argument("titles", nargs="+", metavar="TITLE", help="Title of a movie to add")
+
+    delete_parser = subparsers.add_parser("delete", help="Delete movies")
+    delete_parser.add_argument("titles", nargs="+", metavar="TITLE", help="Title of a movie to delete")
+
+    update_parser = subparsers.add_parser("update", help="Update the notes of a movie")
+    update_parser.add_argument("title", help="Title of the movie to update")
+    update_parser.add_argument("notes", help="The new notes")
+
+    subparsers.add_parser("stats", help="Print rating statistics")
+
+    histogram_parser = subparsers.add_parser("histogram", help="Print the rating histogram and save it to a file")
+    histogram_parser.add_argument("--output", metavar="FILE",
+                                  help="File to save the histogram to: .svg, .txt, or .png with matplotlib")
+
+    search_parser = subparsers.add_parser("search", help="Search movies by title")
+    search_parser.add_argument("term", help="The title to search for")
+
+    site_parser = subparsers.add_parser("generate-site", help="Generate the movies website")
+    # 0 movies per page cannot split anything, so it is rejected like negative numbers
+    site_parser.add_argument("--per-page", type=positive_int, metavar="N",
+                             help="Split the website into pages of N movies")
+    site_parser.add_argument("--group-by", choices=("year", "country"),
+                             help="Also write pages per year or per country, needs --per-page")
+    site_parser.add_argument("--jobs", type=non_negative_int, dest="site_jobs",
+                             help="Number of worker processes used to generate the website, 0 for one per CPU")
+    site_parser.add_argument("--posters", action="store_true",
+                             help="Download the posters to _static/posters and show the local copies")
+
+    import_parser = subparsers.add_parser("import", help="Import the titles or IMDb IDs listed in a file")
+    import_parser.add_argument("file", help="Text file with one title or IMDb ID per line, or a CSV file")
+
+    query_parser = subparsers.add_parser("query", help="Print the matching movies, best rated first")
+    query_parser.add_argument("--top", type=positive_int, metavar="N", help="Only print the N best rated movies")
+    query_parser.add_argument("--min-rating", type=float, help="Lowest rating to include")
+    query_parser.add_argument("--max-rating", type=float, help="Highest rating to include")
+    query_parser.add_argument("--year-from", type=int, dest="min_year", help="Earliest year to include")
+    query_parser.add_argument("--year-to", type=int, dest="max_year", help="Latest year to include")
+    query_parser.add_argument("--country", help="Country the movies must come from")
+
+
+def run_command(app, args):
+    """
+        Runs one parsed command against the app.
+
+        Args:
+            app (MovieApp): The app to run the command with.
+            args (argparse.Namespace): The parsed command line of the command.
+    """
+    if args.command == "list":
+        app.movies_print()
+    elif args.command == "add":
+        for title in args.titles:
+            app.movies_add(title)
+    elif args.command == "delete":
+        for title in args.titles:
+            app.movies_delete(title)
+    elif args.command == "update":
+        app.movies_update(args.title, args.notes)
+    elif args.command == "stats":
+        app.movies_stats()
+    elif args.command == "histogram":
+        app.movies_rating_histogram(args.output)
+    elif args.command == "search":
+        app.movies_search(args.term)
+    elif args.command == "generate-site":
+        jobs = os.cpu_count() if args.site_jobs == 0 else args.site_jobs
+        app.movies_website_generate(args.per_page, args.group_by, jobs,
+                                    cache_posters=True if args.posters else None)
+    elif args.command == "import":
+        app.movies_import(args.file)
+    elif args.command == "query":
+        app.movies_query(args.top, args.min_rating, args.max_rating, args.min_year, args.max_year, args.country)
+
+
+def run_batch(app, lines):
+    """
+        Runs one command per line against a single loaded catalog and writes all changes at the end.
+
+        Blank lines and lines starting with '#' are skipped. A line that cannot be parsed, or
+        whose command fails, is reported and skipped; the other commands still run.
+
+        Args:
+            app (MovieApp): The app to run the commands with.
+            lines (iterable): The command lines, e.g. an open batch file.
+    """
+    batch_storage = BatchStorage(app.storage)
+    app.storage = batch_storage
+
+    parser = argparse.ArgumentParser(prog="batch", add_help=False)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    add_commands(subparsers)
+
+    try:
+        for line_number, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                args = parser.parse_args(shlex.split(line))
+            except (SystemExit, ValueError) as e:
+                # argparse exits on errors and has already printed the reason, shlex raises ValueError
+                if isinstance(e, ValueError):
+                    print(f"batch: {e}", file=sys.stderr)
+                print(f"Skipping line {line_number}: {line}", file=sys.stderr)
+                continue
+            try:
+                run_command(app, args)
+            except Exception as e:
+                print(f"Skipping line {line_number}: {e}", file=sys.stderr)
+    finally:
+        pending = batch_storage.pending
+        batch_storage.flush()
+        app.storage = batch_storage.storage
+        print(f"Batch finished, {pending} changes saved.")
+
+
+def convert(source_path, destination_path, overwrite=False):
+    """
+        Streams the movies of a storage file into a file of another format, without loading the whole catalog.
+
+        Args:
+            source_path (str): The storage file to read.
+            destination_path (str): The file to write, its extension selects the format.
+            overwrite (bool): Replace the destination if it exists.
+    """
+    from catalog_converter import CatalogConverter
+    try:
+        count = CatalogConverter.convert(source_path, destination_path, overwrite)
+    except FileExistsError as e:
+        print(f"{e} Pass --force to replace it.", file=sys.stderr)
+        sys.exit(1)
+    except (OSError, ValueError) as e:
+        print(f"Could not convert '{source_path}': {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"{count} movies written to {destination_path}.")
+
+
+def reshard(storage, shards, backend=None):
+    """
+        Redistributes the movies of a sharded catalog over a new number of shards.
+
+        Args:
+            storage (IStorage): The storage opened from the command line, which must be a ShardedStorage.
+            shards (int): The new number of shards.
+            backend (str): The format of the new shard files, the current one if omitted.
+    """
+    if not isinstance(storage, ShardedStorage):
+        print("Only a .shards catalog can be re-sharded. Convert the file into one first.", file=sys.stderr)
+        sys.exit(1)
+    try:
+        storage.reshard(shards, backend)
+    except ValueError as e:
+        print(f"Could not re-shard '{storage.directory}': {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"{len(storage.list_movies())} movies in {storage.shard_count} {storage.backend} shards.")
+    storage.close()
+
+
+def serve(app, host, port, flush_interval):
+    """
+        Serves the app's storage as an HTTP JSON API until Ctrl+C is pressed or SIGTERM is received.
+
+        Args:
+            app (MovieApp): The app whose storage and OMDb client are served.
+            host (str): The address to listen on.
+            port (int): The port to listen on.
+            flush_interval (float): Seconds between writes of the collected changes to the storage.
+    """
+    # asyncio and the server are only loaded when serving
+    import asyncio
+    from movie_server import MovieServer
+    server = MovieServer(app.storage, app.movie_api, host, port, flush_interval=flush_interval)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    print("Server stopped.")
 
 
 def main():
-    parser = argparse.ArgumentParser(description="Movie App with customizable storage")
-    parser.add_argument("file_path", help="Path to the storage file")
+    parser = argparse.ArgumentParser(description="Movie App with customizable storage. "
+                                                 "Without a command the interactive menu is started.")
+    parser.add_argument("file_path", help="Path to the storage file, or to a .shards directory")
+    parser.add_argument("--journal", action="store_true",
+                        help="Append changes to a journal file instead of rewriting the JSON file")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print the calls, time and bytes read and written per operation when done")
+    parser.add_argument("--profile-output", metavar="FILE",
+                        help="Save cProfile statistics to FILE, to be read with pstats or snakeviz")
+    subparsers = parser.add_subparsers(dest="command", metavar="command")
+    add_commands(subparsers)
+    batch_parser = subparsers.add_parser("batch", help="Run the commands listed in a file, one per line")
+    batch_parser.add_argument("file", nargs="?", default="-", help="The batch file, or - to read from stdin")
+    convert_parser = subparsers.add_parser("convert", aliases=["export"],
+                                           help="Stream the movies into a file of another format, e.g. JSON to CSV")
+    convert_parser.add_argument("destination",
+                                help="The file to write: .json, .jsonl, .csv, .db, .sqlite, a read-only .mcat "
+                                     "catalog, or a .shards directory")
+    convert_parser.add_argument("--force", action="store_true", help="Replace the destination if it exists")
+    reshard_parser = subparsers.add_parser("reshard", help="Redistribute a .shards catalog over a new number of shards")
+    reshard_parser.add_argument("shards", type=int, help="The new number of shards")
+    reshard_parser.add_argument("--backend", choices=tuple(ShardedStorage.BACKENDS),
+                                help="Also convert the shard files to another format")
+    serve_parser = subparsers.add_parser("serve", help="Serve the catalog as an HTTP JSON API")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="The address to listen on")
+    serve_parser.add_argument("--port", type=int, default=8000, help="The port to listen on")
+    serve_parser.add_argument("--flush-interval", type=float, default=1.0, metavar="SECONDS",
+                              help="How often the collected changes are written to the storage file")
     args = parser.parse_args()
 
+    # Instrumentation wraps the classes, so it has to be enabled before anything runs
+    instrumentation = Instrumentation.from_environment()
+    if args.profile and instrumentation is None:
+        instrumentation = Instrumentation().enable()
+    profiler = None
+    if args.profile_output:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        run_storage(args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile_output)
+            print(f"cProfile statistics saved to {args.profile_output}", file=sys.stderr)
+        if instrumentation is not None:
+            if args.profile:
+                instrumentation.report()
+            instrumentation.disable()
+
+
+def run_storage(args):
+    """
+        Opens the storage file named on the command line and runs the command, or the interactive menu.
+
+        Args:
+            args (argparse.Namespace): The parsed command line.
+    """
+    if args.command in ("convert", "export"):
+        convert(args.file_path, args.destination, args.force)
+        return
+
     # Determine storage type based on file extension
     if args.file_path.endswith('.json'):
-        storage = StorageJson(args.file_path)
+        storage = CachedStorage(StorageJson(args.file_path, journaled=args.journal))
     elif args.file_path.endswith('.csv'):
-        storage = StorageCsv(args.file_path)
+        storage = CachedStorage(StorageCsv(args.file_path))
+    elif args.file_path.endswith(('.db', '.sqlite')):
+        storage = StorageSqlite(args.file_path)
+    elif args.file_path.rstrip('/\\').endswith('.shards'):
+        # Every shard has its own read cache, so the sharded storage is not wrapped in another
+        storage = ShardedStorage(args.file_path)
+    elif args.file_path.endswith('.mcat'):
+        if args.command in READ_ONLY_REFUSED:
+            print(f"'{args.file_path}' is a read-only binary catalog, '{args.command}' cannot change it.",
+                  file=sys.stderr)
+            sys.exit(1)
+        # Only binary catalogs need the mmap reader and its hashing
+        from storage_binary import StorageBinary
+        try:
+            storage = StorageBinary(args.file_path)
+        except (OSError, ValueError) as e:
+            print(Fore.RED + str(e) + Fore.RESET, file=sys.stderr)
+            sys.exit(1)
     else:
-        print("Unsupported file type. Please provide a JSON or CSV file.")
+        print("Unsupported file type. Please provide a JSON, CSV, SQLite or .mcat file, or a .shards directory.")
+        return
+
+    if args.command == "reshard":
+        reshard(storage, args.shards, args.backend)
         return
 
     app = MovieApp(storage)
-    app.run()
+    if args.command is None:
+        app.run()
+    elif args.command == "batch":
+        if args.file == "-":
+            run_batch(app, sys.stdin)
+        else:
+            with open(args.file, 'r') as batch_file:
+                run_batch(app, batch_file)
+    elif args.command == "serve":
+        serve(app, args.host, args.port, args.flush_interval)
+    else:
+        run_command(app, args)
 
 
 if __name__ == "__main__":
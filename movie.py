@@ -0,0 +1,108 @@
+from collections.abc import MutableMapping
+import sys
+
+
+class Movie(MutableMapping):
+    """Compact record holding the information of one movie.
+
+        A dictionary per movie costs a hash table with its own copy of the field names;
+        a slotted record only stores the six values. Countries and years repeat across
+        the catalog, so string values of those fields are interned and every movie from
+        the same country or year shares one string.
+
+        The record behaves like the movie information dictionary returned by
+        IStorage.list_movies(): fields can be read and set with movie['rating'], get(),
+        items() and so on, and it compares equal to a dictionary with the same values.
+        Fields cannot be added or removed.
+        """
+    FIELDS = ('rating', 'year', 'poster_url', 'country', 'imdb_id', 'notes')
+    INTERNED_FIELDS = ('year', 'country')
+    __slots__ = FIELDS
+
+    def __init__(self, rating, year, poster_url, country, imdb_id, notes):
+        """
+            Initializes the Movie instance.
+
+            Args:
+                rating (float): The rating of the movie.
+                year (int | str): The release year of the movie.
+                poster_url (str): The URL of the movie poster.
+                country (str): The country of origin of the movie.
+                imdb_id (str): The IMDb ID of the movie.
+                notes (str): Any additional notes about the movie.
+            """
+        self.rating = rating
+        self.year = sys.intern(year) if isinstance(year, str) else year
+        self.poster_url = poster_url
+        self.country = sys.intern(country) if isinstance(country, str) else country
+        self.imdb_id = imdb_id
+        self.notes = notes
+
+    @classmethod
+    def from_info(cls, info):
+        """
+            Creates a record from a movie information dictionary.
+
+            Args:
+                info (dict): The movie information in the shape returned by IStorage.list_movies().
+
+            Returns:
+                Movie: The record.
+            """
+        return cls(info['rating'], info['year'], info.get('poster_url', ''), info.get('country', ''),
+                   info.get('imdb_id', ''), info.get('notes', ''))
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """
+            json.load() object_pairs_hook that turns movie objects into records while parsing,
+            without building their dictionaries first. Other objects become dictionaries.
+
+            Args:
+                pairs (list): The (key, value) pairs of a JSON object.
+
+            Returns:
+                Movie | dict: The record, or a dictionary if the object is not a movie.
+            """
+        if len(pairs) == len(cls.FIELDS):
+            # Files written by the storages keep the fields in FIELDS order
+            if all(pair[0] == field for pair, field in zip(pairs, cls.FIELDS)):
+                return cls(*[value for key, value in pairs])
+            values = dict(pairs)
+            if values.keys() == set(cls.FIELDS):
+                return cls(**values)
+        return dict(pairs)
+
+    def to_dict(self):
+        """
+            Returns the movie information as a plain dictionary.
+
+            Returns:
+                dict: The movie information without the title.
+            """
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        if key in self.INTERNED_FIELDS and isinstance(value, str):
+            value = sys.intern(value)
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        raise TypeError("Movie fields cannot be deleted")
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __repr__(self):
+        return f"Movie({', '.join(f'{field}={getattr(self, field)!r}' for field in self.FIELDS)})"
+
@@ -1,15 +1,251 @@
-import requests
+import threading
+import sqlite3
+import json
+import time
+import os
+
+
+class TokenBucket:
+    """Token bucket rate limiter shared by all threads using one MovieAPI client."""
+
+    def __init__(self, rate, capacity=None):
+        """
+            Initializes the TokenBucket instance.
+
+            Args:
+                rate (float): Number of tokens added per second.
+                capacity (float): Maximum number of tokens, i.e. the allowed burst. Defaults to rate.
+            """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.__tokens = self.capacity
+        self.__updated = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def acquire(self):
+        """Takes one token, sleeping until one is available."""
+        while True:
+            with self.__lock:
+                now = time.monotonic()
+                self.__tokens = min(self.capacity, self.__tokens + (now - self.__updated) * self.rate)
+                self.__updated = now
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return
+                wait = (1 - self.__tokens) / self.rate
+            time.sleep(wait)
+
+
+class ResponseCache:
+    """Persistent OMDb response cache stored in an SQLite file, with a time to live per entry."""
+
+    def __init__(self, file_path, ttl):
+        """
+            Initializes the ResponseCache instance.
+
+            Args:
+                file_path (str): The path to the SQLite cache file.
+                ttl (float): Number of seconds a cached response stays valid.
+            """
+        self.ttl = ttl
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(file_path, check_same_thread=False)
+        with self.__connection:
+            self.__connection.execute(
+                'CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, fetched_at REAL, body TEXT)'
+            )
+
+    def get(self, key):
+        """
+            Looks up a cached response.
+
+            Args:
+                key (str): The normalized lookup key.
+
+            Returns:
+                dict: The cached response, or None if it is missing or expired.
+            """
+        with self.__lock:
+            row = self.__connection.execute(
+                'SELECT fetched_at, body FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+        if row is None or time.time() - row[0] > self.ttl:
+            return None
+        return json.loads(row[1])
+
+    def set(self, key, response):
+        """
+            Stores a response in the cache.
+
+            Args:
+                key (str): The normalized lookup key.
+                response (dict): The decoded OMDb response.
+            """
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                'INSERT OR REPLACE INTO responses (key, fetched_at, body) VALUES (?, ?, ?)',
+                (key, time.time(), json.dumps(response))
+            )
+
+    def close(self):
+        """Closes the cache file."""
+        self.__connection.close()
 
 
 class MovieAPI:
-    OMDB_API_KEY = '4b3bad41'
+    """Client for the OMDb API.
+
+        Requests go through a pooled keep-alive session, are rate limited with a token
+        bucket and retried with exponential backoff on connection errors, 429 and 5xx
+        responses. Successful lookups and "not found" answers are cached on disk.
+        """
+    OMDB_API_KEY = os.environ.get('OMDB_API_KEY', '4b3bad41')
+    OMDB_URL = 'http://www.omdbapi.com/'
+    CACHE_FILE_PATH = 'omdb_cache.sqlite3'
+    CACHE_TTL = 7 * 24 * 60 * 60
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+    def __init__(self, api_key=None, base_url=OMDB_URL, session=None, cache_path=CACHE_FILE_PATH,
+                 cache_ttl=CACHE_TTL, requests_per_second=10, max_retries=3, backoff=0.5, timeout=10,
+                 pool_size=10):
+        """
+            Initializes the MovieAPI client.
+
+            Args:
+                api_key (str): The OMDb API key. Defaults to OMDB_API_KEY.
+                base_url (str): The OMDb endpoint, can point to a local stand-in server in tests.
+                session (requests.Session): Session to send requests with. A pooled session is created if omitted.
+                cache_path (str): Path of the on-disk response cache, or None to disable caching.
+                cache_ttl (float): Number of seconds a cached response stays valid.
+                requests_per_second (float): Maximum sustained request rate, or None for no limit.
+                max_retries (int): How many times a failed request is retried.
+                backoff (float): Delay before the first retry in seconds, doubled on every further retry.
+                timeout (float): Timeout of a single request in seconds.
+                pool_size (int): Number of keep-alive connections kept by the created session.
+            """
+        self.api_key = api_key or self.OMDB_API_KEY
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        # requests is imported on first use so that starting the app does not load it
+        import requests
+        if session is None:
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self.cache = ResponseCache(cache_path, cache_ttl) if cache_path else None
+        self.rate_limiter = TokenBucket(requests_per_second) if requests_per_second else None
+
+    def fetch_movie_info(self, title):
+        """
+            Fetches movie information from the OMDb API by title.
+
+            Args:
+                title (str): The title of the movie.
+
+            Returns:
+                dict: The decoded OMDb response.
+            """
+        key = 'title:' + ' '.join(title.lower().split())
+        return self._fetch(key, {'t': title})
+
+    def fetch_movie_info_by_id(self, imdb_id):
+        """
+            Fetches movie information from the OMDb API by IMDb ID.
+
+            Args:
+                imdb_id (str): The IMDb ID of the movie.
+
+            Returns:
+                dict: The decoded OMDb response.
+            """
+        key = 'imdb_id:' + imdb_id.strip().lower()
+        return self._fetch(key, {'i': imdb_id.strip()})
 
     @staticmethod
-    def fetch_movie_info(title):
-        """Fetches movie information from the OMDb API."""
-        url = f'http://www.omdbapi.com/?apikey={MovieAPI.OMDB_API_KEY}&t={title}'
-        response = requests.get(url)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            raise Exception(f"Failed to fetch movie information. Status code: {response.status_code}")
+    def parse_movie_info(movie_info):
+        """
+            Extracts the fields stored for a movie from a successful OMDb response.
+
+            Args:
+                movie_info (dict): The decoded OMDb response.
+
+            Returns:
+                tuple: The movie title and its information in the shape returned by IStorage.list_movies().
+            """
+        try:
+            rating = float(movie_info.get('imdbRating', 0.0))
+        except ValueError:
+            # OMDb reports "N/A" for movies without enough votes
+            rating = 0.0
+        country = movie_info.get('Country', '')
+        if ',' in country:
+            country = country.split(', ')[0]
+
+        return movie_info.get('Title', ''), {
+            'rating': rating,
+            'year': movie_info.get('Year', ''),
+            'poster_url': movie_info.get('Poster', ''),
+            'country': country,
+            'imdb_id': movie_info.get('imdbID', ''),
+            'notes': ''
+        }
+
+    def _fetch(self, key, params):
+        """
+            Returns a cached response or requests it from the API and caches it.
+
+            Args:
+                key (str): The normalized cache key.
+                params (dict): The lookup query parameters.
+
+            Returns:
+                dict: The decoded OMDb response.
+            """
+        if self.cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        movie_info = self._request(params)
+        # Errors such as "Request limit reached!" are temporary and must not be cached
+        if self.cache and (movie_info.get('Response') == 'True' or movie_info.get('Error') == 'Movie not found!'):
+            self.cache.set(key, movie_info)
+        return movie_info
+
+    def _request(self, params):
+        """
+            Sends a request to the API, retrying transient failures.
+
+            Args:
+                params (dict): The lookup query parameters.
+
+            Returns:
+                dict: The decoded OMDb response.
+            """
+        import requests
+        params = dict(params, apikey=self.api_key)
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            try:
+                response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise Exception(f"Failed to fetch movie information: {e}")
+            else:
+                if response.status_code == 200:
+                    return response.json()
+                if response.status_code not in self.RETRY_STATUS_CODES or attempt == self.max_retries:
+                    raise Exception(f"Failed to fetch movie information. Status code: {response.status_code}")
+            time.sleep(self.backoff * 2 ** attempt)
+
+    def close(self):
+        """Closes the HTTP session and the response cache."""
+        self.session.close()
+        if self.cache:
+            self.cache.close()
@@ -1,9 +1,12 @@
-import matplotlib.pyplot as plt
-from fuzzywuzzy import process
 from colorama import Fore
 from movie_api import MovieAPI
+from movie_importer import MovieImporter
+from search_index import SearchIndex
+from movie_query import MovieQuery
 from website_generator import WebsiteGenerator
-from statistics import Statistics
+from poster_cache import PosterCache
+from statistics import IncrementalStatistics
+from histogram import RatingHistogram
 from istorage import IStorage
 
 
@@ -12,9 +15,21 @@ class MovieApp:
 
         Attributes:
             WEBSITE_TITLE (str): The title of the generated movie website.
+            WEBSITE_MOVIES_PER_PAGE (int): Movies per page of the generated website, None for a single page.
+            WEBSITE_GROUP_BY (str): 'year' or 'country' to add pages per year or country to a paginated website.
+            WEBSITE_JOBS (int): Number of worker processes rendering the website.
+            WEBSITE_CACHE_POSTERS (bool): Download the posters into POSTER_DIRECTORY and show local thumbnails.
+            HISTOGRAM_FILE (str): The file the rating histogram is saved to.
             menu_options (dict): A dictionary mapping menu choices to corresponding functions.
         """
     WEBSITE_TITLE = 'My Movie App'
+    WEBSITE_MOVIES_PER_PAGE = None
+    WEBSITE_GROUP_BY = None
+    WEBSITE_JOBS = 1
+    # Off by default, downloading the posters needs the network and can take long for a big catalog
+    WEBSITE_CACHE_POSTERS = False
+    POSTER_DIRECTORY = PosterCache.DIRECTORY
+    HISTOGRAM_FILE = 'rating_histogram.svg'
     menu_options = {
         "0": ("Exit", "movies_exit"),
         "1": ("List movies", "movies_print"),
@@ -26,17 +41,32 @@ class MovieApp:
         "7": ("Search movie", "movies_search"),
         "8": ("Movies sorted by rating", "movies_by_rating"),
         "9": ("Create rating Histogram", "movies_rating_histogram"),
-        "10": ("Generate website", "movies_website_generate")
+        "10": ("Generate website", "movies_website_generate"),
+        "11": ("Import movies from file", "movies_import"),
+        "12": ("Top rated movies", "movies_top"),
+        "13": ("Filter movies", "movies_filter")
     }
 
-    def __init__(self, storage_instance: IStorage):
+    def __init__(self, storage_instance: IStorage, movie_api: MovieAPI = None):
         """
             Initializes the MovieApp instance.
 
             Args:
                 storage_instance (IStorage): An instance of the storage interface for movie data storage.
+                movie_api (MovieAPI): The OMDb client to use. A default client is created on first use if omitted.
             """
         self.storage = storage_instance
+        self.__movie_api = movie_api
+        self.__search_index = None
+        self.__movie_query = None
+        self.__statistics = None
+
+    @property
+    def movie_api(self):
+        """MovieAPI: The OMDb client, created on first use."""
+        if self.__movie_api is None:
+            self.__movie_api = MovieAPI()
+        return self.__movie_api
 
     def menu_print(self):
         """Prints the menu options."""
@@ -51,7 +81,7 @@ class MovieApp:
 
         while True:
             self.menu_print()
-            choice = input("\n" + Fore.GREEN + "Enter choice (0-10): " + Fore.RESET)
+            choice = input("\n" + Fore.GREEN + f"Enter choice (0-{len(self.menu_options) - 1}): " + Fore.RESET)
 
             if choice in self.menu_options:
                 try:
@@ -82,12 +112,13 @@ class MovieApp:
             for title, info in movies.items():
                 print(f"{title}, Rating: {info['rating']}, Year: {info['year']}")
 
-    def movies_add(self):
+    def movies_add(self, title=None):
         """ Function asks user to enter movie name, rating and a year,
             then adds them to movies database
             """
         movies = self.storage.list_movies()
-        title = input("Please enter a movie name: ")
+        if title is None:
+            title = input("Please enter a movie name: ")
 
         try:
             # Check if the inputted title partially matches any existing movie names
@@ -101,31 +132,24 @@ class MovieApp:
                 return
 
             # Fetch movie information from OMDb
-            movie_info = MovieAPI.fetch_movie_info(title)
+            movie_info = self.movie_api.fetch_movie_info(title)
 
             if movie_info['Response'] == 'True':
-                title = movie_info.get('Title', '')
-                year = movie_info.get('Year', '')
-                rating = float(movie_info.get('imdbRating', 0.0))
-                poster_url = movie_info.get('Poster', '')
-                country = movie_info.get('Country', '')
-                if ',' in country:
-                    country = country.split(', ')[0]
-                imdb_id = movie_info.get('imdbID', '')
-
-                self.storage.add_movie(title, year, rating, poster_url, country, imdb_id, notes='')
+                title, info = MovieAPI.parse_movie_info(movie_info)
+                self.storage.add_movie(title, **info)
                 print(f"Movie {title} successfully added")
             else:
                 print(Fore.RED + f"Movie {title} not found on OMDb.\n")
         except Exception as e:
             print(Fore.RED + f"An error occurred: {e}\n")
 
-    def movies_delete(self):
+    def movies_delete(self, title=None):
         """ Function asks user which movie to delete, and deletes it.
             If the movie does not exist, prints an error message
             """
         movies = self.storage.list_movies()
-        title = input("Please enter a movie name: ")
+        if title is None:
+            title = input("Please enter a movie name: ")
         movie = movies.get(title)
 
         if movie:
@@ -134,21 +158,34 @@ class MovieApp:
         else:
             print(Fore.RED + "Error. No such movie name in a database")
 
-    def movies_update(self):
+    def movies_update(self, title=None, notes=None):
         """ Function asks user which movie to update and if it exists, asks user for notes
             If the movie does not exist prints an error message.
             """
         # Get the data from the JSON file
         movies = self.storage.list_movies()
-        title = input("Enter movie name: ")
+        if title is None:
+            title = input("Enter movie name: ")
         if title not in movies:
             print(Fore.RED + f"Error: Movie '{title}' doesn't exist in database.\n")
             return
 
-        notes = input(f"Enter movie notes for '{title}': ")
+        if notes is None:
+            notes = input(f"Enter movie notes for '{title}': ")
         self.storage.update_movie(title, notes)
         print(f"Notes added for movie '{title}'.\n")
 
+    def statistics(self):
+        """ Returns the rating statistics, computing them on first use and afterwards
+            only applying the movies added, removed or changed since the last call.
+            """
+        movies = self.storage.list_movies()
+        if self.__statistics is None:
+            self.__statistics = IncrementalStatistics(movies)
+        else:
+            self.__statistics.sync(movies)
+        return self.__statistics
+
     def movies_stats(self):
         """ Prints statistics about the movies in the database:
             - Average rating
@@ -156,20 +193,15 @@ class MovieApp:
             - Best movie(s) by rating
             - Worst movie(s) by rating
             """
-        movies = self.storage.list_movies()
-        if not movies:
+        stats = self.statistics().summary()
+        if not stats['count']:
             print("No movies found.")
             return
 
-        average_rating = Statistics.calculate_average_rating(movies)
-        median_rating = Statistics.calculate_median_rating(movies)
-        best_rating, best_movies = Statistics.find_best_movies(movies)
-        worst_rating, worst_movies = Statistics.find_worst_movies(movies)
-
-        print(f"Average rating: {average_rating}")
-        print(f"Median rating: {median_rating}")
-        print(f"Best movie(s) by rating ({best_rating}): {', '.join(best_movies)}")
-        print(f"Worst movie(s) by rating ({worst_rating}): {', '.join(worst_movies)}")
+        print(f"Average rating: {stats['average']}")
+        print(f"Median rating: {stats['median']}")
+        print(f"Best movie(s) by rating ({stats['best_rating']}): {', '.join(stats['best_movies'])}")
+        print(f"Worst movie(s) by rating ({stats['worst_rating']}): {', '.join(stats['worst_movies'])}")
 
     def movies_random(self):
         """ Picks a random movie from the movies dictionary and prints its name and rating.
@@ -186,68 +218,167 @@ class MovieApp:
 
         print(f"Random movie: {random_movie_name}, Rating: {rating}, Year: {year}")
 
-    @staticmethod
-    def get_original_movie_name(movies, term_lower):
-        """ Get the original movie name from the dictionary based on its lowercase version. """
-        return next(name for name in movies.keys() if name.lower() == term_lower)
+    def search_index(self):
+        """ Returns the fuzzy search index, building it on first use and afterwards
+            only applying the titles added or removed since the last search.
+            """
+        movies = self.storage.list_movies()
+        if self.__search_index is None:
+            self.__search_index = SearchIndex(movies)
+        else:
+            self.__search_index.sync(movies)
+        return self.__search_index
 
-    def movies_search(self):
+    def movies_search(self, term=None):
         """
             Searches for movies with fuzzy matching and suggests similar movie names.
             """
-        movies = self.storage.list_movies()
-        term = input("Enter the title of the movie to search for: ")
-        term_lower = term.lower()
+        search_index = self.search_index()
+        if term is None:
+            term = input("Enter the title of the movie to search for: ")
 
-        # Convert movie names to lowercase for case-insensitive comparison
-        movie_names_lower = [name.lower() for name in movies.keys()]
-
-        # Using fuzzywuzzy process.extract function to get similar matches
-        similar_matches = process.extract(term_lower, movie_names_lower, limit=3)
-
-        if term_lower in movie_names_lower:
-            original_movie_name = self.get_original_movie_name(movies, term_lower)
+        original_movie_name = search_index.find_exact(term)
+        if original_movie_name:
             print(f"Movie '{original_movie_name}' found with exact match.")
-        elif similar_matches:
+            return
+
+        similar_matches = search_index.search(term, limit=3)
+        if similar_matches:
             print(f"The movie '{term}' does not exist. Did you mean:")
-            for similar_movie, score in similar_matches:
-                original_movie_name = self.get_original_movie_name(movies, similar_movie)
+            for original_movie_name, score in similar_matches:
                 print(f"{original_movie_name}")
         else:
             print(f"No results found for '{term}'.")
 
+    def movie_query(self):
+        """ Returns the query index over ratings, years and countries, building it on first use
+            and afterwards only applying the movies added, removed or changed since the last query.
+            """
+        movies = self.storage.list_movies()
+        if self.__movie_query is None:
+            self.__movie_query = MovieQuery(movies)
+        else:
+            self.__movie_query.sync(movies)
+        return self.__movie_query
+
     def movies_by_rating(self):
         """Prints movies sorted by their ratings in descending order.
             """
-        # Get the data from the JSON file
+        movie_query = self.movie_query()
         movies = self.storage.list_movies()
         print("Movies sorted by rating:")
-        for title, info in sorted(movies.items(), key=lambda x: x[1]['rating'], reverse=True):
-            rating = info['rating']
-            year = info['year']
-            print(f"{title} (Rating: {rating}, Year: {year})")
+        for title in movie_query.by_rating():
+            info = movies[title]
+            print(f"{title} (Rating: {info['rating']}, Year: {info['year']})")
 
-    def movies_rating_histogram(self):
-        """Creates a histogram of the ratings of the movies and saves the plot to a file."""
-        # Get the data from the JSON file
+    def movies_query(self, top=None, min_rating=None, max_rating=None, min_year=None, max_year=None, country=None):
+        """ Prints the best rated movies matching the given conditions. Conditions left as None are ignored.
+            """
+        titles = self.movie_query().top_k(top, min_rating, max_rating, min_year, max_year, country)
         movies = self.storage.list_movies()
-        ratings = [movie['rating'] for movie in movies.values()]
+        if not titles:
+            print("No movies found.")
+            return
+        for title in titles:
+            info = movies[title]
+            print(f"{title} (Rating: {info['rating']}, Year: {info['year']}, Country: {info['country']})")
 
-        plt.hist(ratings, bins=10, alpha=0.5, edgecolor='black')
-        plt.xlabel('Rating')
-        plt.ylabel('Frequency')
-        plt.title('Rating Histogram')
-        plt.savefig('rating_histogram.png')
-        print('Histogram saved to rating_histogram.png')
+    @staticmethod
+    def input_number(prompt, number_type):
+        """ Asks the user for an optional number and returns None if the answer is left blank. """
+        while True:
+            answer = input(prompt).strip()
+            if not answer:
+                return None
+            try:
+                return number_type(answer)
+            except ValueError:
+                print(Fore.RED + "Please enter a number or leave it blank." + Fore.RESET)
+
+    def movies_top(self):
+        """ Asks the user how many movies to show and prints the best rated ones.
+            """
+        top = self.input_number("How many movies to show? (blank for 10): ", int) or 10
+        self.movies_query(top=top)
 
-    def movies_website_generate(self):
-        """ Generates a movies website by replacing placeholders in the HTML template """
+    def movies_filter(self):
+        """ Asks the user for a rating range, a year range and a country, all optional,
+            and prints the matching movies sorted by rating.
+            """
+        min_rating = self.input_number("Minimum rating (blank for any): ", float)
+        max_rating = self.input_number("Maximum rating (blank for any): ", float)
+        min_year = self.input_number("Start year (blank for any): ", int)
+        max_year = self.input_number("End year (blank for any): ", int)
+        country = input("Country (blank for any): ").strip() or None
+        self.movies_query(None, min_rating, max_rating, min_year, max_year, country)
+
+    def movies_rating_histogram(self, file_path=None):
+        """ Prints a histogram of the ratings of the movies and saves it to a file.
+            The file type follows the extension: '.svg' and '.txt' are written directly,
+            other image formats like '.png' need matplotlib. Defaults to HISTOGRAM_FILE. """
+        histogram = RatingHistogram(self.statistics().histogram())
+        print(histogram.to_text())
+
+        file_path = file_path or self.HISTOGRAM_FILE
+        histogram.save(file_path)
+        print(f'Histogram saved to {file_path}')
+
+    def movies_website_generate(self, per_page=None, group_by=None, jobs=None, cache_posters=None):
+        """ Generates a movies website by replacing placeholders in the HTML template.
+            With per_page set, or WEBSITE_MOVIES_PER_PAGE, the website is split into pages.
+            With cache_posters, or WEBSITE_CACHE_POSTERS, the posters are downloaded first and the
+            website shows the local copies; posters that fail to download keep their URL. """
         # Get the data from the JSON file
         movies = self.storage.list_movies()
+        per_page = per_page or self.WEBSITE_MOVIES_PER_PAGE
+        jobs = jobs or self.WEBSITE_JOBS
+        cache_posters = self.WEBSITE_CACHE_POSTERS if cache_posters is None else cache_posters
+        posters = self.__cache_posters(movies) if cache_posters else None
+
+        if per_page:
+            WebsiteGenerator.generate_paginated_website(
+                movies,
+                '_static/index_template.html',
+                '_static',
+                self.WEBSITE_TITLE,
+                per_page=per_page,
+                group_by=group_by or self.WEBSITE_GROUP_BY,
+                jobs=jobs,
+                posters=posters
+            )
+            return
 
         WebsiteGenerator.generate_website_content(
             movies,
             '_static/index_template.html',
             '_static/index.html',
-            self.WEBSITE_TITLE
+            self.WEBSITE_TITLE,
+            jobs=jobs,
+            posters=posters
         )
+
+    def __cache_posters(self, movies):
+        """ Downloads the posters that are not cached yet and returns their local paths relative to _static """
+        poster_cache = PosterCache(self.POSTER_DIRECTORY)
+        poster_urls = [movie_info.get('poster_url') for movie_info in movies.values()]
+        downloaded, failures = poster_cache.prefetch(poster_urls)
+        if downloaded:
+            print(Fore.GREEN + f"{downloaded} posters were downloaded.")
+        for poster_url, reason in failures[:5]:
+            print(Fore.RED + f"Could not download the poster {poster_url}: {reason}")
+        if len(failures) > 5:
+            print(Fore.RED + f"{len(failures) - 5} more posters could not be downloaded.")
+        return poster_cache.sources(poster_urls, '_static')
+
+    def movies_import(self, file_path=None):
+        """ Imports all titles or IMDb IDs listed in a text or CSV file, resolving them concurrently
+            through OMDb, and prints a summary with the lookups that failed.
+            """
+        if file_path is None:
+            file_path = input("Enter the path of the file with titles or IMDb IDs: ")
+        importer = MovieImporter(self.storage, self.movie_api)
+        added, failures = importer.import_file(file_path)
+
+        print(f"{len(added)} movies imported, {len(failures)} failed.")
+        for lookup, reason in failures:
+            print(Fore.RED + f"{lookup}: {reason}" + Fore.RESET)
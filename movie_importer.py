@@ -0,0 +1,135 @@
+from movie_api import MovieAPI
+from istorage import IStorage
+import csv
+import re
+
+
+class MovieImporter:
+    """Imports many movies at once by resolving titles or IMDb IDs concurrently through OMDb.
+
+        Lookups run on a bounded thread pool sharing one MovieAPI client, so the client's
+        rate limit, connection pool and response cache apply to the whole import. The
+        resolved movies are written to storage with a single add_movies() call.
+        """
+    IMDB_ID_PATTERN = re.compile(r'^tt\d+$')
+    PROGRESS_EVERY = 100
+
+    def __init__(self, storage_instance: IStorage, movie_api: MovieAPI, max_workers=8):
+        """
+            Initializes the MovieImporter instance.
+
+            Args:
+                storage_instance (IStorage): The storage the movies are added to.
+                movie_api (MovieAPI): The OMDb client used to resolve the lookups.
+                max_workers (int): Maximum number of lookups running at the same time.
+            """
+        self.storage = storage_instance
+        self.movie_api = movie_api
+        self.max_workers = max_workers
+
+    @staticmethod
+    def read_lookups(file_path):
+        """
+            Reads the titles or IMDb IDs to import from a file.
+
+            Text files contain one title or IMDb ID per line. CSV files use their 'imdb_id' or
+            'title' column if they have a header with one of those names, otherwise the first column.
+
+            Args:
+                file_path (str): The path to the text or CSV file.
+
+            Returns:
+                list: The titles and IMDb IDs in file order, without blanks and duplicates.
+            """
+        with open(file_path, 'r', newline='') as lookups_file:
+            if file_path.endswith('.csv'):
+                rows = list(csv.reader(lookups_file))
+                column = 0
+                if rows:
+                    header = [name.strip().lower() for name in rows[0]]
+                    for name in ('imdb_id', 'title'):
+                        if name in header:
+                            column = header.index(name)
+                            rows = rows[1:]
+                            break
+                lookups = [row[column] for row in rows if len(row) > column]
+            else:
+                lookups = list(lookups_file)
+
+        return list(dict.fromkeys(lookup.strip() for lookup in lookups if lookup.strip()))
+
+    def _resolve(self, lookup):
+        """
+            Looks up a single title or IMDb ID on OMDb.
+
+            Args:
+                lookup (str): The title or IMDb ID.
+
+            Returns:
+                dict: The decoded OMDb response.
+            """
+        if self.IMDB_ID_PATTERN.match(lookup):
+            return self.movie_api.fetch_movie_info_by_id(lookup)
+        return self.movie_api.fetch_movie_info(lookup)
+
+    def import_movies(self, lookups, progress=print):
+        """
+            Resolves the lookups concurrently and adds the found movies to storage in one batch.
+
+            Movies that are already in the storage are skipped.
+
+            Args:
+                lookups (list): Titles and IMDb IDs to import.
+                progress (callable): Called with a progress message, or None to stay silent.
+
+            Returns:
+                tuple: The dictionary of added movies and a list of (lookup, reason) failures.
+            """
+        results = {}
+        total = len(lookups)
+
+        # Imported here so commands that never import movies do not pay for it at startup
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._resolve, lookup): lookup for lookup in lookups}
+            for done, future in enumerate(as_completed(futures), start=1):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    results[futures[future]] = e
+                if progress and (done % self.PROGRESS_EVERY == 0 or done == total):
+                    progress(f"Resolved {done}/{total} movies")
+
+        # Collect in input order so the stored order does not depend on which lookup finished first
+        existing = self.storage.list_movies()
+        added = {}
+        failures = []
+        for lookup in lookups:
+            movie_info = results[lookup]
+            if isinstance(movie_info, Exception):
+                failures.append((lookup, str(movie_info)))
+            elif movie_info.get('Response') != 'True':
+                failures.append((lookup, movie_info.get('Error', 'Not found on OMDb')))
+            else:
+                title, info = MovieAPI.parse_movie_info(movie_info)
+                if title in existing or title in added:
+                    failures.append((lookup, f"'{title}' is already in the database"))
+                else:
+                    added[title] = info
+
+        if added:
+            self.storage.add_movies(added)
+        return added, failures
+
+    def import_file(self, file_path, progress=print):
+        """
+            Imports all titles and IMDb IDs listed in a file.
+
+            Args:
+                file_path (str): The path to the text or CSV file.
+                progress (callable): Called with a progress message, or None to stay silent.
+
+            Returns:
+                tuple: The dictionary of added movies and a list of (lookup, reason) failures.
+            """
+        return self.import_movies(self.read_lookups(file_path), progress)
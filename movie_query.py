@@ -0,0 +1,227 @@
+from bisect import bisect_left, bisect_right, insort
+from operator import itemgetter
+import heapq
+import re
+
+
+class MovieQuery:
+    """Query layer over the movie catalog backed by secondary indexes.
+
+        Keeps movies sorted by rating and by year, plus a country to titles map, so that
+        top-k lookups and range filters use bisect instead of scanning and sorting the
+        whole catalog. Combined filters start from the smallest matching index and check
+        the other conditions only for those candidates.
+        """
+    YEAR_PATTERN = re.compile(r'\d{4}')
+
+    def __init__(self, movies=None):
+        """
+            Initializes the MovieQuery instance.
+
+            Args:
+                movies (dict): The catalog in the shape returned by IStorage.list_movies().
+            """
+        self.__movies = {}
+        # Ratings are negated so that the best movies come first and ties stay in title order
+        self.__by_rating = []
+        self.__by_year = []
+        self.__by_country = {}
+        if movies:
+            self.__build(movies)
+
+    def __len__(self):
+        return len(self.__movies)
+
+    @classmethod
+    def parse_year(cls, year):
+        """
+            Converts a stored year to a number. OMDb gives series years as ranges like '2011–2019',
+            in which case the first year is used.
+
+            Args:
+                year (int | str): The stored year.
+
+            Returns:
+                int: The year, or None if it cannot be read.
+            """
+        if isinstance(year, int):
+            return year
+        match = cls.YEAR_PATTERN.search(str(year))
+        return int(match.group()) if match else None
+
+    def __build(self, movies):
+        """Builds all indexes at once, sorting each one a single time."""
+        for title, info in movies.items():
+            self.__movies[title] = (float(info['rating']), self.parse_year(info['year']), info['country'])
+        self.__by_rating = sorted((-rating, title) for title, (rating, year, country) in self.__movies.items())
+        self.__by_year = sorted((year, title) for title, (rating, year, country) in self.__movies.items()
+                                if year is not None)
+        for title, (rating, year, country) in self.__movies.items():
+            self.__by_country.setdefault(country, set()).add(title)
+
+    def add(self, title, info):
+        """
+            Adds a movie to the indexes, replacing the previous entry with the same title.
+
+            Args:
+                title (str): The movie title.
+                info (dict): The movie information.
+            """
+        if title in self.__movies:
+            self.remove(title)
+        rating, year, country = float(info['rating']), self.parse_year(info['year']), info['country']
+        self.__movies[title] = (rating, year, country)
+        insort(self.__by_rating, (-rating, title))
+        if year is not None:
+            insort(self.__by_year, (year, title))
+        self.__by_country.setdefault(country, set()).add(title)
+
+    def remove(self, title):
+        """
+            Removes a movie from the indexes.
+
+            Args:
+                title (str): The movie title.
+            """
+        if title not in self.__movies:
+            return
+        rating, year, country = self.__movies.pop(title)
+        del self.__by_rating[bisect_left(self.__by_rating, (-rating, title))]
+        if year is not None:
+            del self.__by_year[bisect_left(self.__by_year, (year, title))]
+        titles = self.__by_country[country]
+        titles.discard(title)
+        if not titles:
+            del self.__by_country[country]
+
+    def sync(self, movies):
+        """
+            Brings the indexes up to date with the catalog, re-indexing only the titles that changed.
+
+            Titles that were added or removed, and titles whose rating, year or country differs
+            from the indexed values, are updated with bisect; the others are only compared.
+
+            Args:
+                movies (dict): The catalog in the shape returned by IStorage.list_movies().
+            """
+        for title in self.__movies.keys() - movies.keys():
+            self.remove(title)
+        indexed = self.__movies
+        for title, info in movies.items():
+            entry = indexed.get(title)
+            if entry is None or entry != (float(info['rating']), self.parse_year(info['year']), info['country']):
+                self.add(title, info)
+
+    def _rating_range(self, min_rating=None, max_rating=None):
+        """Returns the slice bounds of the rating index for a rating range."""
+        low = 0 if max_rating is None else bisect_left(self.__by_rating, -max_rating, key=itemgetter(0))
+        high = len(self.__by_rating) if min_rating is None else \
+            bisect_right(self.__by_rating, -min_rating, key=itemgetter(0))
+        return low, high
+
+    def _year_range(self, min_year=None, max_year=None):
+        """Returns the slice bounds of the year index for a year range."""
+        low = 0 if min_year is None else bisect_left(self.__by_year, min_year, key=itemgetter(0))
+        high = len(self.__by_year) if max_year is None else bisect_right(self.__by_year, max_year, key=itemgetter(0))
+        return low, high
+
+    def _matches(self, title, min_rating, max_rating, min_year, max_year, country):
+        """Checks a single movie against all filter conditions."""
+        rating, year, movie_country = self.__movies[title]
+        if min_rating is not None and rating < min_rating or max_rating is not None and rating > max_rating:
+            return False
+        if min_year is not None or max_year is not None:
+            if year is None or min_year is not None and year < min_year or max_year is not None and year > max_year:
+                return False
+        return country is None or movie_country == country
+
+    def filter(self, min_rating=None, max_rating=None, min_year=None, max_year=None, country=None):
+        """
+            Finds the movies matching all given conditions. Conditions left as None are ignored.
+
+            Args:
+                min_rating (float): Lowest rating to include.
+                max_rating (float): Highest rating to include.
+                min_year (int): Earliest year to include.
+                max_year (int): Latest year to include.
+                country (str): Country the movie must come from.
+
+            Returns:
+                list: The matching titles, best rated first.
+            """
+        return self.top_k(None, min_rating, max_rating, min_year, max_year, country)
+
+    def top_k(self, n, min_rating=None, max_rating=None, min_year=None, max_year=None, country=None):
+        """
+            Finds the n best rated movies matching all given conditions. Conditions left as None are ignored.
+
+            Args:
+                n (int): Number of movies to return, or None for all matching movies.
+                min_rating (float): Lowest rating to include.
+                max_rating (float): Highest rating to include.
+                min_year (int): Earliest year to include.
+                max_year (int): Latest year to include.
+                country (str): Country the movie must come from.
+
+            Returns:
+                list: The matching titles, best rated first. Empty if n is zero or negative.
+            """
+        if n is not None and n <= 0:
+            return []
+        conditions = (min_rating, max_rating, min_year, max_year, country)
+        rating_low, rating_high = self._rating_range(min_rating, max_rating)
+
+        # Start from whichever index narrows the search down the most
+        candidates_count = rating_high - rating_low
+        candidates = None
+        if min_year is not None or max_year is not None:
+            year_low, year_high = self._year_range(min_year, max_year)
+            if year_high - year_low < candidates_count:
+                candidates_count = year_high - year_low
+                candidates = map(itemgetter(1), self.__by_year[year_low:year_high])
+        if country is not None:
+            country_titles = self.__by_country.get(country, ())
+            if len(country_titles) < candidates_count:
+                candidates_count = len(country_titles)
+                candidates = country_titles
+
+        # Walking the rating index from the top visits about n / (share of movies matching) entries,
+        # which beats checking every candidate when the other indexes are not selective enough
+        if candidates is not None and n is not None and \
+                n * (rating_high - rating_low) < candidates_count * max(candidates_count, 1):
+            candidates = None
+
+        if candidates is None:
+            # Walk the rating index from the top and stop as soon as enough movies matched
+            result = []
+            for index in range(rating_low, rating_high):
+                title = self.__by_rating[index][1]
+                if self._matches(title, *conditions):
+                    result.append(title)
+                    if n is not None and len(result) == n:
+                        break
+            return result
+
+        matching = [title for title in candidates if self._matches(title, *conditions)]
+        sort_key = lambda title: (-self.__movies[title][0], title)
+        if n is None:
+            return sorted(matching, key=sort_key)
+        return heapq.nsmallest(n, matching, key=sort_key)
+
+    def by_rating(self):
+        """
+            Returns all titles ordered by rating, best first, without sorting the catalog.
+
+            Returns:
+                list: The titles, best rated first.
+            """
+        return [title for rating, title in self.__by_rating]
+
+    def countries(self):
+        """
+            Returns the countries with the number of movies from each.
+
+            Returns:
+                dict: Country names as keys and movie counts as values.
+            """
+        return {country: len(titles) for country, titles in self.__by_country.items()}
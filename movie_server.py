@@ -0,0 +1,410 @@
+from movie_api import MovieAPI
+from search_index import SearchIndex
+from movie_query import MovieQuery
+from statistics import IncrementalStatistics
+from storage_batch import BatchStorage
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+import asyncio
+import json
+import signal
+import sys
+import uuid
+
+
+class HTTPError(Exception):
+    """An error answered to the client with an HTTP status code and a JSON body."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class MovieServer:
+    """HTTP JSON API serving the movie catalog to other tools.
+
+        The catalog is read from the storage once at start and kept in memory together with
+        the search index, the query indexes and the rating statistics, so reads never touch
+        the disk. Changes are applied to the in-memory catalog and its indexes right away and
+        written to the storage in batches through BatchStorage, every FLUSH_INTERVAL seconds
+        or as soon as MAX_PENDING changes are waiting, and once more on shutdown. The server
+        expects to be the only writer of the storage while it runs. OMDb lookups and storage
+        writes run on the server's own thread pool, so they never block the event loop.
+        A read-only storage, such as a StorageBinary catalog, is served with the GET endpoints
+        only and write requests are answered with 405.
+
+        Endpoints:
+            GET    /movies                  All movies, with an ETag honouring If-None-Match.
+            GET    /movies/<title>          One movie.
+            POST   /movies                  {"title": ...} looks the movie up on OMDb and adds it.
+            PATCH  /movies/<title>          {"notes": ...} updates the notes of a movie.
+            DELETE /movies/<title>          Deletes a movie.
+            GET    /search?q=<term>&limit=3 Exact and fuzzy title matches.
+            GET    /stats                   Rating statistics.
+            GET    /query?top=&min_rating=&max_rating=&min_year=&max_year=&country=
+                                            The best rated movies matching the conditions.
+        """
+    FLUSH_INTERVAL = 1.0
+    MAX_PENDING = 1000
+    MAX_BODY_SIZE = 64 * 1024
+    MAX_WORKERS = 8
+    REASONS = {200: 'OK', 201: 'Created', 204: 'No Content', 304: 'Not Modified', 400: 'Bad Request',
+               404: 'Not Found', 405: 'Method Not Allowed', 409: 'Conflict', 413: 'Payload Too Large',
+               500: 'Internal Server Error', 502: 'Bad Gateway'}
+
+    def __init__(self, storage_instance, movie_api=None, host='127.0.0.1', port=8000,
+                 flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING, max_workers=MAX_WORKERS):
+        """
+            Initializes the MovieServer instance.
+
+            Args:
+                storage_instance (IStorage): The storage the catalog is read from and the changes are written to.
+                movie_api (MovieAPI): The OMDb client used to add movies. A default client is created on first use.
+                host (str): The address to listen on.
+                port (int): The port to listen on, 0 to pick a free one.
+                flush_interval (float): Seconds between writes of the collected changes to the storage.
+                max_pending (int): Number of waiting changes that triggers a write right away.
+                max_workers (int): Number of threads running OMDb lookups and storage writes.
+            """
+        self.host = host
+        self.port = port
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_workers = max_workers
+        self.__movie_api = movie_api
+        self.__read_only = storage_instance.READ_ONLY
+        self.__batch = BatchStorage(storage_instance)
+        movies = self.__batch.list_movies()
+        self.__search_index = SearchIndex(movies)
+        self.__movie_query = MovieQuery(movies)
+        self.__statistics = IncrementalStatistics(movies)
+        # The generation keeps ETags from a previous run of the server from matching
+        self.__generation = uuid.uuid4().hex[:8]
+        self.__version = 0
+        self.__list_response = None
+        self.__write_lock = None
+        self.__flush_needed = None
+        self.__flush_task = None
+        self.__executor = None
+        self.__server = None
+
+    @property
+    def movie_api(self):
+        """MovieAPI: The OMDb client, created on first use."""
+        if self.__movie_api is None:
+            self.__movie_api = MovieAPI()
+        return self.__movie_api
+
+    @property
+    def pending(self):
+        """int: Number of changes not written to the storage yet."""
+        return self.__batch.pending
+
+    @property
+    def etag(self):
+        """str: The entity tag of the current catalog, changed by every write."""
+        return f'"{self.__generation}-{self.__version}"'
+
+    async def start(self):
+        """Starts listening and the background writer. self.port holds the actual port afterwards."""
+        self.__write_lock = asyncio.Lock()
+        self.__flush_needed = asyncio.Event()
+        self.__executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='movie-server')
+        self.__server = await asyncio.start_server(self.__handle_connection, self.host, self.port)
+        self.port = self.__server.sockets[0].getsockname()[1]
+        self.__flush_task = asyncio.create_task(self.__flush_periodically())
+
+    async def close(self):
+        """Stops listening and writes the changes that are still waiting."""
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+            self.__server = None
+        if self.__flush_task is not None:
+            self.__flush_task.cancel()
+            try:
+                await self.__flush_task
+            except asyncio.CancelledError:
+                pass
+            self.__flush_task = None
+        await self.flush()
+        if self.__executor is not None:
+            self.__executor.shutdown()
+            self.__executor = None
+
+    async def serve_forever(self):
+        """Starts the server and runs it until it is cancelled, e.g. by Ctrl+C, or receives SIGTERM."""
+        await self.start()
+        print(f"Serving the movie API on http://{self.host}:{self.port}/")
+        stopped = asyncio.Event()
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set)
+        except (NotImplementedError, AttributeError):
+            # Windows event loops have no signal handlers, Ctrl+C still works there
+            pass
+        try:
+            await stopped.wait()
+        finally:
+            await self.close()
+
+    async def __run_in_thread(self, function, *args):
+        """Runs a blocking call on the server's thread pool."""
+        return await asyncio.get_running_loop().run_in_executor(self.__executor, function, *args)
+
+    async def flush(self):
+        """Writes the collected changes to the storage in a worker thread, keeping the event loop free."""
+        async with self.__write_lock:
+            if self.__batch.pending:
+                await self.__run_in_thread(self.__batch.flush)
+
+    async def __flush_periodically(self):
+        """Background task writing the changes every flush_interval seconds or when too many are waiting."""
+        while True:
+            try:
+                await asyncio.wait_for(self.__flush_needed.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.__flush_needed.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                # The changes stay pending and are retried on the next round
+                print(f"Could not write the changes to the storage: {e}", file=sys.stderr)
+
+    def __changed(self):
+        """Invalidates the cached list response and wakes the writer up when enough changes are waiting."""
+        self.__version += 1
+        self.__list_response = None
+        if self.__batch.pending >= self.max_pending:
+            self.__flush_needed.set()
+
+    async def __handle_connection(self, reader, writer):
+        """Answers the requests of one keep-alive connection."""
+        try:
+            while True:
+                request = await self.__read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                try:
+                    response = await self.__dispatch(method, target, headers, body)
+                except HTTPError as e:
+                    response = (e.status, {'error': str(e)}, {})
+                except Exception as e:
+                    print(f"Error answering {method} {target}: {e}", file=sys.stderr)
+                    response = (500, {'error': 'Internal server error'}, {})
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                self.__write_response(writer, *response, keep_alive=keep_alive, head=method == 'HEAD')
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except HTTPError as e:
+            # The request itself could not be read, answer and drop the connection
+            self.__write_response(writer, e.status, {'error': str(e)}, {}, keep_alive=False)
+        finally:
+            writer.close()
+
+    async def __read_request(self, reader):
+        """
+            Reads one request from the connection.
+
+            Returns:
+                tuple: The method, target, headers with lowercase names and body, or None at the end of the connection.
+            """
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length > self.MAX_BODY_SIZE:
+            raise HTTPError(413, f"Request bodies are limited to {self.MAX_BODY_SIZE} bytes")
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target, headers, body
+
+    def __write_response(self, writer, status, payload, extra_headers, keep_alive=True, head=False):
+        """Writes a response with a JSON body; payload may be pre-encoded bytes or None for no body."""
+        if payload is None:
+            body = b''
+        elif isinstance(payload, bytes):
+            body = payload
+        else:
+            body = self.encode(payload)
+        lines = [f"HTTP/1.1 {status} {self.REASONS.get(status, '')}"]
+        if status not in (204, 304):
+            lines.append("Content-Type: application/json")
+            lines.append(f"Content-Length: {len(body)}")
+        lines.extend(f"{name}: {value}" for name, value in extra_headers.items())
+        lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if not head and status not in (204, 304):
+            writer.write(body)
+
+    @staticmethod
+    def encode(payload):
+        """Encodes a response body. Movie records are written as their information dictionaries."""
+        return json.dumps(payload, default=dict, separators=(',', ':')).encode()
+
+    async def __dispatch(self, method, target, headers, body):
+        """
+            Routes a request to its handler.
+
+            Returns:
+                tuple: The status code, the payload and extra response headers.
+            """
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.strip('/').split('/')]
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        reading = method in ('GET', 'HEAD')
+        if not reading and self.__read_only and (parts == ['movies'] or len(parts) == 2 and parts[0] == 'movies'):
+            raise HTTPError(405, f"The catalog is read-only, {method} is not supported on {url.path}")
+
+        if parts == ['movies']:
+            if reading:
+                return self.__list_movies(headers)
+            if method == 'POST':
+                return await self.__add_movie(self.__decode(body))
+        elif len(parts) == 2 and parts[0] == 'movies':
+            title = parts[1]
+            if reading:
+                return 200, self.__get_movie(title), {}
+            if method == 'PATCH':
+                return await self.__update_movie(title, self.__decode(body))
+            if method == 'DELETE':
+                return await self.__delete_movie(title)
+        elif parts == ['search'] and reading:
+            return 200, self.__search(params), {}
+        elif parts == ['stats'] and reading:
+            return 200, self.__statistics.summary(), {}
+        elif parts == ['query'] and reading:
+            return 200, self.__query(params), {}
+        else:
+            raise HTTPError(404, f"No such endpoint: {url.path}")
+        raise HTTPError(405, f"{method} is not supported on {url.path}")
+
+    @staticmethod
+    def __decode(body):
+        """Decodes a JSON object request body."""
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            raise HTTPError(400, "The request body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "The request body must be a JSON object")
+        return data
+
+    @staticmethod
+    def __number(params, name, number_type):
+        """Reads an optional numeric query parameter."""
+        value = params.get(name)
+        if value is None or value == '':
+            return None
+        try:
+            return number_type(value)
+        except ValueError:
+            raise HTTPError(400, f"Query parameter '{name}' must be a number")
+
+    def __list_movies(self, headers):
+        """Answers the whole catalog, encoded once per version of the catalog."""
+        etag = self.etag
+        requested = {tag.strip().removeprefix('W/') for tag in headers.get('if-none-match', '').split(',')}
+        if etag in requested or '*' in requested:
+            return 304, None, {'ETag': etag}
+        if self.__list_response is None:
+            self.__list_response = self.encode(self.__batch.list_movies())
+        return 200, self.__list_response, {'ETag': etag, 'Cache-Control': 'no-cache'}
+
+    def __get_movie(self, title):
+        """Answers one movie with its title."""
+        movie_info = self.__batch.list_movies().get(title)
+        if movie_info is None:
+            raise HTTPError(404, f"Movie '{title}' doesn't exist")
+        return dict(movie_info, title=title)
+
+    def __search(self, params):
+        """Answers the exact match of a search term and the most similar titles."""
+        term = params.get('q', '').strip()
+        if not term:
+            raise HTTPError(400, "Query parameter 'q' is required")
+        limit = self.__number(params, 'limit', int) or 3
+        return {'exact': self.__search_index.find_exact(term),
+                'matches': [{'title': title, 'score': score}
+                            for title, score in self.__search_index.search(term, limit=limit)]}
+
+    def __query(self, params):
+        """Answers the best rated movies matching the query parameters."""
+        titles = self.__movie_query.top_k(self.__number(params, 'top', int),
+                                          self.__number(params, 'min_rating', float),
+                                          self.__number(params, 'max_rating', float),
+                                          self.__number(params, 'min_year', int),
+                                          self.__number(params, 'max_year', int),
+                                          params.get('country') or None)
+        movies = self.__batch.list_movies()
+        return [dict(movies[title], title=title) for title in titles]
+
+    async def __add_movie(self, data):
+        """Looks a movie up on OMDb and adds it."""
+        title = data.get('title')
+        if not isinstance(title, str) or not title.strip():
+            raise HTTPError(400, "Field 'title' is required")
+        existing = self.__search_index.find_exact(title)
+        if existing:
+            raise HTTPError(409, f"Movie '{existing}' already exists")
+
+        try:
+            movie_info = await self.__run_in_thread(self.movie_api.fetch_movie_info, title)
+        except Exception as e:
+            raise HTTPError(502, f"OMDb lookup failed: {e}")
+        if movie_info.get('Response') != 'True':
+            raise HTTPError(404, f"Movie '{title}' not found on OMDb")
+        title, info = MovieAPI.parse_movie_info(movie_info)
+
+        async with self.__write_lock:
+            # Checked again, the OMDb title may differ from the one asked for and others may have added it meanwhile
+            if title in self.__batch.list_movies():
+                raise HTTPError(409, f"Movie '{title}' already exists")
+            self.__batch.add_movie(title, **info)
+            info = self.__batch.list_movies()[title]
+            self.__search_index.add(title)
+            self.__movie_query.add(title, info)
+            self.__statistics.add(title, info)
+            self.__changed()
+        return 201, dict(info, title=title), {'Location': f"/movies/{quote(title)}"}
+
+    async def __update_movie(self, title, data):
+        """Updates the notes of a movie."""
+        notes = data.get('notes')
+        if not isinstance(notes, str):
+            raise HTTPError(400, "Field 'notes' must be a string")
+        async with self.__write_lock:
+            if title not in self.__batch.list_movies():
+                raise HTTPError(404, f"Movie '{title}' doesn't exist")
+            self.__batch.update_movie(title, notes)
+            self.__changed()
+        return 200, self.__get_movie(title), {}
+
+    async def __delete_movie(self, title):
+        """Deletes a movie."""
+        async with self.__write_lock:
+            if title not in self.__batch.list_movies():
+                raise HTTPError(404, f"Movie '{title}' doesn't exist")
+            self.__batch.delete_movie(title)
+            self.__search_index.remove(title)
+            self.__movie_query.remove(title)
+            self.__statistics.remove(title)
+            self.__changed()
+        return 204, None, {}
@@ -0,0 +1,248 @@
+from file_lock import AtomicFile
+from io import BytesIO
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class PosterCache:
+    """Local copies of the movie posters for the generated website.
+
+        Posters are downloaded concurrently on a bounded thread pool sharing one pooled
+        HTTP session, and stored content-addressed by their SHA-256 under the cache
+        directory, so a poster used by several movies or served from several URLs is
+        stored once. A resized JPEG thumbnail is made of every poster with Pillow when it
+        is installed. index.json maps each poster URL to its files, which lets later runs
+        skip the posters they already have. Failed downloads are recorded in the index too,
+        with the time they failed, and are not tried again until RETRY_FAILED_AFTER passed.
+
+        Attributes:
+            DIRECTORY (str): Default cache directory, inside the website's static files.
+            THUMBNAIL_SIZE (tuple): Largest width and height of a thumbnail in pixels.
+            RETRY_FAILED_AFTER (float): Seconds before a poster that failed to download is tried again.
+        """
+    DIRECTORY = os.path.join('_static', 'posters')
+    INDEX_FILE = 'index.json'
+    THUMBNAIL_SIZE = (300, 445)
+    THUMBNAIL_QUALITY = 85
+    PROGRESS_EVERY = 100
+    RETRY_FAILED_AFTER = 24 * 60 * 60
+    EXTENSIONS = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/gif': '.gif', 'image/webp': '.webp'}
+
+    def __init__(self, directory=DIRECTORY, session=None, max_workers=8, thumbnail_size=THUMBNAIL_SIZE, timeout=10,
+                 retry_failed_after=RETRY_FAILED_AFTER):
+        """
+            Initializes the PosterCache instance.
+
+            Args:
+                directory (str): The directory the posters and the index are stored in.
+                session (requests.Session): Session to download with. A pooled session is created if omitted.
+                max_workers (int): Maximum number of downloads running at the same time.
+                thumbnail_size (tuple): Largest width and height of a thumbnail, or None to skip thumbnails.
+                timeout (float): Timeout of a single download in seconds.
+                retry_failed_after (float): Seconds before a failed download is tried again.
+            """
+        self.directory = directory
+        self.max_workers = max_workers
+        self.thumbnail_size = thumbnail_size
+        self.timeout = timeout
+        self.retry_failed_after = retry_failed_after
+        self.__session = session
+        self.__index_path = os.path.join(directory, self.INDEX_FILE)
+        self.__index = self.__load_index()
+        self.__index_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """requests.Session: The HTTP session, created with a connection pool per worker on first use."""
+        if self.__session is None:
+            # requests is imported on first use so that starting the app does not load it
+            import requests
+            from requests.adapters import HTTPAdapter
+            self.__session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+            self.__session.mount('http://', adapter)
+            self.__session.mount('https://', adapter)
+        return self.__session
+
+    def __load_index(self):
+        """Reads the URL to file index, or starts an empty one."""
+        try:
+            with open(self.__index_path, 'r') as index_file:
+                return json.load(index_file)
+        except (OSError, ValueError):
+            return {}
+
+    def __save_index(self):
+        """Replaces the index file with the current index."""
+        os.makedirs(self.directory, exist_ok=True)
+        with AtomicFile(self.__index_path) as atomic:
+            json.dump(self.__index, atomic.file, indent=1, sort_keys=True)
+
+    @staticmethod
+    def is_downloadable(poster_url):
+        """Checks whether a poster URL points to an image; OMDb uses 'N/A' for movies without a poster."""
+        return isinstance(poster_url, str) and poster_url.startswith(('http://', 'https://'))
+
+    def is_cached(self, poster_url):
+        """
+            Checks whether a poster was downloaded and its files are still there.
+
+            Args:
+                poster_url (str): The poster URL.
+
+            Returns:
+                bool: True if the poster does not need to be downloaded.
+            """
+        entry = self.__index.get(poster_url)
+        return entry is not None and 'original' in entry and all(os.path.exists(os.path.join(self.directory, file_name))
+                                         for file_name in (entry['original'], entry['thumbnail']) if file_name)
+
+    def failed_recently(self, poster_url):
+        """
+            Checks whether a poster failed to download less than retry_failed_after seconds ago.
+
+            Args:
+                poster_url (str): The poster URL.
+
+            Returns:
+                bool: True if the download should not be tried again yet.
+            """
+        entry = self.__index.get(poster_url)
+        return entry is not None and 'failed' in entry and time.time() - entry['failed'] < self.retry_failed_after
+
+    def __write(self, file_name, write):
+        """Writes a cache file unless a file with the same content address exists already."""
+        file_path = os.path.join(self.directory, file_name)
+        if os.path.exists(file_path):
+            return
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # Write under a temporary name so an interrupted download never looks cached
+        temp_path = f'{file_path}.{threading.get_ident()}.tmp'
+        try:
+            write(temp_path)
+            os.replace(temp_path, file_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _make_thumbnail(self, content, digest):
+        """
+            Writes a resized JPEG copy of a poster.
+
+            Args:
+                content (bytes): The downloaded poster.
+                digest (str): The SHA-256 of the poster.
+
+            Returns:
+                str: The thumbnail file name inside the cache directory, or None if no thumbnail was made.
+            """
+        if not self.thumbnail_size:
+            return None
+        try:
+            from PIL import Image
+        except ImportError:
+            return None
+        width, height = self.thumbnail_size
+        file_name = f'thumbnails/{digest[:2]}/{digest}-{width}x{height}.jpg'
+
+        def write(file_path):
+            with Image.open(BytesIO(content)) as image:
+                image.thumbnail((width, height))
+                image.convert('RGB').save(file_path, 'JPEG', quality=self.THUMBNAIL_QUALITY, optimize=True)
+
+        try:
+            self.__write(file_name, write)
+        except (OSError, ValueError):
+            # Not an image Pillow can read; the website then uses the original
+            return None
+        return file_name
+
+    def _download(self, poster_url):
+        """
+            Downloads one poster and stores it with its thumbnail.
+
+            Args:
+                poster_url (str): The poster URL.
+
+            Returns:
+                dict: The index entry with the 'original' and 'thumbnail' file names.
+            """
+        response = self.session.get(poster_url, timeout=self.timeout)
+        if response.status_code != 200:
+            raise Exception(f"Failed to download the poster. Status code: {response.status_code}")
+        content = response.content
+        digest = hashlib.sha256(content).hexdigest()
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+        extension = self.EXTENSIONS.get(content_type) or os.path.splitext(poster_url)[1].lower() or '.jpg'
+        original = f'originals/{digest[:2]}/{digest}{extension}'
+
+        def write(file_path):
+            with open(file_path, 'wb') as poster_file:
+                poster_file.write(content)
+
+        self.__write(original, write)
+        return {'original': original, 'thumbnail': self._make_thumbnail(content, digest)}
+
+    def prefetch(self, poster_urls, progress=print):
+        """
+            Downloads the posters that are not cached yet, concurrently.
+
+            Args:
+                poster_urls (iterable): The poster URLs, duplicates, 'N/A' and recent failures are skipped.
+                progress (callable): Called with a progress message, or None to stay silent.
+
+            Returns:
+                tuple: The number of downloaded posters and a list of (poster URL, reason) failures.
+            """
+        missing = [url for url in dict.fromkeys(poster_urls)
+                   if self.is_downloadable(url) and not self.is_cached(url) and not self.failed_recently(url)]
+        if not missing:
+            return 0, []
+
+        downloaded = 0
+        failures = []
+        # Only downloads need the thread pool, importing it at module level slows down every start
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._download, url): url for url in missing}
+            for done, future in enumerate(as_completed(futures), start=1):
+                url = futures[future]
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    failures.append((url, str(e)))
+                    with self.__index_lock:
+                        self.__index[url] = {'failed': time.time(), 'reason': str(e)}
+                else:
+                    with self.__index_lock:
+                        self.__index[url] = entry
+                    downloaded += 1
+                if progress and (done % self.PROGRESS_EVERY == 0 or done == len(missing)):
+                    progress(f"Downloaded {done}/{len(missing)} posters")
+
+        if downloaded or failures:
+            self.__save_index()
+        return downloaded, failures
+
+    def sources(self, poster_urls, relative_to):
+        """
+            Maps the cached posters to the local file the website should show, the thumbnail if there is one.
+
+            Args:
+                poster_urls (iterable): The poster URLs.
+                relative_to (str): The directory of the HTML pages; the paths are relative to it.
+
+            Returns:
+                dict: Poster URLs as keys and local paths as values. Posters that are not cached are left out.
+            """
+        sources = {}
+        for url in poster_urls:
+            if url in sources or not self.is_cached(url):
+                continue
+            entry = self.__index[url]
+            file_path = os.path.join(self.directory, entry['thumbnail'] or entry['original'])
+            sources[url] = os.path.relpath(file_path, relative_to).replace(os.sep, '/')
+        return sources
@@ -0,0 +1,153 @@
+from collections import Counter, defaultdict
+import heapq
+
+
+class SearchIndex:
+    """Fuzzy title search index.
+
+        Keeps a lowercase to original title map for exact matches and a character trigram
+        inverted index. A search first picks the titles sharing the most trigrams with the
+        search term and only rescores that shortlist with fuzzywuzzy, instead of scoring
+        every title in the catalog.
+
+        Attributes:
+            SHORTLIST_SIZE (int): Number of candidates rescored with fuzzywuzzy.
+            COMMON_TRIGRAM_SHARE (float): Trigrams found in a bigger share of the titles are
+                skipped when picking candidates, as they hardly narrow the search down.
+        """
+    SHORTLIST_SIZE = 100
+    COMMON_TRIGRAM_SHARE = 0.1
+
+    def __init__(self, titles=()):
+        """
+            Initializes the SearchIndex instance.
+
+            Args:
+                titles (iterable): The movie titles to index.
+            """
+        self.__titles = set()
+        self.__originals = {}
+        self.__trigrams = defaultdict(set)
+        for title in titles:
+            self.add(title)
+
+    def __len__(self):
+        return len(self.__titles)
+
+    @staticmethod
+    def _trigrams(text):
+        """
+            Splits a text into character trigrams, padded so short words still produce some.
+
+            Args:
+                text (str): The lowercase text.
+
+            Returns:
+                set: The trigrams of the text.
+            """
+        padded = f'  {text} '
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def add(self, title):
+        """
+            Adds a title to the index.
+
+            Args:
+                title (str): The movie title.
+            """
+        if title in self.__titles:
+            return
+        self.__titles.add(title)
+        title_lower = title.lower()
+        originals = self.__originals.setdefault(title_lower, [])
+        originals.append(title)
+        if len(originals) == 1:
+            for trigram in self._trigrams(title_lower):
+                self.__trigrams[trigram].add(title_lower)
+
+    def remove(self, title):
+        """
+            Removes a title from the index.
+
+            Args:
+                title (str): The movie title.
+            """
+        if title not in self.__titles:
+            return
+        self.__titles.remove(title)
+        title_lower = title.lower()
+        originals = self.__originals[title_lower]
+        originals.remove(title)
+        if originals:
+            return
+        del self.__originals[title_lower]
+        for trigram in self._trigrams(title_lower):
+            posting = self.__trigrams[trigram]
+            posting.discard(title_lower)
+            if not posting:
+                del self.__trigrams[trigram]
+
+    def sync(self, titles):
+        """
+            Brings the index up to date with the titles currently in storage,
+            adding and removing only the titles that changed.
+
+            Args:
+                titles (iterable): All movie titles currently in storage, e.g. the list_movies() dictionary.
+            """
+        titles = titles.keys() if isinstance(titles, dict) else set(titles)
+        for title in self.__titles - titles:
+            self.remove(title)
+        for title in titles - self.__titles:
+            self.add(title)
+
+    def find_exact(self, term):
+        """
+            Looks up a title ignoring case.
+
+            Args:
+                term (str): The search term.
+
+            Returns:
+                str: The original title, or None if no title matches.
+            """
+        originals = self.__originals.get(term.lower())
+        return originals[0] if originals else None
+
+    def _candidates(self, term_lower):
+        """
+            Picks the titles sharing the most trigrams with the search term.
+
+            Args:
+                term_lower (str): The lowercase search term.
+
+            Returns:
+                list: Up to SHORTLIST_SIZE lowercase titles.
+            """
+        postings = [self.__trigrams[trigram] for trigram in self._trigrams(term_lower) if trigram in self.__trigrams]
+        limit = max(self.COMMON_TRIGRAM_SHARE * len(self.__originals), self.SHORTLIST_SIZE)
+        selective = [posting for posting in postings if len(posting) <= limit]
+
+        counts = Counter()
+        for posting in selective or postings:
+            counts.update(posting)
+        return heapq.nlargest(self.SHORTLIST_SIZE, counts, key=counts.__getitem__)
+
+    def search(self, term, limit=3):
+        """
+            Finds the titles most similar to the search term.
+
+            Args:
+                term (str): The search term.
+                limit (int): Maximum number of results.
+
+            Returns:
+                list: (original title, score) pairs, best match first.
+            """
+        candidates = self._candidates(term.lower())
+        if not candidates:
+            return []
+        # Imported here so that starting the app does not pay for fuzzywuzzy until the first search
+        from fuzzywuzzy import process
+        matches = process.extract(term.lower(), candidates, limit=limit)
+        return [(self.__originals[match][0], score) for match, score in matches]
@@ -1,3 +1,22 @@
+from bisect import bisect_left, insort
+from functools import lru_cache
+
+MAX_RATING = 10
+HISTOGRAM_BINS = 10
+# Below this many movies the pure Python pass is faster than importing NumPy
+NUMPY_MIN_MOVIES = 10000
+
+
+@lru_cache(maxsize=None)
+def _numpy():
+    """Imports NumPy on first use and returns it, or None if it is not installed."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
 class Statistics:
     @staticmethod
     def calculate_average_rating(movies):
@@ -54,3 +73,193 @@ class Statistics:
         worst_rating = min(movie['rating'] for movie in movies.values())
         worst_movies = [title for title, info in movies.items() if info['rating'] == worst_rating]
         return worst_rating, worst_movies
+
+    @staticmethod
+    def histogram_bin(rating, bins=HISTOGRAM_BINS):
+        """Returns the index of the histogram bin a rating falls into.
+
+        Args:
+            rating (float): The movie rating.
+            bins (int): Number of equal width bins between 0 and the maximum rating.
+
+        Returns:
+            int: The bin index."""
+        return min(max(int(rating * bins / MAX_RATING), 0), bins - 1)
+
+    @staticmethod
+    def summarize(movies, bins=HISTOGRAM_BINS, use_numpy=None):
+        """Calculates all rating statistics in a single pass over the movies.
+
+        Args:
+            movies (dict): Dictionary containing movie names and ratings.
+            bins (int): Number of histogram bins between 0 and the maximum rating.
+            use_numpy (bool): Use NumPy for the calculations. Defaults to using it when it is installed
+                and the catalog has at least NUMPY_MIN_MOVIES movies.
+
+        Returns:
+            dict: The average, median, best and worst ratings with the movies having them,
+            the number of movies and the histogram counts."""
+        if use_numpy is None:
+            use_numpy = len(movies) >= NUMPY_MIN_MOVIES and _numpy() is not None
+        if not movies:
+            return {'count': 0, 'average': 0.0, 'median': None, 'best_rating': None, 'best_movies': [],
+                    'worst_rating': None, 'worst_movies': [], 'histogram': [0] * bins}
+        if use_numpy:
+            return Statistics._summarize_numpy(movies, bins)
+
+        ratings = []
+        total = 0.0
+        best_rating = worst_rating = None
+        best_movies = []
+        worst_movies = []
+        histogram = [0] * bins
+        for title, info in movies.items():
+            rating = info['rating']
+            ratings.append(rating)
+            total += rating
+            histogram[Statistics.histogram_bin(rating, bins)] += 1
+            if best_rating is None or rating > best_rating:
+                best_rating, best_movies = rating, [title]
+            elif rating == best_rating:
+                best_movies.append(title)
+            if worst_rating is None or rating < worst_rating:
+                worst_rating, worst_movies = rating, [title]
+            elif rating == worst_rating:
+                worst_movies.append(title)
+
+        return {'count': len(ratings), 'average': total / len(ratings), 'median': Statistics._median(sorted(ratings)),
+                'best_rating': best_rating, 'best_movies': best_movies,
+                'worst_rating': worst_rating, 'worst_movies': worst_movies, 'histogram': histogram}
+
+    @staticmethod
+    def _summarize_numpy(movies, bins):
+        """Vectorized version of summarize() for a non-empty catalog."""
+        np = _numpy()
+        titles = list(movies)
+        ratings = np.fromiter((info['rating'] for info in movies.values()), dtype=float, count=len(titles))
+        best_rating = ratings.max()
+        worst_rating = ratings.min()
+        histogram = np.bincount(np.clip((ratings * bins / MAX_RATING).astype(int), 0, bins - 1), minlength=bins)
+        return {'count': len(titles), 'average': float(ratings.mean()), 'median': float(np.median(ratings)),
+                'best_rating': float(best_rating),
+                'best_movies': [titles[i] for i in np.flatnonzero(ratings == best_rating)],
+                'worst_rating': float(worst_rating),
+                'worst_movies': [titles[i] for i in np.flatnonzero(ratings == worst_rating)],
+                'histogram': histogram.tolist()}
+
+    @staticmethod
+    def _median(sorted_ratings):
+        """Returns the median of an already sorted, non-empty list of ratings."""
+        n_movies = len(sorted_ratings)
+        if n_movies % 2 == 0:
+            return (sorted_ratings[n_movies // 2 - 1] + sorted_ratings[n_movies // 2]) / 2
+        return sorted_ratings[n_movies // 2]
+
+
+class IncrementalStatistics:
+    """Rating statistics that are kept up to date as movies are added and deleted.
+
+    Keeps a running sum, the ratings in sorted order and the titles for every rating, so a
+    summary is available without rescanning the catalog: the average, best and worst ratings
+    in constant time and the median by indexing the sorted ratings."""
+
+    def __init__(self, movies=None, bins=HISTOGRAM_BINS):
+        """Initializes the IncrementalStatistics instance.
+
+        Args:
+            movies (dict): Dictionary containing movie names and ratings.
+            bins (int): Number of histogram bins between 0 and the maximum rating."""
+        self.bins = bins
+        self.__ratings = {}
+        self.__sorted_ratings = []
+        self.__titles_by_rating = {}
+        self.__total = 0.0
+        self.__histogram = [0] * bins
+        if movies:
+            for title, info in movies.items():
+                self.__insert(title, info['rating'])
+            self.__sorted_ratings.sort()
+
+    def __len__(self):
+        return len(self.__ratings)
+
+    def __insert(self, title, rating):
+        """Adds a rating to everything but the sorted ratings."""
+        self.__ratings[title] = rating
+        self.__total += rating
+        self.__histogram[Statistics.histogram_bin(rating, self.bins)] += 1
+        # A dict keeps the tie lists in insertion order, like the catalog itself
+        self.__titles_by_rating.setdefault(rating, {})[title] = None
+        self.__sorted_ratings.append(rating)
+
+    def add(self, title, info):
+        """Adds a movie, replacing the previous entry with the same title.
+
+        Args:
+            title (str): The movie title.
+            info (dict): The movie information."""
+        if title in self.__ratings:
+            self.remove(title)
+        rating = info['rating']
+        self.__insert(title, rating)
+        # __insert appended the rating, move it to its sorted position
+        self.__sorted_ratings.pop()
+        insort(self.__sorted_ratings, rating)
+
+    def remove(self, title):
+        """Removes a movie.
+
+        Args:
+            title (str): The movie title."""
+        if title not in self.__ratings:
+            return
+        rating = self.__ratings.pop(title)
+        self.__total -= rating
+        self.__histogram[Statistics.histogram_bin(rating, self.bins)] -= 1
+        titles = self.__titles_by_rating[rating]
+        del titles[title]
+        if not titles:
+            del self.__titles_by_rating[rating]
+        del self.__sorted_ratings[bisect_left(self.__sorted_ratings, rating)]
+        if not self.__ratings:
+            # Start again from an exact zero instead of accumulated rounding errors
+            self.__total = 0.0
+
+    def sync(self, movies):
+        """Brings the statistics up to date with the catalog, updating only the titles that changed.
+
+        Titles that were added, removed or got a different rating, e.g. because another process
+        added the movie again, are applied in logarithmic time each; the other titles only cost
+        a dictionary lookup to compare their rating.
+
+        Args:
+            movies (dict): Dictionary containing movie names and ratings."""
+        for title in self.__ratings.keys() - movies.keys():
+            self.remove(title)
+        ratings = self.__ratings
+        for title, info in movies.items():
+            if ratings.get(title) != info['rating']:
+                self.add(title, info)
+
+    def histogram(self):
+        """Returns the number of movies in each histogram bin, lowest bin first.
+
+        Returns:
+            list: The histogram counts."""
+        return list(self.__histogram)
+
+    def summary(self):
+        """Returns the current statistics.
+
+        Returns:
+            dict: The same statistics as Statistics.summarize()."""
+        if not self.__ratings:
+            return {'count': 0, 'average': 0.0, 'median': None, 'best_rating': None, 'best_movies': [],
+                    'worst_rating': None, 'worst_movies': [], 'histogram': [0] * self.bins}
+        best_rating = self.__sorted_ratings[-1]
+        worst_rating = self.__sorted_ratings[0]
+        return {'count': len(self.__ratings), 'average': self.__total / len(self.__ratings),
+                'median': Statistics._median(self.__sorted_ratings),
+                'best_rating': best_rating, 'best_movies': list(self.__titles_by_rating[best_rating]),
+                'worst_rating': worst_rating, 'worst_movies': list(self.__titles_by_rating[worst_rating]),
+                'histogram': list(self.__histogram)}
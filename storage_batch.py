@@ -0,0 +1,112 @@
+from istorage import IStorage
+
+
+class BatchStorage(IStorage):
+    """Collects the changes of many commands and writes them to the wrapped storage at once.
+
+        The catalog is read from the wrapped storage a single time and every change is applied
+        to that copy in memory, so later commands in the batch see the earlier ones. Only the
+        net result is remembered: a movie added and deleted again in the same batch is never
+        written. flush() sends the collected changes with one delete_movies(), add_movies()
+        and update_movies() call each.
+        """
+
+    def __init__(self, storage_instance):
+        """
+            Initializes the BatchStorage instance.
+
+            Args:
+                storage_instance (IStorage): The storage the changes are written to on flush().
+            """
+        self.__storage = storage_instance
+        self.__movies = None
+        self.__added = {}
+        self.__deleted = set()
+        self.__notes = {}
+
+    @property
+    def storage(self):
+        """IStorage: The wrapped storage."""
+        return self.__storage
+
+    @property
+    def pending(self):
+        """int: Number of changes waiting to be flushed."""
+        return len(self.__added) + len(self.__deleted) + len(self.__notes)
+
+    def make_movie_info(self, year, rating, poster_url, country, imdb_id, notes):
+        """Builds the movie information in the shape the wrapped storage returns."""
+        return self.__storage.make_movie_info(year, rating, poster_url, country, imdb_id, notes)
+
+    def list_movies(self):
+        """
+            Lists all movies, including the changes not flushed yet.
+
+            Returns:
+                dict: A dictionary containing movie titles as keys and movie information as values.
+            """
+        if self.__movies is None:
+            # Copy, as the wrapped storage may share its dictionary with a cache
+            self.__movies = dict(self.__storage.list_movies())
+        return self.__movies
+
+    def add_movie(self, title, year, rating, poster_url, country, imdb_id, notes):
+        """
+            Adds a new movie to the batch.
+
+            Args:
+                title (str): The title of the movie.
+                year (str): The release year of the movie.
+                rating (float): The rating of the movie.
+                poster_url (str): The URL of the movie poster.
+                country (str): The country of origin of the movie.
+                imdb_id (str): The IMDb ID of the movie.
+                notes (str): Any additional notes about the movie.
+            """
+        self.list_movies()[title] = self.make_movie_info(year, rating, poster_url, country, imdb_id, notes)
+        self.__added[title] = {'rating': rating, 'year': year, 'poster_url': poster_url, 'country': country,
+                               'imdb_id': imdb_id, 'notes': notes}
+        self.__notes.pop(title, None)
+
+    def delete_movie(self, title):
+        """
+            Deletes a movie in the batch.
+
+            Args:
+                title (str): The title of the movie to delete.
+            """
+        self.list_movies().pop(title, None)
+        self.__added.pop(title, None)
+        self.__notes.pop(title, None)
+        self.__deleted.add(title)
+
+    def update_movie(self, title, notes):
+        """
+            Updates the notes for a movie in the batch.
+
+            Args:
+                title (str): The title of the movie to update.
+                notes (str): The new notes for the movie.
+            """
+        movies = self.list_movies()
+        if title not in movies:
+            return
+        # Replace rather than modify the information, it may be shared with the wrapped storage
+        movies[title] = dict(movies[title], notes=notes)
+        if title in self.__added:
+            self.__added[title]['notes'] = notes
+        else:
+            self.__notes[title] = notes
+
+    def flush(self):
+        """Writes the collected changes to the wrapped storage and starts a new batch."""
+        # Deletes go first, so a movie deleted and added again in the batch ends up added
+        if self.__deleted:
+            self.__storage.delete_movies(self.__deleted)
+        if self.__added:
+            self.__storage.add_movies(self.__added)
+        if self.__notes:
+            self.__storage.update_movies(self.__notes)
+        self.__added = {}
+        self.__deleted = set()
+        self.__notes = {}
@@ -0,0 +1,528 @@
+from array import array
+from collections.abc import ItemsView, Mapping, ValuesView
+from file_lock import AtomicFile, file_version
+from istorage import IStorage
+from itertools import accumulate, islice
+from movie import Movie
+from movie_query import MovieQuery
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+
+class MovieView(Mapping):
+    """Movie information read from a BinaryCatalog on access.
+
+        Only the fields that are looked up are read from the file, so code that only needs
+        the rating touches the rating column and nothing else. The view behaves like the
+        Movie records the other storages return, but cannot be changed.
+        """
+    __slots__ = ('catalog', 'record')
+
+    def __init__(self, catalog, record):
+        self.catalog = catalog
+        self.record = record
+
+    def to_dict(self):
+        """
+            Returns the movie information as a plain dictionary.
+
+            Returns:
+                dict: The movie information without the title.
+            """
+        return {field: self.catalog.field(self.record, field) for field in Movie.FIELDS}
+
+    def __getitem__(self, key):
+        if key not in Movie.FIELDS:
+            raise KeyError(key)
+        return self.catalog.field(self.record, key)
+
+    def __iter__(self):
+        return iter(Movie.FIELDS)
+
+    def __len__(self):
+        return len(Movie.FIELDS)
+
+    def __reduce__(self):
+        # The map cannot be sent to another process, the values can
+        return Movie, tuple(self.catalog.field(self.record, field) for field in Movie.FIELDS)
+
+    def __repr__(self):
+        return f"MovieView({', '.join(f'{field}={value!r}' for field, value in self.to_dict().items())})"
+
+
+class _CatalogItems(ItemsView):
+    """Items of a BinaryCatalog, read record by record instead of looking every title up again."""
+
+    def __iter__(self):
+        return self._mapping.iter_items()
+
+
+class _CatalogValues(ValuesView):
+    """Values of a BinaryCatalog, read record by record instead of looking every title up again."""
+
+    def __iter__(self):
+        return (movie for title, movie in self._mapping.iter_items())
+
+
+class BinaryCatalog(Mapping):
+    """Read-only catalog over the buffer of a binary catalog file, usually a memory map.
+
+        Nothing is parsed up front: opening the catalog reads the header, and lookups and
+        scans read the pages of the columns they use. See StorageBinary for the layout.
+        """
+
+    @staticmethod
+    def read_layout(head, size):
+        """
+            Checks the header and the section table of a catalog file.
+
+            Args:
+                head (bytes): The start of the file, at least the header and the section table.
+                size (int): The size of the whole file in bytes.
+
+            Returns:
+                list: The (offset, length) of every section, in SECTIONS order.
+
+            Raises:
+                ValueError: If the file is empty, not a binary catalog, of another version or truncated.
+            """
+        table_end = StorageBinary.HEADER.size + len(StorageBinary.SECTIONS) * StorageBinary.SECTION.size
+        if bytes(head[:len(StorageBinary.MAGIC)]) != StorageBinary.MAGIC:
+            raise ValueError("Not a binary movie catalog" if size else "The file is empty")
+        if size < table_end or len(head) < table_end:
+            raise ValueError(f"The binary catalog is truncated, it has only {size} bytes")
+        version = StorageBinary.HEADER.unpack_from(head)[1]
+        if version != StorageBinary.VERSION:
+            raise ValueError(f"Unsupported binary catalog version {version}")
+        layout = [StorageBinary.SECTION.unpack_from(
+                      head, StorageBinary.HEADER.size + position * StorageBinary.SECTION.size)
+                  for position in range(len(StorageBinary.SECTIONS))]
+        if any(offset + length > size for offset, length in layout):
+            raise ValueError(f"The binary catalog is truncated, it has only {size} bytes")
+        return layout
+
+    def __init__(self, buffer):
+        """
+            Initializes the BinaryCatalog instance.
+
+            Args:
+                buffer: The content of a file written by StorageBinary.build(), e.g. an mmap.
+            """
+        view = memoryview(buffer)
+        layout = self.read_layout(view, len(view))
+        magic, version, self.__bits, self.__records, self.__count = StorageBinary.HEADER.unpack_from(view)
+        sections = {}
+        for name, (offset, length) in zip(StorageBinary.SECTIONS, layout):
+            section = view[offset:offset + length]
+            type_code = StorageBinary.SECTION_TYPES.get(name)
+            sections[name] = section.cast(type_code) if type_code else section
+        self.__ratings = sections['ratings']
+        self.__years = sections['years']
+        self.__flags = sections['flags']
+        self.__offsets = {field: sections[f'{field}_offsets'] for field in StorageBinary.STRING_FIELDS}
+        self.__heaps = {field: sections[f'{field}_heap'] for field in StorageBinary.STRING_FIELDS}
+        self.__hashes = sections['hashes']
+        self.__positions = sections['positions']
+        self.__directory = sections['directory']
+        self.__shift = 64 - self.__bits
+
+    def __string(self, record, field):
+        """Decodes one string of a record."""
+        offsets = self.__offsets[field]
+        return str(self.__heaps[field][offsets[record]:offsets[record + 1]], 'utf-8')
+
+    def field(self, record, field):
+        """
+            Reads one field of a record.
+
+            Args:
+                record (int): The record number.
+                field (str): 'title' or one of Movie.FIELDS.
+
+            Returns:
+                The value of the field, typed as it was stored.
+            """
+        if field == 'rating':
+            return self.__ratings[record]
+        if field == 'year' and self.__flags[record] & StorageBinary.YEAR_IS_INT:
+            return self.__years[record]
+        return self.__string(record, field)
+
+    def find(self, title):
+        """
+            Looks a title up in the hash index.
+
+            The directory maps the leading bits of the hash to the range of the sorted index
+            holding them, which has about one entry, so a lookup reads a few index entries
+            and one title whatever the catalog size.
+
+            Args:
+                title (str): The movie title.
+
+            Returns:
+                int: The record number of the movie, or None if the title is not in the catalog.
+            """
+        encoded = title.encode('utf-8')
+        title_hash = StorageBinary.title_hash(encoded)
+        bucket = title_hash >> self.__shift
+        for position in range(self.__directory[bucket], self.__directory[bucket + 1]):
+            if self.__hashes[position] == title_hash:
+                record = self.__positions[position]
+                offsets = self.__offsets['title']
+                if self.__heaps['title'][offsets[record]:offsets[record + 1]] == encoded:
+                    return record
+        return None
+
+    def iter_items(self):
+        """
+            Iterates over the movies in the order they were written.
+
+            Yields:
+                tuple: A (title, MovieView) pair per movie.
+            """
+        flags = self.__flags
+        for record in range(self.__records):
+            if not flags[record] & StorageBinary.SUPERSEDED:
+                yield self.__string(record, 'title'), MovieView(self, record)
+
+    def __getitem__(self, title):
+        record = self.find(title)
+        if record is None:
+            raise KeyError(title)
+        return MovieView(self, record)
+
+    def __contains__(self, title):
+        return isinstance(title, str) and self.find(title) is not None
+
+    def __iter__(self):
+        return (title for title, movie in self.iter_items())
+
+    def __len__(self):
+        return self.__count
+
+    def items(self):
+        return _CatalogItems(self)
+
+    def values(self):
+        return _CatalogValues(self)
+
+
+class StorageBinary(IStorage):
+    """Read-only storage over a memory-mapped binary catalog file, built from any other storage.
+
+        The file is laid out in columns: the ratings as float64 values, the years as int32
+        values, a byte of flags per movie, and for every text field an array of offsets into
+        a heap of UTF-8 strings. A sorted index of 64-bit title hashes with a directory over
+        their leading bits finds a title in constant time.
+
+        The file is mapped instead of read, so opening even a large catalog is immediate, a
+        lookup or a rating scan only reads the pages it needs, and processes opening the
+        same file share its pages through the page cache instead of each holding a copy.
+        The catalog is rebuilt with CatalogConverter, e.g. main.py movies.json convert
+        movies.mcat; a replaced file is mapped again by the next list_movies() call.
+
+        The columns use the byte order of the machine, which must be little-endian.
+        """
+    READ_ONLY = True
+    MAGIC = b'MOVIECAT'
+    VERSION = 1
+    # Magic, version, index directory bits, records, movies
+    HEADER = struct.Struct('<8sIIQQ')
+    # Offset and length of a section
+    SECTION = struct.Struct('<QQ')
+    STRING_FIELDS = ('title', 'year', 'poster_url', 'country', 'imdb_id', 'notes')
+    SECTIONS = ('ratings', 'years', 'flags',
+                *[f'{field}_{part}' for field in STRING_FIELDS for part in ('offsets', 'heap')],
+                'hashes', 'positions', 'directory')
+    SECTION_TYPES = {'ratings': 'd', 'years': 'i', 'flags': 'B', 'hashes': 'Q', 'positions': 'Q', 'directory': 'Q',
+                     **{f'{field}_offsets': 'Q' for field in STRING_FIELDS}}
+    # Record flags: the year was stored as a number, a later record has the same title
+    YEAR_IS_INT = 1
+    SUPERSEDED = 2
+    MISSING_YEAR = -2 ** 31
+    CHUNK_ROWS = 5000
+
+    def __init__(self, file_path):
+        """
+            Initializes the StorageBinary instance.
+
+            Args:
+                file_path (str): The path to the binary catalog file.
+            """
+        if sys.byteorder != 'little':
+            raise OSError("Binary catalogs can only be read on little-endian machines")
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"Binary catalog '{file_path}' does not exist, build it with convert.")
+        self.__file_path = file_path
+        self.__version = None
+        self.__catalog = None
+        self.__map = None
+        self.__check_file()
+
+    @property
+    def file_path(self):
+        """str: The path to the binary catalog file."""
+        return self.__file_path
+
+    def version(self):
+        """
+            Returns a value that changes whenever the catalog file is replaced.
+
+            Returns:
+                tuple: The (mtime, size, inode) of the file, None if it does not exist.
+            """
+        return file_version(self.__file_path)
+
+    @staticmethod
+    def title_hash(encoded_title):
+        """
+            Hashes a title for the index.
+
+            Args:
+                encoded_title (bytes): The UTF-8 encoded title.
+
+            Returns:
+                int: The unsigned 64-bit hash.
+            """
+        return int.from_bytes(hashlib.blake2b(encoded_title, digest_size=8).digest(), 'little')
+
+    def __check_file(self):
+        """Reads the header of the catalog file and raises ValueError if it is not a complete catalog."""
+        table_size = self.HEADER.size + len(self.SECTIONS) * self.SECTION.size
+        with open(self.__file_path, 'rb') as catalog_file:
+            head = catalog_file.read(table_size)
+            size = os.fstat(catalog_file.fileno()).st_size
+        try:
+            BinaryCatalog.read_layout(head, size)
+        except ValueError as e:
+            raise ValueError(f"Cannot open '{self.__file_path}': {e}.") from None
+
+    def list_movies(self):
+        """
+            Maps the catalog file, or maps it again if it was replaced since the last call.
+
+            Returns:
+                BinaryCatalog: Movie titles as keys and MovieView records as values.
+            """
+        version = self.version()
+        if self.__catalog is None or version != self.__version:
+            # An empty file cannot be mapped, so a replaced file is checked before
+            self.__check_file()
+            with open(self.__file_path, 'rb') as catalog_file:
+                # The map stays valid after the file is closed, and after it is replaced
+                self.__map = mmap.mmap(catalog_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.__catalog = BinaryCatalog(self.__map)
+            self.__version = version
+        return self.__catalog
+
+    def load_catalog(self):
+        """
+            Lists all movies; the views of the catalog already are compact records.
+
+            Returns:
+                BinaryCatalog: Movie titles as keys and MovieView records as values.
+            """
+        return self.list_movies()
+
+    def __read_only(self):
+        raise PermissionError(f"'{self.__file_path}' is a read-only binary catalog, "
+                              f"convert it to a JSON, CSV or SQLite file to change it.")
+
+    def add_movie(self, title, year, rating, poster_url, country, imdb_id, notes):
+        """Not supported, the binary catalog is read-only."""
+        self.__read_only()
+
+    def delete_movie(self, title):
+        """Not supported, the binary catalog is read-only."""
+        self.__read_only()
+
+    def update_movie(self, title, notes):
+        """Not supported, the binary catalog is read-only."""
+        self.__read_only()
+
+    def add_movies(self, movies):
+        """Not supported, the binary catalog is read-only."""
+        self.__read_only()
+
+    def delete_movies(self, titles):
+        """Not supported, the binary catalog is read-only."""
+        self.__read_only()
+
+    def update_movies(self, notes):
+        """Not supported, the binary catalog is read-only."""
+        self.__read_only()
+
+    def close(self):
+        """Unmaps the file. Catalogs and views still in use keep their mapping open until they are released."""
+        self.__catalog = None
+        self.__version = None
+        if self.__map is not None:
+            try:
+                self.__map.close()
+            except BufferError:
+                pass
+            self.__map = None
+
+    @classmethod
+    def build(cls, movies, file_path):
+        """
+            Writes a binary catalog file.
+
+            The columns are spilled to temporary files while the movies stream in, so memory
+            holds only the title hashes and a byte per movie until the index is sorted. If a
+            title appears more than once, the last one wins.
+
+            Args:
+                movies (iterable): (title, movie information) pairs.
+                file_path (str): The file to write, replaced atomically when complete.
+
+            Returns:
+                int: The number of movies written.
+            """
+        movies = iter(movies)
+        directory = os.path.dirname(os.path.abspath(file_path))
+        with tempfile.TemporaryDirectory(dir=directory, prefix='.mcat-') as temp_dir:
+            spills = {name: open(os.path.join(temp_dir, name), 'w+b') for name in cls.SECTIONS[:-3]}
+            try:
+                hashes = array('Q')
+                flags = bytearray()
+                string_ends = dict.fromkeys(cls.STRING_FIELDS, 0)
+                parsed_years = {}
+                for field in cls.STRING_FIELDS:
+                    array('Q', [0]).tofile(spills[f'{field}_offsets'])
+                while True:
+                    chunk = list(islice(movies, cls.CHUNK_ROWS))
+                    if not chunk:
+                        break
+                    cls.__spill_chunk(chunk, spills, hashes, flags, string_ends, parsed_years)
+
+                positions, count = cls.__sort_index(hashes, flags, spills)
+                index_hashes = array('Q', [hashes[position] for position in positions])
+                del hashes
+                bits = max(count - 1, 0).bit_length()
+                directory_entries = array('Q', bytes(8 * ((1 << bits) + 1)))
+                shift = 64 - bits
+                for title_hash in index_hashes:
+                    directory_entries[(title_hash >> shift) + 1] += 1
+                for bucket in range(1, len(directory_entries)):
+                    directory_entries[bucket] += directory_entries[bucket - 1]
+
+                spills['flags'].seek(0)
+                spills['flags'].truncate()
+                spills['flags'].write(flags)
+                tail = {'hashes': index_hashes, 'positions': positions, 'directory': directory_entries}
+                cls.__write_file(file_path, len(flags), count, bits, spills, tail)
+            finally:
+                for spill in spills.values():
+                    spill.close()
+        return count
+
+    @classmethod
+    def __spill_chunk(cls, chunk, spills, hashes, flags, string_ends, parsed_years):
+        """Appends a chunk of movies to the column spill files, one column at a time."""
+        infos = [info for title, info in chunk]
+        years = [info.get('year', '') for info in infos]
+        year_texts = []
+        year_numbers = array('i')
+        for year in years:
+            if isinstance(year, int):
+                flags.append(cls.YEAR_IS_INT)
+                year_numbers.append(year)
+                year_texts.append(b'')
+            else:
+                flags.append(0)
+                # Few distinct years repeat across the catalog
+                if year not in parsed_years:
+                    parsed_year = MovieQuery.parse_year(year)
+                    parsed_years[year] = cls.MISSING_YEAR if parsed_year is None else parsed_year
+                year_numbers.append(parsed_years[year])
+                year_texts.append((year or '').encode('utf-8'))
+        year_numbers.tofile(spills['years'])
+        array('d', [float(info['rating']) for info in infos]).tofile(spills['ratings'])
+
+        titles = [title.encode('utf-8') for title, info in chunk]
+        columns = {'title': titles, 'year': year_texts}
+        for field in cls.STRING_FIELDS[2:]:
+            columns[field] = [(info.get(field) or '').encode('utf-8') for info in infos]
+        for field, encoded in columns.items():
+            offsets = array('Q', accumulate(map(len, encoded), initial=string_ends[field]))
+            string_ends[field] = offsets[-1]
+            offsets[1:].tofile(spills[f'{field}_offsets'])
+            spills[f'{field}_heap'].write(b''.join(encoded))
+        blake2b = hashlib.blake2b
+        hashes.extend([int.from_bytes(blake2b(title, digest_size=8).digest(), 'little') for title in titles])
+
+    @classmethod
+    def __sort_index(cls, hashes, flags, spills):
+        """Sorts the records by title hash and marks titles written again later as superseded."""
+        # sorted() is stable, so records with the same hash stay in the order they were written
+        order = sorted(range(len(hashes)), key=hashes.__getitem__)
+        positions = array('Q')
+        start = 0
+        while start < len(order):
+            end = start + 1
+            while end < len(order) and hashes[order[end]] == hashes[order[start]]:
+                end += 1
+            if end - start == 1:
+                positions.append(order[start])
+            else:
+                # The same title written again, or rarely two titles with the same hash
+                latest = {}
+                for record in order[start:end]:
+                    title = cls.__spilled_title(spills, record)
+                    if title in latest:
+                        flags[latest[title]] |= cls.SUPERSEDED
+                    latest[title] = record
+                positions.extend(sorted(latest.values()))
+            start = end
+        return positions, len(positions)
+
+    @staticmethod
+    def __spilled_title(spills, record):
+        """Reads a title back from the spill files, only needed for duplicate titles and hash collisions."""
+        offsets_file = spills['title_offsets']
+        offsets_file.seek(record * 8)
+        start, end = struct.unpack('<QQ', offsets_file.read(16))
+        heap_file = spills['title_heap']
+        heap_file.seek(start)
+        return heap_file.read(end - start)
+
+    @classmethod
+    def __write_file(cls, file_path, records, count, bits, spills, tail):
+        """Concatenates the header, the spilled columns and the index into the catalog file."""
+        lengths = {}
+        for name in cls.SECTIONS:
+            if name in tail:
+                lengths[name] = len(tail[name]) * tail[name].itemsize
+            else:
+                spills[name].flush()
+                lengths[name] = os.fstat(spills[name].fileno()).st_size
+        offsets = {}
+        position = cls.HEADER.size + cls.SECTION.size * len(cls.SECTIONS)
+        for name in cls.SECTIONS:
+            # Every section starts on an 8 byte boundary, so the arrays can be read in place
+            position += -position % 8
+            offsets[name] = position
+            position += lengths[name]
+
+        with AtomicFile(file_path, binary=True) as atomic:
+            output = atomic.file
+            output.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, bits, records, count))
+            for name in cls.SECTIONS:
+                output.write(cls.SECTION.pack(offsets[name], lengths[name]))
+            for name in cls.SECTIONS:
+                output.write(bytes(offsets[name] - output.tell()))
+                if name in tail:
+                    tail[name].tofile(output)
+                else:
+                    spill = spills[name]
+                    spill.seek(0)
+                    while True:
+                        block = spill.read(1 << 20)
+                        if not block:
+                            break
+                        output.write(block)
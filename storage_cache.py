@@ -0,0 +1,206 @@
+from istorage import IStorage
+from movie import Movie
+from file_lock import locked
+
+
+class CachedStorage(IStorage):
+    """Read cache in front of a file based storage.
+
+        The parsed catalog is kept in memory as compact Movie records and only re-read when
+        the storage file's modification time, size or inode changes. Writes made through the cache are
+        applied to the cached catalog in place, so they do not trigger a re-read.
+
+        Writes hold the wrapped storage's exclusive lock from the freshness check until the
+        new version is recorded, so a change made by another process in between is never
+        mistaken for the cache's own write: the cache is then dropped instead.
+
+        Attributes:
+            hits (int): Number of list_movies() calls answered from memory.
+            misses (int): Number of list_movies() calls that had to parse the file.
+        """
+
+    def __init__(self, storage_instance):
+        """
+            Initializes the CachedStorage instance.
+
+            Args:
+                storage_instance (IStorage): The storage to cache. It must expose file_path, lock and version().
+            """
+        self.__storage = storage_instance
+        self.__movies = None
+        self.__signature = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def storage(self):
+        """IStorage: The wrapped storage."""
+        return self.__storage
+
+    @property
+    def file_path(self):
+        """str: The path to the wrapped storage file."""
+        return self.__storage.file_path
+
+    @property
+    def lock(self):
+        """FileLock: The lock of the wrapped storage file."""
+        return self.__storage.lock
+
+    def _file_signature(self):
+        """
+            Returns a value that changes whenever the storage file is written.
+
+            Returns:
+                tuple: The version reported by the wrapped storage.
+            """
+        return self.__storage.version()
+
+    def _is_fresh(self):
+        """Checks whether the cached catalog still matches the storage file."""
+        return self.__movies is not None and self.__signature == self._file_signature()
+
+    def invalidate(self):
+        """Drops the cached catalog so that the next read parses the file again."""
+        self.__movies = None
+        self.__signature = None
+
+    def list_movies(self):
+        """
+            Lists all movies, parsing the storage file only if it changed since the last read.
+
+            The returned dictionary is shared with the cache and must not be modified by the caller.
+
+            Returns:
+                dict: A dictionary containing movie titles as keys and Movie records as values.
+            """
+        if self._is_fresh():
+            self.hits += 1
+            return self.__movies
+
+        self.misses += 1
+        # Take the signature before reading so a write racing the read is picked up next time
+        signature = self._file_signature()
+        self.__movies = self.__storage.load_catalog()
+        self.__signature = signature
+        return self.__movies
+
+    def load_catalog(self):
+        """
+            Lists all movies as Movie records; the cached catalog already holds them.
+
+            Returns:
+                dict: Movie titles as keys and Movie records as values.
+            """
+        return self.list_movies()
+
+    @locked
+    def add_movie(self, title, year, rating, poster_url, country, imdb_id, notes):
+        """
+            Adds a new movie to the storage and to the cached catalog.
+
+            Args:
+                title (str): The title of the movie.
+                year (str): The release year of the movie.
+                rating (float): The rating of the movie.
+                poster_url (str): The URL of the movie poster.
+                country (str): The country of origin of the movie.
+                imdb_id (str): The IMDb ID of the movie.
+                notes (str): Any additional notes about the movie.
+            """
+        fresh = self._is_fresh()
+        self.__storage.add_movie(title, year, rating, poster_url, country, imdb_id, notes)
+        if fresh:
+            self.__movies[title] = Movie.from_info(
+                self.__storage.make_movie_info(year, rating, poster_url, country, imdb_id, notes))
+            self.__signature = self._file_signature()
+        else:
+            self.invalidate()
+
+    @locked
+    def add_movies(self, movies):
+        """
+            Adds many movies to the storage and to the cached catalog.
+
+            Args:
+                movies (dict): Movie titles as keys and movie information as values.
+            """
+        fresh = self._is_fresh()
+        self.__storage.add_movies(movies)
+        if fresh:
+            for title, info in movies.items():
+                self.__movies[title] = Movie.from_info(self.__storage.make_movie_info(
+                    info['year'], info['rating'], info['poster_url'], info['country'], info['imdb_id'], info['notes']))
+            self.__signature = self._file_signature()
+        else:
+            self.invalidate()
+
+    @locked
+    def delete_movie(self, title):
+        """
+            Deletes a movie from the storage and from the cached catalog.
+
+            Args:
+                title (str): The title of the movie to delete.
+            """
+        fresh = self._is_fresh()
+        self.__storage.delete_movie(title)
+        if fresh:
+            self.__movies.pop(title, None)
+            self.__signature = self._file_signature()
+        else:
+            self.invalidate()
+
+    @locked
+    def delete_movies(self, titles):
+        """
+            Deletes many movies from the storage and from the cached catalog.
+
+            Args:
+                titles (iterable): The titles of the movies to delete.
+            """
+        titles = list(titles)
+        fresh = self._is_fresh()
+        self.__storage.delete_movies(titles)
+        if fresh:
+            for title in titles:
+                self.__movies.pop(title, None)
+            self.__signature = self._file_signature()
+        else:
+            self.invalidate()
+
+    @locked
+    def update_movie(self, title, notes):
+        """
+            Updates the notes for a movie in the storage and in the cached catalog.
+
+            Args:
+                title (str): The title of the movie to update.
+                notes (str): The new notes for the movie.
+            """
+        fresh = self._is_fresh()
+        self.__storage.update_movie(title, notes)
+        if fresh:
+            if title in self.__movies:
+                self.__movies[title]['notes'] = notes
+            self.__signature = self._file_signature()
+        else:
+            self.invalidate()
+
+    @locked
+    def update_movies(self, notes):
+        """
+            Updates the notes of many movies in the storage and in the cached catalog.
+
+            Args:
+                notes (dict): Movie titles as keys and their new notes as values.
+            """
+        fresh = self._is_fresh()
+        self.__storage.update_movies(notes)
+        if fresh:
+            for title, movie_notes in notes.items():
+                if title in self.__movies:
+                    self.__movies[title]['notes'] = movie_notes
+            self.__signature = self._file_signature()
+        else:
+            self.invalidate()
@@ -1,10 +1,23 @@
 from istorage import IStorage
+from movie import Movie
+from file_lock import FileLock, AtomicFile, file_version, locked
 import csv
+import io
 import os
 
 
 class StorageCsv(IStorage):
-    """Class for handling movie storage using CSV files."""
+    """Class for handling movie storage using CSV files.
+
+        Deleting or updating a movie streams the file row by row into a temporary file,
+        editing only the matching row, and then atomically replaces the original. Rows that
+        are not touched are copied as raw strings, so memory use does not grow with the file.
+
+        Writers hold an exclusive FileLock, so several processes can share the file. Appends
+        are done with a single write and rewrites replace the file atomically; readers do not
+        wait for the lock and retry if a writer changed the file during the read.
+        """
+    FIELDNAMES = ['title', 'rating', 'year', 'country', 'poster_url', 'imdb_id', 'notes']
 
     def __init__(self, file_path):
         """
@@ -14,58 +27,142 @@ class StorageCsv(IStorage):
                 file_path (str): The path to the CSV file.
             """
         self.__file_path = file_path
-        if not os.path.exists(self.__file_path):
-            self._create_empty_csv_file()
+        self.__lock = FileLock(file_path)
+        if not os.path.exists(self.__file_path) and self._create_empty_csv_file():
             print(f"Storage file '{self.__file_path}' created successfully.")
 
+    @property
+    def file_path(self):
+        """str: The path to the CSV file."""
+        return self.__file_path
+
+    @property
+    def lock(self):
+        """FileLock: The lock coordinating the processes using the CSV file."""
+        return self.__lock
+
+    def version(self):
+        """
+            Returns a value that changes whenever the CSV file is written.
+
+            Returns:
+                tuple: The (mtime, size, inode) of the file, None if it does not exist.
+            """
+        return file_version(self.__file_path)
+
+    @locked
     def _create_empty_csv_file(self):
-        """Create an empty CSV file with header if it does not exist."""
-        with open(self.__file_path, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['title', 'rating', 'year', 'country', 'poster_url', 'imdb_id', 'notes'])
+        """
+            Create an empty CSV file with header if it does not exist.
 
-    def list_movies(self):
+            Returns:
+                bool: Whether the file was created, False if another process created it first.
+            """
+        if os.path.exists(self.__file_path):
+            return False
+        with AtomicFile(self.__file_path, newline='') as atomic:
+            writer = csv.writer(atomic.file)
+            writer.writerow(self.FIELDNAMES)
+        return True
+
+    def _read_fieldnames(self):
         """
-            Reads movie data from the CSV file and returns it as a dictionary.
+            Reads the header of the CSV file.
 
             Returns:
-                dict: A dictionary containing movie titles as keys and movie information as values.
+                list: The column names in file order, or None if the file is empty.
             """
-        movies = {}
         with open(self.__file_path, 'r', newline='') as csv_file:
-            reader = csv.DictReader(csv_file)
-            for row in reader:
-                movies[row['title']] = {
-                    'rating': float(row['rating']),
-                    'year': int(row['year']),
-                    'poster_url': row['poster_url'],
-                    'country': row['country'],
-                    'imdb_id': row['imdb_id'],
-                    'notes': row['notes']
-                }
-        return movies
+            return next(csv.reader(csv_file), None)
 
-    def add_movie(self, title, year, rating, poster_url, country, imdb_id, notes):
+    def iter_movies(self):
+        """
+            Reads movie data from the CSV file one row at a time.
+
+            Yields:
+                tuple: A (title, movie information) pair for each row in the file.
+            """
+        with open(self.__file_path, 'r', newline='') as csv_file:
+            for row in csv.DictReader(csv_file):
+                yield row['title'], self.make_movie_info(row['year'], row['rating'], row['poster_url'],
+                                                         row['country'], row['imdb_id'], row['notes'])
+
+    def list_movies(self):
         """
             Reads movie data from the CSV file and returns it as a dictionary.
 
             Returns:
                 dict: A dictionary containing movie titles as keys and movie information as values.
             """
-        movie_data = {
-            'title': title,
-            'rating': rating,
+        return self.__lock.read(lambda: dict(self.iter_movies()), self.version)
+
+    def load_catalog(self):
+        """
+            Reads the CSV file one row at a time into Movie records.
+
+            Returns:
+                dict: Movie titles as keys and Movie records as values.
+            """
+        return self.__lock.read(lambda: {title: Movie.from_info(info) for title, info in self.iter_movies()},
+                                self.version)
+
+    @staticmethod
+    def make_movie_info(year, rating, poster_url, country, imdb_id, notes):
+        """
+            Builds the movie information dictionary, converting rating and year the way they are read back.
+            Years that are not a single number, like OMDb's '2001–2004' for series, are kept as text.
+
+            Returns:
+                dict: The movie information without the title.
+            """
+        try:
+            year = int(year)
+        except (TypeError, ValueError):
+            pass
+        return {
+            'rating': float(rating),
             'year': year,
             'poster_url': poster_url,
             'country': country,
             'imdb_id': imdb_id,
             'notes': notes
         }
+
+    def add_movie(self, title, year, rating, poster_url, country, imdb_id, notes):
+        """
+            Appends a new movie to the CSV file.
+
+            Args:
+                title (str): The title of the movie.
+                year (str): The release year of the movie.
+                rating (float): The rating of the movie.
+                poster_url (str): The URL of the movie poster.
+                country (str): The country of origin of the movie.
+                imdb_id (str): The IMDb ID of the movie.
+                notes (str): Any additional notes about the movie.
+            """
+        self.add_movies({title: {'rating': rating, 'year': year, 'poster_url': poster_url, 'country': country,
+                                 'imdb_id': imdb_id, 'notes': notes}})
+
+    @locked
+    def add_movies(self, movies):
+        """
+            Appends many movies to the CSV file with a single write.
+
+            Args:
+                movies (dict): Movie titles as keys and movie information as values.
+            """
+        # Follow the column order of the existing header, it differs between older files
+        fieldnames = self._read_fieldnames()
+        rows = io.StringIO(newline='')
+        writer = csv.DictWriter(rows, fieldnames=fieldnames or self.FIELDNAMES)
+        if not fieldnames:
+            writer.writeheader()
+        writer.writerows(dict(info, title=title) for title, info in movies.items())
         with open(self.__file_path, 'a', newline='') as csv_file:
-            writer = csv.DictWriter(csv_file, fieldnames=movie_data.keys())
-            if csv_file.tell() == 0:  # Check if file is empty
-                writer.writeheader()
-            writer.writerow(movie_data)
+            csv_file.write(rows.getvalue())
+            csv_file.flush()
+            os.fsync(csv_file.fileno())
 
     def delete_movie(self, title):
         """
@@ -74,10 +171,16 @@ class StorageCsv(IStorage):
             Args:
                 title (str): The title of the movie to delete.
             """
-        movies = self.list_movies()
-        if title in movies:
-            del movies[title]
-            self._write_movies_to_file(movies)
+        self._rewrite_movies(deleted={title})
+
+    def delete_movies(self, titles):
+        """
+            Deletes many movies from the CSV file in a single pass.
+
+            Args:
+                titles (iterable): The titles of the movies to delete.
+            """
+        self._rewrite_movies(deleted=set(titles))
 
     def update_movie(self, title, notes):
         """
@@ -87,21 +190,66 @@ class StorageCsv(IStorage):
                 title (str): The title of the movie to update.
                 notes (str): The new notes or comments for the movie.
             """
-        movies = self.list_movies()
-        if title in movies:
-            movies[title]['notes'] = notes
-            self._write_movies_to_file(movies)
+        self._rewrite_movies(notes={title: notes})
+
+    def update_movies(self, notes):
+        """
+            Updates the notes of many movies in the CSV file in a single pass.
+
+            Args:
+                notes (dict): Movie titles as keys and their new notes as values.
+            """
+        self._rewrite_movies(notes=notes)
+
+    @locked
+    def _rewrite_movies(self, deleted=(), notes=None):
+        """
+            Streams the CSV file into a temporary file, editing only the rows of the given movies,
+            and replaces the original file with it. The file is left untouched if none of the movies is found.
+
+            Args:
+                deleted (set): The titles of the movies to delete.
+                notes (dict): Movie titles as keys and their new notes as values.
+            """
+        notes = notes or {}
+        if not deleted and not notes:
+            return
+        found = False
+        # The source is closed before the temporary file replaces it, which Windows requires
+        with AtomicFile(self.__file_path, newline='') as atomic, \
+                open(self.__file_path, 'r', newline='') as source_file:
+            reader = csv.reader(source_file)
+            writer = csv.writer(atomic.file)
+            header = next(reader, None)
+            if header is None:
+                header = self.FIELDNAMES
+            writer.writerow(header)
+            title_index = header.index('title')
+            notes_index = header.index('notes')
+
+            for row in reader:
+                title = row[title_index]
+                if title in deleted:
+                    found = True
+                    continue
+                if title in notes:
+                    found = True
+                    row[notes_index] = notes[title]
+                writer.writerow(row)
+
+            if not found:
+                atomic.discard()
 
+    @locked
     def _write_movies_to_file(self, movies):
         """
-            Writes movie data to the CSV file.
+            Replaces the CSV file with the movie data.
 
             Args:
                 movies (dict): A dictionary containing movie titles as keys and movie information as values.
             """
-        with open(self.__file_path, 'w', newline='') as csv_file:
-            writer = csv.DictWriter(csv_file, fieldnames=['title', 'rating', 'year',
-                                                          'poster_url', 'country', 'imdb_id', 'notes'])
+        with AtomicFile(self.__file_path, newline='') as atomic:
+            writer = csv.DictWriter(atomic.file, fieldnames=self.FIELDNAMES)
             writer.writeheader()
             for movie_title, movie_data in movies.items():
                 writer.writerow({
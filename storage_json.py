@@ -1,39 +1,231 @@
 from istorage import IStorage
+from movie import Movie
+from file_lock import FileLock, AtomicFile, file_version, locked
 import json
 import os
 
 
 class StorageJson(IStorage):
-    """Class for handling movie storage using JSON files."""
+    """Class for handling movie storage using JSON files.
 
-    def __init__(self, file_path):
+        In journaled mode changes are appended as JSON lines to a journal file next to the
+        snapshot instead of rewriting the whole document. Reading replays the journal on top
+        of the snapshot, and once the journal grows past the compaction thresholds it is
+        folded back into the snapshot. Every journal record is idempotent, so a crash between
+        writing the snapshot and truncating the journal is harmless.
+
+        Several processes can share the file: writers hold an exclusive FileLock for their
+        whole read-modify-write and replace the file atomically, while readers read without
+        waiting and retry if a writer changed the file during the read.
+        """
+    JOURNAL_SUFFIX = '.journal'
+    COMPACT_RECORDS = 1000
+    COMPACT_BYTES = 1024 * 1024
+
+    def __init__(self, file_path, journaled=False, compact_records=COMPACT_RECORDS, compact_bytes=COMPACT_BYTES):
         """
             Initializes the StorageJson instance.
 
             Args:
                 file_path (str): The path to the JSON file used for storage.
+                journaled (bool): Append changes to a journal file instead of rewriting the JSON file.
+                compact_records (int): Number of journal records after which the journal is compacted.
+                compact_bytes (int): Journal size in bytes after which the journal is compacted.
             """
         self.__file_path = file_path
-        if not os.path.exists(self.__file_path):
-            self._create_empty_json_file()
+        self.__journal_path = file_path + self.JOURNAL_SUFFIX
+        self.__journaled = journaled
+        self.__compact_records = compact_records
+        self.__compact_bytes = compact_bytes
+        self.__lock = FileLock(file_path)
+        # Titles of the catalog for journaled writes, with the snapshot and journal position they reflect
+        self.__titles = None
+        self.__titles_snapshot = None
+        self.__titles_journal = None
+        self.__titles_offset = 0
+        if not os.path.exists(self.__file_path) and self._create_empty_json_file():
             print(f"Storage file '{self.__file_path}' created successfully.")
+        self.__journal_records, self.__journal_bytes = self._journal_size()
+
+    @property
+    def file_path(self):
+        """str: The path to the JSON file used for storage."""
+        return self.__file_path
+
+    @property
+    def journal_path(self):
+        """str: The path to the journal file used in journaled mode."""
+        return self.__journal_path
 
+    @property
+    def lock(self):
+        """FileLock: The lock coordinating the processes using the JSON file."""
+        return self.__lock
+
+    def version(self):
+        """
+            Returns a value that changes whenever the JSON file or its journal is written.
+
+            Returns:
+                tuple: The (mtime, size, inode) of the file and of the journal, None for a missing file.
+            """
+        return file_version(self.__file_path, self.__journal_path)
+
+    @locked
     def _create_empty_json_file(self):
-        """Create an empty JSON file if it does not exist."""
-        with open(self.__file_path, 'w') as f:
-            f.write('{}')  # Write an empty JSON object to the file
+        """
+            Create an empty JSON file if it does not exist.
+
+            Returns:
+                bool: Whether the file was created, False if another process created it first.
+            """
+        if os.path.exists(self.__file_path):
+            return False
+        with AtomicFile(self.__file_path) as atomic:
+            atomic.file.write('{}')  # Write an empty JSON object to the file
+        return True
+
+    def _journal_size(self):
+        """
+            Counts the records and bytes currently in the journal.
+
+            Returns:
+                tuple: The number of records and the size in bytes of the journal file.
+            """
+        if not os.path.exists(self.__journal_path):
+            return 0, 0
+        with open(self.__journal_path, 'rb') as journal_file:
+            records = sum(1 for line in journal_file if line.strip())
+        return records, os.path.getsize(self.__journal_path)
 
     def list_movies(self):
         """
-            Lists all movies stored in the JSON file.
+            Lists all movies stored in the JSON file, including changes still in the journal.
 
             Returns:
                 dict: A dictionary containing movie titles as keys and movie information as values.
             """
+        return self.__lock.read(self._read_movies, self.version)
+
+    def _read_movies(self):
+        """Reads the snapshot and replays the journal on top of it."""
         with open(self.__file_path, 'r') as json_file:
             movies = json.load(json_file)
+        if os.path.exists(self.__journal_path):
+            self._replay_journal(movies)
+        return movies
+
+    def load_catalog(self):
+        """
+            Lists all movies as Movie records, built while the JSON file is parsed.
+
+            Returns:
+                dict: Movie titles as keys and Movie records as values.
+            """
+        return self.__lock.read(self._read_catalog, self.version)
+
+    def _read_catalog(self):
+        """Reads the snapshot into Movie records and replays the journal on top of it."""
+        with open(self.__file_path, 'r') as json_file:
+            movies = json.load(json_file, object_pairs_hook=Movie.from_pairs)
+        if os.path.exists(self.__journal_path):
+            self._replay_journal(movies)
+            for title, info in movies.items():
+                if not isinstance(info, Movie):
+                    movies[title] = Movie.from_info(info)
         return movies
 
+    def _replay_journal(self, movies):
+        """
+            Applies the journal records to the movies loaded from the snapshot.
+
+            Args:
+                movies (dict): The movies loaded from the JSON file. Updated in place.
+            """
+        with open(self.__journal_path, 'r') as journal_file:
+            for line in journal_file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from an interrupted append; the change never completed
+                    continue
+                op = record['op']
+                title = record['title']
+                if op == 'add':
+                    movies[title] = record['movie']
+                elif op == 'delete':
+                    movies.pop(title, None)
+                elif op == 'update' and title in movies:
+                    movies[title]['notes'] = record['notes']
+
+    @locked
+    def _journaled_titles(self):
+        """
+            Returns the titles in the catalog, so journaled writes can check them without a full read.
+
+            The set is built from the snapshot once and then kept up to date by replaying only the
+            journal records appended since the last call, by this or any other process. It is built
+            again when the snapshot was replaced or the journal started over.
+
+            Returns:
+                set: The titles of the movies in the catalog.
+            """
+        snapshot, journal = file_version(self.__file_path, self.__journal_path)
+        journal_inode = journal[2] if journal else None
+        if (self.__titles is None or snapshot != self.__titles_snapshot or journal_inode != self.__titles_journal
+                or journal is not None and journal[1] < self.__titles_offset):
+            with open(self.__file_path, 'r') as json_file:
+                self.__titles = set(json.load(json_file))
+            self.__titles_snapshot, self.__titles_journal, self.__titles_offset = snapshot, journal_inode, 0
+        if journal is not None and journal[1] > self.__titles_offset:
+            with open(self.__journal_path, 'rb') as journal_file:
+                journal_file.seek(self.__titles_offset)
+                for line in journal_file:
+                    if not line.endswith(b'\n'):
+                        # A torn or unfinished last line; read again once it is complete
+                        break
+                    self.__titles_offset += len(line)
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if record['op'] == 'add':
+                        self.__titles.add(record['title'])
+                    elif record['op'] == 'delete':
+                        self.__titles.discard(record['title'])
+        return self.__titles
+
+    @locked
+    def _append_to_journal(self, *records):
+        """
+            Appends change records to the journal and compacts it when it gets too big.
+
+            Args:
+                *records (dict): The change records to append.
+            """
+        lines = ''.join(json.dumps(record) + '\n' for record in records).encode()
+        with open(self.__journal_path, 'ab+') as journal_file:
+            # Never glue a record onto a line torn by a crash, it would turn both into garbage
+            if journal_file.tell():
+                journal_file.seek(-1, os.SEEK_END)
+                if journal_file.read(1) != b'\n':
+                    lines = b'\n' + lines
+            journal_file.write(lines)
+            # Other processes append too, so the size is taken from the file itself
+            self.__journal_bytes = journal_file.tell()
+        self.__journal_records += len(records)
+        if self.__journal_records >= self.__compact_records or self.__journal_bytes >= self.__compact_bytes:
+            self.compact()
+
+    @locked
+    def compact(self):
+        """Folds the journal into the JSON file and empties the journal."""
+        self._write_movies_to_file(self.list_movies())
+
+    @locked
     def add_movie(self, title, year, rating, poster_url, country, imdb_id, notes):
         """
             Adds a new movie to the JSON file.
@@ -47,11 +239,33 @@ class StorageJson(IStorage):
                 imdb_id (str): The IMDb ID of the movie.
                 notes (str): Any additional notes about the movie.
             """
+        movie = self.make_movie_info(year, rating, poster_url, country, imdb_id, notes)
+        if self.__journaled:
+            self._append_to_journal({"op": "add", "title": title, "movie": movie})
+            return
         movies = self.list_movies()
-        movies[title] = {"rating": rating, "year": year, "poster_url": poster_url, "country": country,
-                         "imdb_id": imdb_id, "notes": notes}
+        movies[title] = movie
         self._write_movies_to_file(movies)
 
+    @locked
+    def add_movies(self, movies):
+        """
+            Adds many movies to the JSON file with a single write.
+
+            Args:
+                movies (dict): Movie titles as keys and movie information as values.
+            """
+        movies = {title: self.make_movie_info(info['year'], info['rating'], info['poster_url'], info['country'],
+                                              info['imdb_id'], info['notes'])
+                  for title, info in movies.items()}
+        if self.__journaled:
+            self._append_to_journal(*({"op": "add", "title": title, "movie": movie} for title, movie in movies.items()))
+            return
+        all_movies = self.list_movies()
+        all_movies.update(movies)
+        self._write_movies_to_file(all_movies)
+
+    @locked
     def delete_movie(self, title):
         """
             Deletes a movie from the JSON file.
@@ -59,10 +273,36 @@ class StorageJson(IStorage):
             Args:
                 title (str): The title of the movie to delete.
             """
+        if self.__journaled:
+            # Fail like the unjournaled write does, instead of recording a delete of nothing
+            if title not in self._journaled_titles():
+                raise KeyError(title)
+            self._append_to_journal({"op": "delete", "title": title})
+            return
         movies = self.list_movies()
         del movies[title]
         self._write_movies_to_file(movies)
 
+    @locked
+    def delete_movies(self, titles):
+        """
+            Deletes many movies from the JSON file with a single write.
+
+            Args:
+                titles (iterable): The titles of the movies to delete. Titles not in the file are ignored.
+            """
+        if self.__journaled:
+            known = self._journaled_titles()
+            records = [{"op": "delete", "title": title} for title in dict.fromkeys(titles) if title in known]
+            if records:
+                self._append_to_journal(*records)
+            return
+        movies = self.list_movies()
+        for title in titles:
+            movies.pop(title, None)
+        self._write_movies_to_file(movies)
+
+    @locked
     def update_movie(self, title, notes):
         """
             Updates the notes for a movie in the JSON file.
@@ -71,17 +311,50 @@ class StorageJson(IStorage):
                 title (str): The title of the movie to update.
                 notes (str): The new notes for the movie.
             """
+        if self.__journaled:
+            if title in self._journaled_titles():
+                self._append_to_journal({"op": "update", "title": title, "notes": notes})
+            return
         movies = self.list_movies()
         if title in movies:
             movies[title]["notes"] = notes
             self._write_movies_to_file(movies)
 
+    @locked
+    def update_movies(self, notes):
+        """
+            Updates the notes of many movies with a single write.
+
+            Args:
+                notes (dict): Movie titles as keys and their new notes as values.
+            """
+        if self.__journaled:
+            known = self._journaled_titles()
+            records = [{"op": "update", "title": title, "notes": movie_notes}
+                       for title, movie_notes in notes.items() if title in known]
+            if records:
+                self._append_to_journal(*records)
+            return
+        movies = self.list_movies()
+        for title, movie_notes in notes.items():
+            if title in movies:
+                movies[title]["notes"] = movie_notes
+        self._write_movies_to_file(movies)
+
+    @locked
     def _write_movies_to_file(self, movies):
         """
-            Writes the movie data to the JSON file.
+            Replaces the JSON file with the movie data and clears the journal it now contains.
 
             Args:
                  movies (dict): A dictionary containing movie data to be written to the file.
             """
-        with open(self.__file_path, 'w') as json_file:
-            json.dump(movies, json_file, indent=4)
+        with AtomicFile(self.__file_path) as atomic:
+            json.dump(movies, atomic.file, indent=4, default=Movie.to_dict)
+        if os.path.exists(self.__journal_path):
+            os.remove(self.__journal_path)
+        self.__journal_records, self.__journal_bytes = 0, 0
+        if self.__journaled:
+            self.__titles = set(movies)
+            self.__titles_snapshot, = file_version(self.__file_path)
+            self.__titles_journal, self.__titles_offset = None, 0
@@ -0,0 +1,358 @@
+from istorage import IStorage
+from storage_json import StorageJson
+from storage_csv import StorageCsv
+from storage_sqlite import StorageSqlite
+from storage_cache import CachedStorage
+from file_lock import AtomicFile, FileLock
+import json
+import os
+import zlib
+
+
+class ShardedStorage(IStorage):
+    """Storage splitting the catalog across several files of one of the other backends.
+
+        Every title belongs to exactly one shard, picked by the CRC32 of the title, so
+        adding, deleting or updating a movie reads and rewrites only that shard's file and
+        the cost of a write grows with the shard size instead of the catalog size. Files
+        of the JSON and CSV backends are read through a CachedStorage each, so after a
+        write only the shard that changed is parsed again.
+
+        Full scans load the shards on a thread pool and merge them into one catalog, which
+        is kept and updated in place by writes made through this storage. SQLite shards are
+        scanned on the pool as well, each shard by one thread at a time. The movies come out
+        grouped by shard rather than in the order they were added.
+
+        The shards live in a directory together with manifest.json, which names the
+        backend and the shard files. reshard() writes a new set of shard files and switches
+        to them by replacing the manifest, so an interrupted re-shard leaves the catalog
+        as it was. No other process should write the catalog during a re-shard.
+        """
+    MANIFEST_FILE = 'manifest.json'
+    BACKENDS = {'json': ('.json', StorageJson), 'csv': ('.csv', StorageCsv), 'sqlite': ('.db', StorageSqlite)}
+    DEFAULT_SHARDS = 16
+    DEFAULT_BACKEND = 'json'
+
+    def __init__(self, directory, shards=DEFAULT_SHARDS, backend=DEFAULT_BACKEND, jobs=None):
+        """
+            Initializes the ShardedStorage instance, creating an empty catalog if the directory has no manifest.
+
+            Args:
+                directory (str): The directory holding the manifest and the shard files.
+                shards (int): Number of shards of a new catalog. An existing catalog keeps its own.
+                backend (str): 'json', 'csv' or 'sqlite', the format of the shard files of a new catalog.
+                jobs (int): Number of threads loading shards. Defaults to one per shard, up to the CPU count.
+            """
+        self.__directory = directory
+        self.__manifest_path = os.path.join(directory, self.MANIFEST_FILE)
+        self.__jobs = jobs
+        self.__executor = None
+        self.__movies = None
+        self.__shard_catalogs = None
+        if not os.path.exists(self.__manifest_path):
+            file_names = self.shard_file_names(backend, 1, shards)
+            os.makedirs(directory, exist_ok=True)
+            # The converter's writers create the empty shards without announcing every file
+            from catalog_converter import CatalogConverter
+            write_shard = getattr(CatalogConverter, f'write_{backend}')
+            for file_name in file_names:
+                write_shard([], os.path.join(directory, file_name))
+            self.write_manifest(directory, backend, file_names)
+            print(f"Sharded storage '{directory}' created with {shards} {backend} shards.")
+        self.__open()
+
+    @property
+    def directory(self):
+        """str: The directory holding the manifest and the shard files."""
+        return self.__directory
+
+    @property
+    def backend(self):
+        """str: The format of the shard files."""
+        return self.__manifest['backend']
+
+    @property
+    def shard_count(self):
+        """int: Number of shards."""
+        return len(self.__shards)
+
+    @staticmethod
+    def shard_of(title, shards):
+        """
+            Returns the shard a title belongs to.
+
+            Args:
+                title (str): The movie title.
+                shards (int): The number of shards.
+
+            Returns:
+                int: The index of the shard.
+            """
+        return zlib.crc32(title.encode('utf-8')) % shards
+
+    @classmethod
+    def shard_file_names(cls, backend, generation, shards):
+        """
+            Returns the file names of a set of shards.
+
+            Args:
+                backend (str): The format of the shard files.
+                generation (int): Numbers the sets of shards, so a re-shard does not overwrite the live files.
+                shards (int): The number of shards.
+
+            Returns:
+                list: The file names, in shard order.
+            """
+        if backend not in cls.BACKENDS:
+            raise ValueError(f"Unknown shard backend '{backend}', use one of {', '.join(cls.BACKENDS)}.")
+        if shards < 1:
+            raise ValueError("A sharded storage needs at least one shard.")
+        extension = cls.BACKENDS[backend][0]
+        return [f'shard-{generation}-{index:03d}{extension}' for index in range(shards)]
+
+    @classmethod
+    def read_manifest(cls, directory):
+        """
+            Reads the manifest of a sharded catalog.
+
+            Args:
+                directory (str): The directory of the catalog.
+
+            Returns:
+                dict: The 'backend', the 'generation' and the shard 'files' of the catalog.
+            """
+        with open(os.path.join(directory, cls.MANIFEST_FILE), 'r') as manifest_file:
+            return json.load(manifest_file)
+
+    @classmethod
+    def write_manifest(cls, directory, backend, files, generation=1):
+        """
+            Replaces the manifest of a sharded catalog, which switches it to the shard files listed.
+
+            Args:
+                directory (str): The directory of the catalog.
+                backend (str): The format of the shard files.
+                files (list): The shard file names, in shard order.
+                generation (int): The generation of the shard files.
+            """
+        with AtomicFile(os.path.join(directory, cls.MANIFEST_FILE)) as atomic:
+            json.dump({'backend': backend, 'generation': generation, 'files': files}, atomic.file, indent=4)
+
+    def __open_shard(self, backend, file_name):
+        """Opens one shard file with the backend, behind a read cache for the file based backends."""
+        storage_class = self.BACKENDS[backend][1]
+        if backend == 'sqlite':
+            # SQLite has its own page cache and answers queries without parsing the whole file. The
+            # shard is used by the loading threads, but __map_shards hands each shard to one at a time
+            return storage_class(os.path.join(self.__directory, file_name), check_same_thread=False)
+        return CachedStorage(storage_class(os.path.join(self.__directory, file_name)))
+
+    def __open(self):
+        """Reads the manifest and opens the shards it lists."""
+        self.__manifest = self.read_manifest(self.__directory)
+        self.__shards = [self.__open_shard(self.__manifest['backend'], file_name)
+                         for file_name in self.__manifest['files']]
+        self.__movies = None
+        self.__shard_catalogs = None
+
+    def shard_index(self, title):
+        """
+            Returns the shard a title belongs to.
+
+            Args:
+                title (str): The movie title.
+
+            Returns:
+                int: The index of the shard.
+            """
+        return self.shard_of(title, len(self.__shards))
+
+    def __shard(self, title):
+        """Returns the storage of the shard a title belongs to."""
+        return self.__shards[self.shard_index(title)]
+
+    def __group(self, titles):
+        """Splits titles, or a dictionary keyed by title, into one dictionary per shard."""
+        groups = {}
+        for title in titles:
+            groups.setdefault(self.shard_index(title), {})[title] = titles[title] if isinstance(titles, dict) else None
+        return groups
+
+    def __map_shards(self, function):
+        """Calls a function with every shard, on the thread pool when there is more than one job."""
+        jobs = self.__jobs or min(len(self.__shards), os.cpu_count() or 1)
+        if jobs <= 1 or len(self.__shards) == 1:
+            return [function(shard) for shard in self.__shards]
+        if self.__executor is None:
+            # Only parallel loading needs the executor, importing it slows down every start
+            from concurrent.futures import ThreadPoolExecutor
+            self.__executor = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix='shard')
+        return list(self.__executor.map(function, self.__shards))
+
+    def make_movie_info(self, year, rating, poster_url, country, imdb_id, notes):
+        """Builds the movie information in the shape the shard backend returns."""
+        return self.__shards[0].make_movie_info(year, rating, poster_url, country, imdb_id, notes)
+
+    def list_movies(self):
+        """
+            Lists all movies of all shards. Shards are loaded in parallel and only the shards
+            that changed since the last call are parsed again.
+
+            The returned dictionary is shared with the storage and must not be modified by the caller.
+
+            Returns:
+                dict: Movie titles as keys and Movie records as values.
+            """
+        catalogs = self.__map_shards(lambda shard: shard.load_catalog())
+        # The cached shards return the same dictionary as long as their file did not change
+        if self.__movies is None or any(catalog is not previous
+                                        for catalog, previous in zip(catalogs, self.__shard_catalogs)):
+            movies = {}
+            for catalog in catalogs:
+                movies.update(catalog)
+            self.__movies = movies
+            self.__shard_catalogs = catalogs
+        return self.__movies
+
+    def load_catalog(self):
+        """
+            Lists all movies as Movie records; the merged catalog already holds them.
+
+            Returns:
+                dict: Movie titles as keys and Movie records as values.
+            """
+        return self.list_movies()
+
+    def __merged(self):
+        """Returns the merged catalog if it is kept, for writes to apply their change to."""
+        return self.__movies if self.backend != 'sqlite' else None
+
+    def add_movie(self, title, year, rating, poster_url, country, imdb_id, notes):
+        """
+            Adds a new movie to its shard.
+
+            Args:
+                title (str): The title of the movie.
+                year (str): The release year of the movie.
+                rating (float): The rating of the movie.
+                poster_url (str): The URL of the movie poster.
+                country (str): The country of origin of the movie.
+                imdb_id (str): The IMDb ID of the movie.
+                notes (str): Any additional notes about the movie.
+            """
+        shard = self.__shard(title)
+        shard.add_movie(title, year, rating, poster_url, country, imdb_id, notes)
+        self.__refresh(title, shard)
+
+    def add_movies(self, movies):
+        """
+            Adds many movies with one write per shard they belong to.
+
+            Args:
+                movies (dict): Movie titles as keys and movie information as values.
+            """
+        for index, shard_movies in self.__group(movies).items():
+            self.__shards[index].add_movies(shard_movies)
+            for title in shard_movies:
+                self.__refresh(title, self.__shards[index])
+
+    def delete_movie(self, title):
+        """
+            Deletes a movie from its shard.
+
+            Args:
+                title (str): The title of the movie to delete.
+            """
+        self.__shard(title).delete_movie(title)
+        if self.__merged() is not None:
+            self.__movies.pop(title, None)
+
+    def delete_movies(self, titles):
+        """
+            Deletes many movies with one write per shard they belong to.
+
+            Args:
+                titles (iterable): The titles of the movies to delete. Titles not in the storage are ignored.
+            """
+        for index, shard_titles in self.__group(list(titles)).items():
+            self.__shards[index].delete_movies(list(shard_titles))
+            if self.__merged() is not None:
+                for title in shard_titles:
+                    self.__movies.pop(title, None)
+
+    def update_movie(self, title, notes):
+        """
+            Updates the notes for a movie in its shard.
+
+            Args:
+                title (str): The title of the movie to update.
+                notes (str): The new notes for the movie.
+            """
+        shard = self.__shard(title)
+        shard.update_movie(title, notes)
+        self.__refresh(title, shard)
+
+    def update_movies(self, notes):
+        """
+            Updates the notes of many movies with one write per shard they belong to.
+
+            Args:
+                notes (dict): Movie titles as keys and their new notes as values.
+            """
+        for index, shard_notes in self.__group(notes).items():
+            self.__shards[index].update_movies(shard_notes)
+            for title in shard_notes:
+                self.__refresh(title, self.__shards[index])
+
+    def __refresh(self, title, shard):
+        """Copies a written movie from its shard's cached catalog into the merged catalog."""
+        if self.__merged() is None:
+            return
+        # The shard cache applied the write in place; the merged catalog holds the same records
+        movie = shard.load_catalog().get(title)
+        if movie is not None:
+            self.__movies[title] = movie
+
+    def reshard(self, shards, backend=None):
+        """
+            Redistributes the movies over a new number of shards, optionally in another backend.
+
+            The new shard files are written next to the current ones, one pass each, and the
+            manifest is replaced to switch to them before the old files are removed.
+
+            Args:
+                shards (int): The new number of shards.
+                backend (str): The format of the new shard files, the current one if omitted.
+            """
+        backend = backend or self.backend
+        generation = self.__manifest.get('generation', 1) + 1
+        file_names = self.shard_file_names(backend, generation, shards)
+
+        # The converter's writers replace each file atomically and write it in one pass
+        from catalog_converter import CatalogConverter
+        write_shard = getattr(CatalogConverter, f'write_{backend}')
+
+        groups = [{} for _ in file_names]
+        for title, movie in self.list_movies().items():
+            groups[self.shard_of(title, shards)][title] = movie
+        for file_name, group in zip(file_names, groups):
+            write_shard(group.items(), os.path.join(self.__directory, file_name))
+
+        old_file_names = self.__manifest['files']
+        self.close()
+        self.write_manifest(self.__directory, backend, file_names, generation)
+        for file_name in old_file_names:
+            file_path = os.path.join(self.__directory, file_name)
+            for path in (file_path, file_path + StorageJson.JOURNAL_SUFFIX, file_path + FileLock.SUFFIX):
+                if os.path.exists(path):
+                    os.remove(path)
+        self.__open()
+
+    def close(self):
+        """Stops the loading threads and closes SQLite shards."""
+        if self.__executor is not None:
+            self.__executor.shutdown()
+            self.__executor = None
+        if self.backend == 'sqlite':
+            for shard in self.__shards:
+                shard.close()
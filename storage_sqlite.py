@@ -0,0 +1,207 @@
+from istorage import IStorage
+from movie import Movie
+import sqlite3
+import os
+
+
+class StorageSqlite(IStorage):
+    """Class for handling movie storage using an SQLite database."""
+
+    def __init__(self, file_path, check_same_thread=True):
+        """
+            Initializes the StorageSqlite instance.
+
+            Args:
+                file_path (str): The path to the SQLite database file.
+                check_same_thread (bool): Only allow the thread that created the storage to use it. Pass False
+                    when the caller makes sure that only one thread at a time uses the storage.
+            """
+        self.__file_path = file_path
+        is_new = not os.path.exists(self.__file_path)
+        self.__connection = sqlite3.connect(self.__file_path, check_same_thread=check_same_thread)
+        self._create_schema()
+        if is_new:
+            print(f"Storage file '{self.__file_path}' created successfully.")
+
+    @property
+    def file_path(self):
+        """str: The path to the SQLite database file."""
+        return self.__file_path
+
+    def _create_schema(self):
+        """Create the movies table and its indexes if they do not exist."""
+        with self.__connection:
+            self.__connection.execute(
+                'CREATE TABLE IF NOT EXISTS movies ('
+                'id INTEGER PRIMARY KEY, '
+                'title TEXT NOT NULL UNIQUE, '
+                'rating REAL, '
+                'year INTEGER, '
+                'poster_url TEXT, '
+                'country TEXT, '
+                'imdb_id TEXT, '
+                'notes TEXT)'
+            )
+            # The UNIQUE constraint already gives an index on title
+            self.__connection.execute('CREATE INDEX IF NOT EXISTS movies_imdb_id ON movies (imdb_id)')
+
+    def list_movies(self):
+        """
+            Lists all movies stored in the database.
+
+            Returns:
+                dict: A dictionary containing movie titles as keys and movie information as values.
+            """
+        cursor = self.__connection.execute(
+            'SELECT title, rating, year, poster_url, country, imdb_id, notes FROM movies ORDER BY id'
+        )
+        return {row[0]: self._row_to_movie(row) for row in cursor}
+
+    def load_catalog(self):
+        """
+            Lists all movies stored in the database as Movie records.
+
+            Returns:
+                dict: Movie titles as keys and Movie records as values.
+            """
+        cursor = self.__connection.execute(
+            'SELECT title, rating, year, poster_url, country, imdb_id, notes FROM movies ORDER BY id'
+        )
+        return {row[0]: Movie(*row[1:]) for row in cursor}
+
+    def get_movie(self, title):
+        """
+            Looks up a single movie by its title using the title index.
+
+            Args:
+                title (str): The title of the movie.
+
+            Returns:
+                dict: The movie information, or None if there is no such movie.
+            """
+        row = self.__connection.execute(
+            'SELECT title, rating, year, poster_url, country, imdb_id, notes FROM movies WHERE title = ?',
+            (title,)
+        ).fetchone()
+        return self._row_to_movie(row) if row else None
+
+    def get_movie_by_imdb_id(self, imdb_id):
+        """
+            Looks up a single movie by its IMDb ID using the imdb_id index.
+
+            Args:
+                imdb_id (str): The IMDb ID of the movie.
+
+            Returns:
+                tuple: A (title, movie information) pair, or None if there is no such movie.
+            """
+        row = self.__connection.execute(
+            'SELECT title, rating, year, poster_url, country, imdb_id, notes FROM movies WHERE imdb_id = ?',
+            (imdb_id,)
+        ).fetchone()
+        return (row[0], self._row_to_movie(row)) if row else None
+
+    def add_movie(self, title, year, rating, poster_url, country, imdb_id, notes):
+        """
+            Adds a new movie to the database, replacing any movie with the same title.
+
+            Args:
+                title (str): The title of the movie.
+                year (str): The release year of the movie.
+                rating (float): The rating of the movie.
+                poster_url (str): The URL of the movie poster.
+                country (str): The country of origin of the movie.
+                imdb_id (str): The IMDb ID of the movie.
+                notes (str): Any additional notes about the movie.
+            """
+        self.add_movies({title: {'rating': rating, 'year': year, 'poster_url': poster_url, 'country': country,
+                                 'imdb_id': imdb_id, 'notes': notes}})
+
+    def add_movies(self, movies):
+        """
+            Adds many movies to the database in a single transaction.
+
+            Args:
+                movies (dict): Movie titles as keys and movie information as values.
+            """
+        with self.__connection:
+            self.__connection.executemany(
+                'INSERT INTO movies (title, rating, year, poster_url, country, imdb_id, notes) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (title) DO UPDATE SET rating = excluded.rating, year = excluded.year, '
+                'poster_url = excluded.poster_url, country = excluded.country, '
+                'imdb_id = excluded.imdb_id, notes = excluded.notes',
+                ((title, info['rating'], info['year'], info['poster_url'], info['country'], info['imdb_id'],
+                  info['notes']) for title, info in movies.items())
+            )
+
+    def delete_movie(self, title):
+        """
+            Deletes a movie from the database.
+
+            Args:
+                title (str): The title of the movie to delete.
+
+            Raises:
+                KeyError: If there is no movie with this title, like the JSON storage.
+            """
+        with self.__connection:
+            cursor = self.__connection.execute('DELETE FROM movies WHERE title = ?', (title,))
+        if cursor.rowcount == 0:
+            raise KeyError(title)
+
+    def delete_movies(self, titles):
+        """
+            Deletes many movies from the database in a single transaction.
+
+            Args:
+                titles (iterable): The titles of the movies to delete.
+            """
+        with self.__connection:
+            self.__connection.executemany('DELETE FROM movies WHERE title = ?', ((title,) for title in titles))
+
+    def update_movie(self, title, notes):
+        """
+            Updates the notes for a movie in the database.
+
+            Args:
+                title (str): The title of the movie to update.
+                notes (str): The new notes for the movie.
+            """
+        with self.__connection:
+            self.__connection.execute('UPDATE movies SET notes = ? WHERE title = ?', (notes, title))
+
+    def update_movies(self, notes):
+        """
+            Updates the notes of many movies in a single transaction.
+
+            Args:
+                notes (dict): Movie titles as keys and their new notes as values.
+            """
+        with self.__connection:
+            self.__connection.executemany('UPDATE movies SET notes = ? WHERE title = ?',
+                                          ((movie_notes, title) for title, movie_notes in notes.items()))
+
+    def close(self):
+        """Closes the database connection."""
+        self.__connection.close()
+
+    @staticmethod
+    def _row_to_movie(row):
+        """
+            Converts a database row into the movie information dictionary used by the other storages.
+
+            Args:
+                row (tuple): A (title, rating, year, poster_url, country, imdb_id, notes) row.
+
+            Returns:
+                dict: The movie information without the title.
+            """
+        return {
+            'rating': row[1],
+            'year': row[2],
+            'poster_url': row[3],
+            'country': row[4],
+            'imdb_id': row[5],
+            'notes': row[6]
+        }
@@ -1,48 +1,68 @@
-import pycountry
+from collections import deque
+from contextlib import nullcontext
+from functools import lru_cache
+from itertools import islice
+from movie_query import MovieQuery
+from country_resolver import CountryResolver
+import json
+import os
+import re
+import sys
 
 
 class WebsiteGenerator:
+    """Generates the movies website from the HTML template.
+
+        Rendered movie fragments are kept keyed by the movie's fields, so regenerating the
+        site only renders movies that were added or changed since the previous run, for both
+        the single page and the paginated website. The fragments only live in memory: they
+        help repeated runs in one process, such as the interactive menu, while a one-shot
+        generate-site renders every movie once. The output file is only rewritten when the
+        page content changed.
+        Posters can be served from local copies, see PosterCache, by passing a posters
+        dictionary mapping poster URLs to local paths; they are loaded lazily by the browser.
+        With jobs > 1 the movies that need rendering are split into chunks rendered by worker
+        processes, or threads on free-threaded Python builds, and put back in catalog order.
+        A single page uses them from MIN_PARALLEL_MOVIES movies on; paginated websites hand
+        every page to the workers and render several pages ahead of the one being written.
+        """
     IMDB_URL = 'https://www.imdb.com/title/'
+    MIN_PARALLEL_MOVIES = 1000
+    RENDER_CHUNK_SIZE = 500
+    _fragment_cache = {}
+    _written_pages = {}
 
     @staticmethod
-    def __serialize_movie(title, movie_info):
-        """ Serializes a single movie info into HTML """
+    def __serialize_movie(title, movie_info, poster_src=None):
+        """ Serializes a single movie info into HTML, poster_src replaces the poster URL with a local file """
         # Extract fields from movie_info
         year = movie_info.get('year')
         rating = float(movie_info.get('rating'))
-        poster_url = movie_info.get('poster_url')
+        poster_url = poster_src or movie_info.get('poster_url')
         country = movie_info.get('country')
         imdb_id = movie_info.get('imdb_id')
         notes = movie_info.get('notes')
 
         # Generate output
-        output = ''
-        output += '<li>\n'
-        output += '    <div class="movie">\n'
-        output += f'        <a href="{WebsiteGenerator.IMDB_URL}{imdb_id}" target="_blank">\n'
-        output += f'            <img class="movie-poster" src="{poster_url}" {"title=" + repr(notes) if notes else ""}>\n'
-        output += f'        </a>\n'
-        output += f'        <img class="movie-country-flag" title="{country}" ' \
-                  f'src="https://flagsapi.com/{WebsiteGenerator.__get_alpha2_code(country)}/shiny/24.png">\n'
-        output += f'        <div class="movie-title">{title}</div>\n'
-        output += f'        <div class="movie-year">{year}</div>\n'
-        output += f'        <div class="movie-rating" title="{rating}">{WebsiteGenerator.__generate_star_icon(rating)}</div>\n'
-        output += '    </div>\n'
-        output += '</li>'
-
-        return output
+        return ''.join((
+            '<li>\n',
+            '    <div class="movie">\n',
+            f'        <a href="{WebsiteGenerator.IMDB_URL}{imdb_id}" target="_blank">\n',
+            f'            <img class="movie-poster" src="{poster_url}" loading="lazy" {"title=" + repr(notes) if notes else ""}>\n',
+            '        </a>\n',
+            f'        <img class="movie-country-flag" title="{country}" '
+            f'src="https://flagsapi.com/{WebsiteGenerator.__get_alpha2_code(country)}/shiny/24.png">\n',
+            f'        <div class="movie-title">{title}</div>\n',
+            f'        <div class="movie-year">{year}</div>\n',
+            f'        <div class="movie-rating" title="{rating}">{WebsiteGenerator.__generate_star_icon(rating)}</div>\n',
+            '    </div>\n',
+            '</li>'
+        ))
 
     @staticmethod
     def __get_alpha2_code(country_name):
         """ Get two-letter code for a given country """
-        try:
-            country = pycountry.countries.get(name=country_name)
-            if country:
-                return country.alpha_2
-            else:
-                print(f"Country '{country_name}' not found in the pycountry database.")
-        except LookupError as e:
-            print(f"Error: {e}")
+        return CountryResolver.default().resolve(country_name)
 
     @staticmethod
     def __generate_star_icon(rating):
@@ -58,45 +78,372 @@ class WebsiteGenerator:
         elif rating >= 2.3:
             num_stars = 2
 
-        star_icon = ''
+        return WebsiteGenerator.__generate_stars(num_stars)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def __generate_stars(num_stars):
+        """ Generates the SVG for a number of stars, there are only five variants so they are cached """
+        star_icon = f'<svg xmlns="http://www.w3.org/2000/svg" width="24" height="24" ' \
+                    f'fill="currentColor" class="bi bi-star-fill" viewBox="0 0 24 24">'
+        star_icon += '<path d="M12 17.27l4.15 2.51c.76.46 1.69-.22 1.49-1.08l-1.1-4.72 ' \
+                     '3.67-3.18c.67-.58.31-1.68-.57-1.75l-4.83-.41-1.89-4.46c-' \
+                     '.34-.81-1.5-.81-1.84 0L9.19 8.63l-4.83.41c-.88.07-1.24 1.17-.57 ' \
+                     '1.75l3.67 3.18-1.1 4.72c-.2.86.73 1.54 1.49 1.08l4.15-2.5z"/>'
+        star_icon += '</svg>'
 
-        for star in range(num_stars):
-            star_icon += f'<svg xmlns="http://www.w3.org/2000/svg" width="24" height="24" ' \
-                         f'fill="currentColor" class="bi bi-star-fill" viewBox="0 0 24 24">'
-            star_icon += '<path d="M12 17.27l4.15 2.51c.76.46 1.69-.22 1.49-1.08l-1.1-4.72 ' \
-                         '3.67-3.18c.67-.58.31-1.68-.57-1.75l-4.83-.41-1.89-4.46c-' \
-                         '.34-.81-1.5-.81-1.84 0L9.19 8.63l-4.83.41c-.88.07-1.24 1.17-.57 ' \
-                         '1.75l3.67 3.18-1.1 4.72c-.2.86.73 1.54 1.49 1.08l4.15-2.5z"/>'
-            star_icon += '</svg>'
+        return star_icon * num_stars
 
-        return star_icon
+    @staticmethod
+    def _render_chunk(movies):
+        """ Renders a chunk of movies in a worker and returns the fragments together with
+            the country names the worker could not resolve """
+        resolver = CountryResolver.default()
+        fragments = [WebsiteGenerator.__serialize_movie(title, movie_info, poster_src)
+                     for title, movie_info, poster_src in movies]
+        unresolved = dict(resolver.unresolved)
+        resolver.unresolved.clear()
+        return fragments, unresolved
 
     @staticmethod
-    def __generate_movies_info(movies):
-        """ Generates HTML list items with movies data """
-        output = ""
-        for title, movie_info in movies.items():
-            output += WebsiteGenerator.__serialize_movie(title, movie_info)
+    def __create_executor(jobs):
+        """ Creates the worker pool for parallel rendering, or a dummy context when rendering serially """
+        if not jobs or jobs <= 1:
+            return nullcontext()
+        # Only parallel rendering needs the executors, importing them slows down every start
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        # Without the GIL threads render in parallel and avoid pickling movies to other processes
+        is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+        if is_gil_enabled is not None and not is_gil_enabled():
+            return ThreadPoolExecutor(max_workers=jobs)
+        return ProcessPoolExecutor(max_workers=jobs)
+
+    @staticmethod
+    def __collect_fragments(movies, posters=None, fragment_cache=None):
+        """ Looks the movies up in the fragment cache of the previous run, and in fragment_cache of
+            this run, and returns their cache keys, the cached fragments with None for the movies
+            that need rendering, and those movies """
+        previous_cache = WebsiteGenerator._fragment_cache
+        fragment_cache = fragment_cache or {}
+        posters = posters or {}
+        keys = []
+        fragments = []
+        missing = []
+        for title, movie_info in movies:
+            poster_url = movie_info.get('poster_url')
+            poster_src = posters.get(poster_url, poster_url)
+            # The fields themselves are the content key, any change to a movie gives a new key
+            key = (title, movie_info.get('year'), movie_info.get('rating'), poster_src,
+                   movie_info.get('country'), movie_info.get('imdb_id'), movie_info.get('notes'))
+            fragment = previous_cache.get(key) or fragment_cache.get(key)
+            if fragment is None:
+                missing.append((len(fragments), title, movie_info, poster_src))
+            keys.append(key)
+            fragments.append(fragment)
+        return keys, fragments, missing
+
+    @staticmethod
+    def __submit_render(executor, missing):
+        """ Hands the movies to render to the workers in chunks and returns the futures, in order """
+        chunk_size = WebsiteGenerator.RENDER_CHUNK_SIZE
+        return [executor.submit(WebsiteGenerator._render_chunk,
+                                [item[1:] for item in missing[start:start + chunk_size]])
+                for start in range(0, len(missing), chunk_size)]
+
+    @staticmethod
+    def __join_fragments(keys, fragments, missing, futures=None, fragment_cache=None):
+        """ Fills in the rendered fragments, from the workers' futures or rendered here without them,
+            and joins all fragments. They are stored in fragment_cache when one is given. """
+        if futures is not None:
+            rendered = []
+            resolver = CountryResolver.default()
+            for future in futures:
+                chunk_fragments, unresolved = future.result()
+                rendered.extend(chunk_fragments)
+                resolver.unresolved.update(unresolved)
+        else:
+            rendered = [WebsiteGenerator.__serialize_movie(title, movie_info, poster_src)
+                        for index, title, movie_info, poster_src in missing]
+
+        for (index, *_), fragment in zip(missing, rendered):
+            fragments[index] = fragment
+        if fragment_cache is not None:
+            fragment_cache.update(zip(keys, fragments))
+
+        return ''.join(fragments)
 
-        return output
+    @staticmethod
+    def __generate_movies_info(movies, fragment_cache=None, executor=None, posters=None):
+        """ Generates HTML list items with movies data, reusing the fragments of unchanged movies.
+            The rendered fragments are stored in fragment_cache when one is given. """
+        keys, fragments, missing = WebsiteGenerator.__collect_fragments(movies, posters)
+        futures = None
+        if executor is not None and len(missing) >= WebsiteGenerator.MIN_PARALLEL_MOVIES:
+            futures = WebsiteGenerator.__submit_render(executor, missing)
+        return WebsiteGenerator.__join_fragments(keys, fragments, missing, futures, fragment_cache)
+
+    @staticmethod
+    def __is_unchanged(output_file_path, content):
+        """ Checks whether the output file already holds exactly this content """
+        try:
+            stat = os.stat(output_file_path)
+        except OSError:
+            return False
+        # Pages written by this process are recognised by their hash as long as nobody else touched the file
+        written = WebsiteGenerator._written_pages.get(os.path.abspath(output_file_path))
+        if written is not None and written[1:] == (stat.st_mtime_ns, stat.st_size):
+            return written[0] == hash(content)
+        try:
+            with open(output_file_path, 'r') as output_file:
+                return output_file.read() == content
+        except OSError:
+            return False
 
     @staticmethod
-    def generate_website_content(movies, template_file_path, output_file_path, website_title):
-        """ Generates a movies website by replacing placeholders in the HTML template """
+    def generate_website_content(movies, template_file_path, output_file_path, website_title, jobs=1, posters=None):
+        """ Generates a movies website by replacing placeholders in the HTML template.
+            With jobs > 1 the movies are rendered by that many worker processes. posters maps
+            poster URLs to local files used instead of them, as returned by PosterCache.sources(). """
         # Generate a string with movies' data
-        movies_info_string = WebsiteGenerator.__generate_movies_info(movies)
+        fragment_cache = {}
+        with WebsiteGenerator.__create_executor(jobs) as executor:
+            movies_info_string = WebsiteGenerator.__generate_movies_info(movies.items(), fragment_cache, executor,
+                                                                         posters)
+        # Only keep the fragments of the current movies so the cache does not grow with every edit
+        WebsiteGenerator._fragment_cache = fragment_cache
+        CountryResolver.default().report()
 
         # Read the content of the template file
         with open(template_file_path, 'r') as template_file:
             template_content = template_file.read()
 
+        # Replace __TEMPLATE_TITLE__ with my title while the template is still small
+        template_content = template_content.replace('__TEMPLATE_TITLE__', website_title)
+        template_content = template_content.replace('__TEMPLATE_PAGINATION__', '')
         # Replace __TEMPLATE_MOVIE_GRID__ with the generated string
         new_content = template_content.replace('__TEMPLATE_MOVIE_GRID__', movies_info_string)
-        # Replace __TEMPLATE_TITLE__ with my title
-        new_content = new_content.replace('__TEMPLATE_TITLE__', website_title)
+
+        if WebsiteGenerator.__is_unchanged(output_file_path, new_content):
+            print("Website is already up to date.")
+            return
 
         # Write the new HTML content to a new file, animals.html
-        with open(output_file_path, 'w') as output_file:
-            output_file.write(new_content)
+        WebsiteGenerator.__write_page(output_file_path, new_content)
 
         print("Website was generated successfully.")
+
+    @staticmethod
+    def __write_page(output_file_path, content):
+        """ Writes a page and remembers its hash so an identical page is not written again """
+        with open(output_file_path, 'w') as output_file:
+            output_file.write(content)
+        stat = os.stat(output_file_path)
+        WebsiteGenerator._written_pages[os.path.abspath(output_file_path)] = (hash(content), stat.st_mtime_ns,
+                                                                              stat.st_size)
+
+    @staticmethod
+    def __slugify(value):
+        """ Turns a year or country into a file name friendly string """
+        return re.sub(r'[^a-z0-9]+', '-', str(value).lower()).strip('-') or 'unknown'
+
+    @staticmethod
+    def __page_file_name(prefix, page_number):
+        """ Returns the file name of a page, the first page has no number """
+        return f'{prefix}.html' if page_number == 1 else f'{prefix}-{page_number}.html'
+
+    @staticmethod
+    def __generate_pagination(prefix, page_number, page_count, extra_links=()):
+        """ Generates the navigation with previous and next links for a page """
+        links = []
+        if page_number > 1:
+            links.append(f'    <a class="pagination-prev" '
+                         f'href="{WebsiteGenerator.__page_file_name(prefix, page_number - 1)}">&laquo; Previous</a>\n')
+        links.append(f'    <span class="pagination-current">Page {page_number} of {page_count}</span>\n')
+        if page_number < page_count:
+            links.append(f'    <a class="pagination-next" '
+                         f'href="{WebsiteGenerator.__page_file_name(prefix, page_number + 1)}">Next &raquo;</a>\n')
+        for href, text in extra_links:
+            links.append(f'    <a href="{href}">{text}</a>\n')
+        return '<nav class="pagination">\n' + ''.join(links) + '</nav>'
+
+    @staticmethod
+    def __write_pages(movies, titles, output_dir, prefix, template_head, template_tail, per_page, extra_links=(),
+                      executor=None, posters=None, pages_ahead=0, fragment_cache=None):
+        """ Writes the pages for the given titles in order and returns their file names.
+            With an executor the movies of the next pages_ahead pages are rendered by the workers
+            while the current page waits for its own, so small pages keep every worker busy and
+            only the movies of those pages are held at any time. The rendered fragments are stored
+            in fragment_cache when one is given. """
+        page_count = max((len(titles) + per_page - 1) // per_page, 1)
+        file_names = []
+        pending = deque()
+
+        def write_page(page_number, page_titles, keys, fragments, missing, futures):
+            movies_info_string = WebsiteGenerator.__join_fragments(keys, fragments, missing, futures, fragment_cache)
+            pagination = WebsiteGenerator.__generate_pagination(prefix, page_number, page_count, extra_links)
+            file_name = WebsiteGenerator.__page_file_name(prefix, page_number)
+            output_file_path = os.path.join(output_dir, file_name)
+            content = ''.join((template_head, movies_info_string,
+                               template_tail.replace('__TEMPLATE_PAGINATION__', pagination)))
+            if not WebsiteGenerator.__is_unchanged(output_file_path, content):
+                WebsiteGenerator.__write_page(output_file_path, content)
+            file_names.append((file_name, page_titles[0] if page_titles else None,
+                               page_titles[-1] if page_titles else None, len(page_titles)))
+
+        titles = iter(titles)
+        for page_number in range(1, page_count + 1):
+            page_titles = list(islice(titles, per_page))
+            keys, fragments, missing = WebsiteGenerator.__collect_fragments(
+                ((title, movies[title]) for title in page_titles), posters, fragment_cache)
+            futures = WebsiteGenerator.__submit_render(executor, missing) if executor is not None else None
+            pending.append((page_number, page_titles, keys, fragments, missing, futures))
+            if len(pending) > pages_ahead:
+                write_page(*pending.popleft())
+        while pending:
+            write_page(*pending.popleft())
+        return file_names
+
+    @staticmethod
+    def generate_paginated_website(movies, template_file_path, output_dir, website_title, per_page=100,
+                                   group_by=None, manifest=True, jobs=1, posters=None):
+        """ Generates a multi-page movies website for large catalogs.
+
+            The movies are split into pages of per_page movies with previous and next links, starting
+            with index.html. Pages are rendered and written one at a time, and pages whose content did
+            not change are not rewritten. Pages left over from the previous run, as listed in its
+            manifest, are removed.
+
+            Args:
+                movies (dict): The catalog in the shape returned by IStorage.list_movies().
+                template_file_path (str): The HTML template with the __TEMPLATE_*__ placeholders.
+                output_dir (str): The directory the pages are written to.
+                website_title (str): The title shown on every page.
+                per_page (int): Number of movies per page.
+                group_by (str): 'year' or 'country' to also write paginated pages per year or country,
+                    plus an overview page linking to them. None to skip them.
+                manifest (bool): Also write movies.json, a compact list of all movies with the page
+                    each one is on, for client-side lazy loading.
+                jobs (int): Number of worker processes rendering the pages, several pages ahead of the one
+                    being written.
+                posters (dict): Poster URLs mapped to the local files shown instead, paths relative to
+                    output_dir as returned by PosterCache.sources(). None to link the original posters.
+        """
+        if group_by not in (None, 'year', 'country'):
+            raise ValueError(f"Cannot group movies by '{group_by}', use 'year' or 'country'.")
+        if per_page < 1:
+            raise ValueError(f"A page needs at least one movie, got per_page={per_page}.")
+
+        with open(template_file_path, 'r') as template_file:
+            template_content = template_file.read()
+        template_content = template_content.replace('__TEMPLATE_TITLE__', website_title)
+        template_head, template_tail = template_content.split('__TEMPLATE_MOVIE_GRID__', 1)
+        os.makedirs(output_dir, exist_ok=True)
+
+        extra_links = ((f'by-{group_by}.html', f'Browse by {group_by}'),) if group_by else ()
+
+        manifest_file_path = os.path.join(output_dir, 'movies.json')
+        previous_files = WebsiteGenerator.__previous_page_files(manifest_file_path)
+        fragment_cache = {}
+
+        # Enough pages in flight for every worker to have about two chunks to render
+        pages_ahead = 0
+        if jobs and jobs > 1:
+            pages_ahead = max(2 * jobs * WebsiteGenerator.RENDER_CHUNK_SIZE // per_page, 1)
+
+        with WebsiteGenerator.__create_executor(jobs) as executor:
+            pages = WebsiteGenerator.__write_pages(movies, list(movies), output_dir, 'index', template_head,
+                                                   template_tail, per_page, extra_links, executor, posters,
+                                                   pages_ahead, fragment_cache)
+            files = [file_name for file_name, *_ in pages]
+
+            if group_by:
+                files += WebsiteGenerator.__write_group_pages(movies, group_by, output_dir, template_head,
+                                                              template_tail, per_page, executor, posters,
+                                                              pages_ahead, fragment_cache)
+        # The index and group pages share the fragments, each movie is kept once
+        WebsiteGenerator._fragment_cache = fragment_cache
+
+        if manifest:
+            WebsiteGenerator.__write_manifest(movies, pages, per_page, manifest_file_path, files)
+        # Pages of the previous run that this run did not write again, e.g. after --per-page grew
+        for file_name in previous_files.difference(files):
+            file_path = os.path.join(output_dir, file_name)
+            if os.path.basename(file_name) == file_name and os.path.exists(file_path):
+                os.remove(file_path)
+
+        CountryResolver.default().report()
+        print(f"Website was generated successfully: {len(pages)} pages in '{output_dir}'.")
+
+    @staticmethod
+    def __write_group_pages(movies, group_by, output_dir, template_head, template_tail, per_page, executor,
+                            posters=None, pages_ahead=0, fragment_cache=None):
+        """ Writes the paginated pages of every year or country and the overview page linking to them,
+            and returns the file names of all of them """
+        groups = {}
+        for title, movie_info in movies.items():
+            if group_by == 'year':
+                group = MovieQuery.parse_year(movie_info.get('year'))
+            else:
+                group = movie_info.get('country') or None
+            groups.setdefault(group, []).append(title)
+
+        overview_items = []
+        files = []
+        for group in sorted(groups, key=lambda value: (value is None, str(value))):
+            prefix = f'{group_by}-{WebsiteGenerator.__slugify(group)}'
+            pages = WebsiteGenerator.__write_pages(movies, groups[group], output_dir, prefix, template_head,
+                                                   template_tail, per_page, (('index.html', 'All movies'),),
+                                                   executor, posters, pages_ahead, fragment_cache)
+            files.extend(file_name for file_name, *_ in pages)
+            label = group if group is not None else 'Unknown'
+            overview_items.append(f'<li><a href="{prefix}.html">{label}</a> ({len(groups[group])})</li>')
+
+        overview = ''.join((template_head, '\n'.join(overview_items),
+                            template_tail.replace('__TEMPLATE_PAGINATION__', '')))
+        overview_file_path = os.path.join(output_dir, f'by-{group_by}.html')
+        if not WebsiteGenerator.__is_unchanged(overview_file_path, overview):
+            WebsiteGenerator.__write_page(overview_file_path, overview)
+        files.append(f'by-{group_by}.html')
+        return files
+
+    @staticmethod
+    def __previous_page_files(manifest_file_path):
+        """ Returns the page files listed in the manifest of the previous run, empty if there is none.
+            Only the start of the manifest is read, the page files come before the movies. """
+        # The incremental reader stops at the movies, which json.load() would parse for nothing
+        from catalog_converter import JsonObjectReader
+        files = set()
+        try:
+            with open(manifest_file_path, 'r') as manifest_file:
+                for key, value in JsonObjectReader(manifest_file).items():
+                    if key == 'files':
+                        return set(value)
+                    if key == 'pages':
+                        # Manifests written before 'files' existed only list the index pages
+                        files = {page['file'] for page in value}
+                    elif key == 'movies':
+                        break
+        except (OSError, ValueError, TypeError, KeyError):
+            pass
+        return files
+
+    @staticmethod
+    def __write_manifest(movies, pages, per_page, manifest_file_path, files):
+        """ Streams a compact JSON manifest with the page files and one array per movie to a file """
+        with open(manifest_file_path, 'w') as manifest_file:
+            manifest_file.write(json.dumps({
+                'per_page': per_page,
+                'fields': ['title', 'year', 'rating', 'country', 'imdb_id', 'poster_url', 'page'],
+                'files': files,
+                'pages': [{'file': file_name, 'first': first, 'last': last, 'count': count}
+                          for file_name, first, last, count in pages]
+            }, separators=(',', ':'))[:-1])
+            manifest_file.write(',"movies":[')
+            for index, (title, movie_info) in enumerate(movies.items()):
+                if index:
+                    manifest_file.write(',')
+                manifest_file.write(json.dumps([title, movie_info.get('year'), movie_info.get('rating'),
+                                                movie_info.get('country'), movie_info.get('imdb_id'),
+                                                movie_info.get('poster_url'), index // per_page],
+                                               separators=(',', ':')))
+            manifest_file.write(']}')